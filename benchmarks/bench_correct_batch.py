@@ -0,0 +1,90 @@
+# benchmarks/bench_correct_batch.py
+"""
+Compares `Tutor.correct` called in a loop against `Tutor.correct_batch` on CPU.
+
+Usage (from the repository root, after running scripts/03_build_vector_store.py):
+    python benchmarks/bench_correct_batch.py --num-sentences 500 --batch-size 64
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.rag_pipeline import RAGPipeline
+from src.tutor import Tutor
+
+
+def make_sentences(dataset_path: str, num_sentences: int) -> list:
+    """Builds a classroom-sized upload by cycling through the sample dataset inputs."""
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        inputs = [record['input'] for record in json.load(f)]
+    inputs += ["Je vais à le parc.", "C'est le livre que j'ai besoin."]
+    return [f"{inputs[i % len(inputs)]} ({i})" for i in range(num_sentences)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--num-sentences', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--dataset', default='data/sample_dataset.json')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+
+    sentences = make_sentences(args.dataset, args.num_sentences)
+    user_ids = [f"student_{i % 30}" for i in range(len(sentences))]
+
+    # Work on a scratch copy of the profile database so the benchmark leaves no trace
+    tmp_dir = tempfile.mkdtemp()
+    profiles_path = os.path.join(tmp_dir, 'user_profiles.json')
+    if os.path.exists(config['paths']['user_profiles']):
+        shutil.copy(config['paths']['user_profiles'], profiles_path)
+
+    try:
+        pipeline = RAGPipeline(
+            config['paths']['vector_db'],
+            profiles_path,
+            config['paths']['knowledge_base'],
+            model_name=config['model']['embedding_model_name'],
+            encode_batch_size=args.batch_size
+        )
+        tutor = Tutor(
+            base_model_name=config['model']['base_model_name'],
+            lora_adapter_path=config['model']['lora_adapter_path'],
+            vector_db_path=config['paths']['vector_db'],
+            user_profile_db_path=profiles_path,
+            rag_pipeline=pipeline
+        )
+        # Warm up the encoder so neither run pays for lazy initialisation
+        tutor.correct_batch(sentences[:8], user_ids[:8])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            looped = [tutor.correct(sentence, user_id) for sentence, user_id in zip(sentences, user_ids)]
+            loop_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            batched = tutor.correct_batch(sentences, user_ids)
+            batch_seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    assert looped == batched, "correct_batch must return the same responses as correct"
+    print(f"--- {len(sentences)} sentences, encoder batch size {args.batch_size} ---")
+    print(f"correct() loop : {loop_seconds:8.3f}s  {len(sentences) / loop_seconds:10.1f} sentences/s")
+    print(f"correct_batch(): {batch_seconds:8.3f}s  {len(sentences) / batch_seconds:10.1f} sentences/s")
+    print(f"Speedup        : {loop_seconds / batch_seconds:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
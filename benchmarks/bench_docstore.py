@@ -0,0 +1,117 @@
+# benchmarks/bench_docstore.py
+"""
+Compares the two ways the RAG pipeline gets at the knowledge-base documents:
+- json: parse the knowledge-base JSON and the build manifest into dicts, then map index ids
+  to documents (stores built before src/docstore.py); "json + corpus" also reads corpus.json,
+  the duplicate list of contents those builds wrote;
+- docstore: map the binary docstore and decode a document only when a hit returns it.
+
+Each case runs in a fresh process, which reports the load time and the RSS it added, then the
+cost of resolving random hits. The files are generated from a synthetic knowledge base.
+
+    python benchmarks/bench_docstore.py --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from benchmarks.synthetic import synthetic_knowledge_base
+from src.docstore import DOCSTORE_FILE, write_docstore
+from src.vector_store import LEGACY_CORPUS_FILE, MANIFEST_FILE
+
+MODES = ('json', 'json + corpus', 'docstore')
+
+
+def write_store(tmp_dir: str, size: int) -> dict:
+    """Writes the knowledge base, a manifest, corpus.json and a docstore; returns their paths and sizes."""
+    documents = synthetic_knowledge_base(size)
+    kb_path = os.path.join(tmp_dir, 'knowledge_base.json')
+    with open(kb_path, 'w', encoding='utf-8') as f:
+        json.dump(documents, f, indent=2, ensure_ascii=False)
+    legacy_dir, docstore_dir = os.path.join(tmp_dir, 'legacy'), os.path.join(tmp_dir, 'docstore')
+    for output_dir in (legacy_dir, docstore_dir):
+        os.makedirs(output_dir)
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"model_name": "hashing", "next_id": size,
+                       "documents": {doc['rule_id']: {"id": i, "hash": ""} for i, doc in enumerate(documents)}}, f, indent=2)
+    with open(os.path.join(legacy_dir, LEGACY_CORPUS_FILE), 'w', encoding='utf-8') as f:
+        json.dump([doc['content'] for doc in documents], f, indent=2, ensure_ascii=False)
+    write_docstore(os.path.join(docstore_dir, DOCSTORE_FILE), documents, list(range(size)))
+    return {
+        "kb_path": kb_path, "legacy_dir": legacy_dir, "docstore_dir": docstore_dir,
+        "disk_mb": {
+            "json": os.path.getsize(kb_path) / 2 ** 20,
+            "json + corpus": (os.path.getsize(kb_path) + os.path.getsize(os.path.join(legacy_dir, LEGACY_CORPUS_FILE))) / 2 ** 20,
+            "docstore": os.path.getsize(os.path.join(docstore_dir, DOCSTORE_FILE)) / 2 ** 20,
+        },
+    }
+
+
+def measure(mode: str, vector_db_path: str, kb_path: str, lookups: int) -> dict:
+    """Runs in the child process: loads the documents the way `mode` does and resolves random hits."""
+    import contextlib
+    import io
+    from src.metrics import process_memory
+    from src.rag_pipeline import RAGPipeline
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline = RAGPipeline(vector_db_path, os.path.join(os.path.dirname(kb_path), f'profiles-{os.getpid()}.sqlite3'),
+                               kb_path, embedding_model=object(), startup='lazy')
+        rss_before = process_memory()['rss_mb']
+        start = time.perf_counter()
+        documents_by_id = pipeline.documents_by_id
+        if mode == 'json + corpus':
+            pipeline.corpus
+        load_seconds = time.perf_counter() - start
+        rss_after = process_memory()['rss_mb']
+
+    rng = random.Random(0)
+    ids = [rng.randrange(len(pipeline.knowledge_base)) for _ in range(lookups)]
+    start = time.perf_counter()
+    for doc_id in ids:
+        pipeline._format_hit([doc_id])
+    lookup_us = (time.perf_counter() - start) / lookups * 1e6
+    assert documents_by_id.get(ids[0]) is not None
+    pipeline.profile_store.close()
+    return {"load_seconds": load_seconds, "rss_mb": rss_after - rss_before, "lookup_us": lookup_us}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--child', nargs=4, metavar=('MODE', 'VECTOR_DB', 'KB', 'LOOKUPS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, vector_db_path, kb_path, lookups = args.child
+        print(json.dumps(measure(mode, vector_db_path, kb_path, int(lookups))))
+        return
+
+    print(f"{'documents':>10} {'mode':<14} {'on disk':>9} {'load ms':>8} {'RSS added':>10} {'lookup us':>10}")
+    for size in args.sizes:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            store = write_store(tmp_dir, size)
+            for mode in MODES:
+                vector_db_path = store['docstore_dir'] if mode == 'docstore' else store['legacy_dir']
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, vector_db_path,
+                                         store['kb_path'], str(args.lookups)],
+                                        cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+                r = json.loads(output.strip().splitlines()[-1])
+                print(f"{size:>10} {mode:<14} {store['disk_mb'][mode]:>7.1f}MB {r['load_seconds'] * 1e3:>8.1f} {r['rss_mb']:>8.1f}MB "
+                      f"{r['lookup_us']:>10.2f}")
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/bench_embedding_backends.py
+"""
+Compares the embedding backends of src/embeddings.py against the fp32 sentence-transformers
+model: encoding throughput (batched) and single-sentence latency, the speedup over fp32, and
+recall@k drift. The reference is an exact index of the knowledge base embedded in fp32 and
+searched with fp32 query vectors. Variants of the same model (the int8 quantized one) query
+that fp32 index, as when serving quantized against an fp32-built store; other backends (the
+hashing stub) are searched against an index they built themselves.
+
+    python benchmarks/bench_embedding_backends.py
+    python benchmarks/bench_embedding_backends.py --backends sentence_transformers quantized --threads 4
+
+The knowledge base is padded with synthetic rules (--synthetic-size) and the queries with
+synthetic learner sentences (--num-queries), so recall@k is measured over a realistic pool.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import synthetic_knowledge_base, synthetic_sentences
+from benchmarks.sweep_vector_index import load_queries
+from src.embeddings import EMBEDDING_BACKENDS, load_embedding_backend
+from src.vector_store import create_index
+
+
+def time_encoding(backend, sentences, repeats: int, single: int):
+    """Returns (best batched throughput in sentences/s, p50 single-sentence latency in ms)."""
+    backend.encode(sentences[:backend.max_batch_size])
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.encode(sentences)
+        best = min(best, time.perf_counter() - start)
+    latencies = []
+    for sentence in sentences[:single]:
+        start = time.perf_counter()
+        backend.encode([sentence])
+        latencies.append(time.perf_counter() - start)
+    return len(sentences) / best, float(np.percentile(latencies, 50) * 1e3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument('--model', help="sentence-transformers model (defaults to model.embedding_model_name).")
+    parser.add_argument('--threads', type=int, help="Intra-op threads, overriding embedding.num_threads.")
+    parser.add_argument('--knowledge-base', default='data/sample_grammar_knowledge_base.json')
+    parser.add_argument('--queries', default='data/sample_dataset.json', help="JSON list of sentences or dataset records.")
+    parser.add_argument('--synthetic-size', type=int, default=1000, help="Synthetic rules added to the knowledge base.")
+    parser.add_argument('--num-queries', type=int, default=500, help="Pad the queries with synthetic sentences up to this many.")
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--single', type=int, default=100, help="Sentences encoded one at a time for the latency column.")
+    parser.add_argument('--output', help="Optional path for a JSON report.")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    model_name = args.model or config['model']['embedding_model_name']
+    embedding_config = dict(config.get('embedding') or {})
+    if args.threads:
+        embedding_config['num_threads'] = args.threads
+
+    with open(args.knowledge_base, 'r', encoding='utf-8') as f:
+        documents = json.load(f) + synthetic_knowledge_base(args.synthetic_size)
+    contents = [document['content'] for document in documents]
+    queries = load_queries(args.queries)
+    queries += synthetic_sentences(max(0, args.num_queries - len(queries)))
+    ids = np.arange(len(contents), dtype='int64')
+    k = min(args.k, len(contents))
+    print(f"{len(contents)} knowledge-base entries, {len(queries)} queries, k={k}, model '{model_name}'.")
+
+    def load(backend):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return load_embedding_backend(model_name, embedding_config, backend=backend)
+
+    reference = load('sentence_transformers')
+    reference_index = create_index(reference.encode(contents), ids, {"type": "flat"})
+    _, true_ids = reference_index.search(reference.encode(queries), k)
+    reference_throughput = None
+
+    results = []
+    for name in ['sentence_transformers'] + [b for b in args.backends if b != 'sentence_transformers']:
+        backend = reference if name == 'sentence_transformers' else load(name)
+        throughput, p50_ms = time_encoding(backend, queries, args.repeats, args.single)
+        reference_throughput = reference_throughput or throughput
+        query_vectors = backend.encode(queries)
+        # Variants of the reference model share its vector space; other backends need their own index
+        if getattr(backend, 'model_name', None) == model_name:
+            index, index_kind = reference_index, "fp32"
+        else:
+            index, index_kind = create_index(backend.encode(contents), ids, {"type": "flat"}), "own"
+        _, found_ids = index.search(query_vectors, k)
+        recall = np.mean([len(set(found) & set(truth)) / k for found, truth in zip(found_ids, true_ids)])
+        results.append({
+            "backend": name,
+            "name": backend.name,
+            "index": index_kind,
+            "sentences_per_s": throughput,
+            "speedup": throughput / reference_throughput,
+            "single_p50_ms": p50_ms,
+            "recall_at_k": float(recall),
+        })
+
+    print(f"{'backend':<22} {'index':>6} {'sent/s':>9} {'speedup':>8} {'1-sent ms':>10} {'recall@' + str(k):>9}")
+    for r in results:
+        if r['backend'] in args.backends:
+            print(f"{r['backend']:<22} {r['index']:>6} {r['sentences_per_s']:>9.1f} {r['speedup']:>7.2f}x "
+                  f"{r['single_p50_ms']:>10.2f} {r['recall_at_k']:>9.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"model": model_name, "k": k, "num_documents": len(contents), "num_queries": len(queries),
+                       "num_threads": embedding_config.get('num_threads'), "results": results}, f, indent=2)
+        print(f"Report saved to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
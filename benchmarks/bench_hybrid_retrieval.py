@@ -0,0 +1,115 @@
+# benchmarks/bench_hybrid_retrieval.py
+"""
+Compares grammar-rule retrieval modes on labelled learner sentences: hit accuracy (top-1
+rule_id) and per-sentence latency of RAGPipeline._query_grammar_db.
+
+Modes:
+    vector        dense FAISS search only
+    lexical       BM25 lexical index only
+    hybrid        both, fused by reciprocal rank
+    hybrid+skip   hybrid, skipping embedding when the lexical hit is decisive
+
+Runs offline on the sample knowledge base with the hashing embedding backend by default; pass
+--backend to embed with another backend of src/embeddings.py (model.embedding_model_name):
+    python benchmarks/bench_hybrid_retrieval.py
+    python benchmarks/bench_hybrid_retrieval.py --backend quantized
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.embeddings import HashingBackend, load_embedding_backend
+from src.metrics import Metrics
+from src.rag_pipeline import RAGPipeline
+from src.vector_store import build_vector_store
+
+LABELLED_SENTENCES = [
+    ("Je vais à le parc.", "contraction_a_le"),
+    ("Nous allons à le cinéma ce soir.", "contraction_a_le"),
+    ("Il parle à le professeur.", "contraction_a_le"),
+    ("Elle est à le marché depuis midi.", "contraction_a_le"),
+    ("C'est le livre que j'ai besoin.", "pronoun_dont"),
+    ("Voici le film que je parle.", "pronoun_dont"),
+    ("C'est la maison que je rêve.", "pronoun_dont"),
+    ("Le stylo que tu as besoin est sur la table.", "pronoun_dont"),
+    ("Ils sont les amis qui je joue avec.", "ce_sont_vs_ils_sont"),
+    ("Ils sont mes parents.", "ce_sont_vs_ils_sont"),
+    ("Elles sont mes sœurs.", "ce_sont_vs_ils_sont"),
+    ("Ils sont des médecins.", "ce_sont_vs_ils_sont"),
+    ("J'ai mangé un pomme.", "gender_agreement_articles"),
+    ("Je veux un pomme rouge.", "gender_agreement_articles"),
+    ("Elle a une chat noir.", "gender_agreement_articles"),
+    ("C'est une bon livre.", "gender_agreement_articles"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--knowledge-base', default='data/sample_grammar_knowledge_base.json')
+    parser.add_argument('--backend', help="Embedding backend: sentence_transformers, quantized or hashing (default: offline hashing).")
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    with open(args.knowledge_base, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    if args.backend:
+        encoder = load_embedding_backend(config['model']['embedding_model_name'], config.get('embedding'), backend=args.backend)
+    else:
+        encoder = HashingBackend(dim=128)
+
+    retrieval = config.get('retrieval', {})
+    skip_config = {**retrieval.get('lexical_skip', {}), "enabled": True}
+    modes = {
+        "vector": {"mode": "vector"},
+        "lexical": {"mode": "lexical"},
+        "hybrid": {**retrieval, "mode": "hybrid", "lexical_skip": {**skip_config, "enabled": False}},
+        "hybrid+skip": {**retrieval, "mode": "hybrid", "lexical_skip": skip_config},
+    }
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        vector_db_path = os.path.join(tmp_dir, 'vector_store')
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_vector_store(documents, encoder, vector_db_path, encoder.name,
+                               lexical_config=config.get('lexical_index'))
+
+        print(f"{len(LABELLED_SENTENCES)} labelled sentences, {len(documents)} rules, "
+              f"{encoder.name} embeddings")
+        print(f"{'mode':<12} {'accuracy':>9} {'p50 µs':>9} {'p95 µs':>9} {'embedded':>9}")
+        for name, retrieval_config in modes.items():
+            metrics = Metrics()
+            with contextlib.redirect_stdout(io.StringIO()):
+                pipeline = RAGPipeline(vector_db_path, os.path.join(tmp_dir, 'profiles.sqlite3'), args.knowledge_base,
+                                       embedding_model=encoder, metrics=metrics, retrieval_config=retrieval_config)
+            correct = sum(pipeline._query_grammar_db(sentence)["rule_id"] == rule_id
+                          for sentence, rule_id in LABELLED_SENTENCES)
+            metrics.reset()
+            latencies = []
+            for _ in range(args.repeats):
+                for sentence, _ in LABELLED_SENTENCES:
+                    start = time.perf_counter()
+                    pipeline._query_grammar_db(sentence)
+                    latencies.append(time.perf_counter() - start)
+            embedded = metrics.to_dict()["stages"].get("embed", {}).get("count", 0) / args.repeats
+            print(f"{name:<12} {correct / len(LABELLED_SENTENCES):>9.0%} {np.percentile(latencies, 50) * 1e6:>9.1f} "
+                  f"{np.percentile(latencies, 95) * 1e6:>9.1f} {embedded:>9.0f}")
+            pipeline.profile_store.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_llm_backends.py
+"""
+Measures time-to-first-token and throughput of the LLM backend interface under concurrency,
+against the fake backend of src/llm_backends.py (no model or GPU needed).
+
+`--clients` threads each send `--requests` prompts drawn from a Zipf-like distribution over
+`--distinct` learner sentences, so popular sentences are often in flight at the same time
+(the way a class working through the same exercise hits the server). Each client either
+- generate: waits for the whole response (`LLMBackend.generate`); first token = whole answer;
+- stream: reads the response chunk by chunk (`LLMBackend.stream`);
+with identical in-flight prompts coalesced into one generation, or not. The fake backend
+sleeps `--batch-ms` per call, `--per-prompt-ms` per prompt and `--token-ms` per token, and at
+most `--device-slots` generations run at once (a model replica serves a few streams at a time;
+the fake alone would sleep for any number of threads in parallel).
+
+    python benchmarks/bench_llm_backends.py --clients 1 8 32
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import synthetic_sentences
+from src.llm_backends import SYSTEM_PREFIX, USER_TEMPLATE, FakeLLM
+
+
+class SlottedFakeLLM(FakeLLM):
+    """FakeLLM that runs at most `slots` generations at a time, the others queueing."""
+    def __init__(self, slots: int, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = threading.Semaphore(slots)
+
+    def _generate_texts(self, prompts):
+        with self._slots:
+            return super()._generate_texts(prompts)
+
+    def _stream_text(self, prompt):
+        with self._slots:
+            yield from super()._stream_text(prompt)
+
+
+def zipf_prompts(count: int, distinct: int, exponent: float, seed: int) -> list:
+    rng = random.Random(seed)
+    # Every client draws from the same sentences, the most popular first
+    sentences = list(dict.fromkeys(synthetic_sentences(distinct * 4)))[:distinct]
+    weights = [1 / (rank + 1) ** exponent for rank in range(distinct)]
+    return [SYSTEM_PREFIX + USER_TEMPLATE.format(context="", sentence=sentence)
+            for sentence in rng.choices(sentences, weights=weights, k=count)]
+
+
+def run_clients(llm: SlottedFakeLLM, mode: str, clients: int, requests: int, distinct: int, exponent: float) -> dict:
+    first_token, latencies = [], []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients)
+
+    def client(index: int):
+        prompts = zipf_prompts(requests, distinct, exponent, seed=index)
+        start_barrier.wait()
+        for prompt in prompts:
+            start = time.perf_counter()
+            if mode == 'stream':
+                first = None
+                for _ in llm.stream(prompt):
+                    if first is None:
+                        first = time.perf_counter() - start
+            else:
+                llm.generate(prompt)
+                first = time.perf_counter() - start
+            elapsed = time.perf_counter() - start
+            with lock:
+                first_token.append(first)
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    first_token.sort()
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / wall,
+        "ttft_p50": first_token[len(first_token) // 2],
+        "ttft_p95": first_token[int(len(first_token) * 0.95)],
+        "latency_p50": latencies[len(latencies) // 2],
+        "generations": llm.generations,
+        "coalesced": llm.coalesced,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=20, help="Requests per client.")
+    parser.add_argument('--distinct', type=int, default=50)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--batch-ms', type=float, default=40.0)
+    parser.add_argument('--per-prompt-ms', type=float, default=2.0)
+    parser.add_argument('--token-ms', type=float, default=3.0)
+    parser.add_argument('--device-slots', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'clients':>7} {'mode':<9} {'coalesce':<8} {'req/s':>8} {'ttft p50':>9} {'ttft p95':>9} "
+          f"{'lat p50':>9} {'generated':>9} {'coalesced':>9}")
+    for clients in args.clients:
+        for mode in ('generate', 'stream'):
+            for coalesce in (False, True):
+                llm = SlottedFakeLLM(args.device_slots, args.batch_ms, args.per_prompt_ms, args.token_ms, coalesce=coalesce)
+                r = run_clients(llm, mode, clients, args.requests, args.distinct, args.zipf)
+                print(f"{clients:>7} {mode:<9} {'on' if coalesce else 'off':<8} {r['throughput']:>8.1f} "
+                      f"{r['ttft_p50'] * 1e3:>7.1f}ms {r['ttft_p95'] * 1e3:>7.1f}ms {r['latency_p50'] * 1e3:>7.1f}ms "
+                      f"{r['generations']:>9} {r['coalesced']:>9}")
+
+
+if __name__ == "__main__":
+    main()
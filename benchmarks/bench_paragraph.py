@@ -0,0 +1,114 @@
+# benchmarks/bench_paragraph.py
+"""
+Times paragraph correction on long learner texts: how long until the first correction is
+available, and how long until the whole paragraph is corrected.
+
+Each paragraph is built from synthetic sentences joined with abbreviations, quotes and line
+breaks, and is corrected in four ways:
+- whole text: `Tutor.correct` on the raw paragraph, as if it were one sentence (one retrieval,
+  one prompt; the first answer is the only one);
+- batch: the split sentences through `Tutor.correct_batch` (nothing is available until the
+  single LLM call returns);
+- stream: `Tutor.correct_paragraph_stream`, one retrieval pass then LLM calls of 1, 2, 4, ...
+  prompts, each result yielded as it arrives;
+- stream, per sentence: the same with groups of one prompt (`max_stream_batch=1`).
+The stub LLM sleeps `--stub-llm-ms` per call plus `--per-prompt-ms` per prompt. The rule engine
+is disabled so every sentence reaches the LLM.
+
+    python benchmarks/bench_paragraph.py --sentences 10 50 200
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import synthetic_sentences
+from src.embeddings import HashingBackend
+from src.rag_pipeline import RAGPipeline
+from src.sentence_splitter import split_sentences
+from src.tutor import StubLLM, Tutor
+from src.vector_store import build_vector_store
+
+FILLERS = ["M. Dupont dit que c'est vrai.", "« Tu viens ? » demanda-t-il.", "Il est 10.30, p. ex. le matin."]
+
+
+def synthetic_paragraph(num_sentences: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    sentences = synthetic_sentences(num_sentences, seed=seed)
+    for i in range(0, num_sentences, 7):
+        sentences[i] = rng.choice(FILLERS)
+    return "".join(sentence + ("\n\n" if i % 10 == 9 else " ") for i, sentence in enumerate(sentences)).strip()
+
+
+def time_modes(tutor: Tutor, text: str, user_id: str) -> dict:
+    timings = {}
+
+    start = time.perf_counter()
+    tutor.correct(text, user_id)
+    elapsed = time.perf_counter() - start
+    timings["whole text"] = (elapsed, elapsed)
+
+    start = time.perf_counter()
+    tutor.correct_batch(split_sentences(text), user_id)
+    elapsed = time.perf_counter() - start
+    timings["batch"] = (elapsed, elapsed)
+
+    for name, max_stream_batch in (("stream", 16), ("stream, per sentence", 1)):
+        start = time.perf_counter()
+        first = None
+        for _ in tutor.correct_paragraph_stream(text, user_id, max_stream_batch=max_stream_batch):
+            if first is None:
+                first = time.perf_counter() - start
+        timings[name] = (first, time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--knowledge-base', default='data/sample_grammar_knowledge_base.json')
+    parser.add_argument('--sentences', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--stub-llm-ms', type=float, default=40.0)
+    parser.add_argument('--per-prompt-ms', type=float, default=5.0)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.knowledge_base, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        encoder = HashingBackend(dim=128)
+        vector_db_path = os.path.join(tmp_dir, 'vector_store')
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_vector_store(documents, encoder, vector_db_path, encoder.name)
+            pipeline = RAGPipeline(vector_db_path, os.path.join(tmp_dir, 'profiles.sqlite3'),
+                                   args.knowledge_base, embedding_model=encoder)
+            tutor = Tutor("bench-base", "bench-adapter", vector_db_path, pipeline.user_profile_db_path,
+                          rag_pipeline=pipeline, llm=StubLLM(args.stub_llm_ms, args.per_prompt_ms))
+        tutor.rule_engine = None
+
+        print(f"{'sentences':>9} {'mode':<22} {'first ms':>9} {'total ms':>9}")
+        for num_sentences in args.sentences:
+            text = synthetic_paragraph(num_sentences)
+            best = {}
+            for repeat in range(args.repeats):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timings = time_modes(tutor, text, f"learner_{repeat}")
+                for name, (first, total) in timings.items():
+                    previous = best.get(name, (float('inf'), float('inf')))
+                    best[name] = (min(previous[0], first), min(previous[1], total))
+            for name, (first, total) in best.items():
+                print(f"{num_sentences:>9} {name:<22} {first * 1e3:>9.1f} {total * 1e3:>9.1f}")
+        tutor.profile_store.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
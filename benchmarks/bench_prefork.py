@@ -0,0 +1,222 @@
+# benchmarks/bench_prefork.py
+"""
+Compares the tutor service running as one process with the pre-fork mode of src/prefork.py:
+N workers that each load their own tutor (--no-preload), and N workers forked from a parent
+that loaded it once (preload). Reports aggregate throughput and latency under closed-loop
+load over TCP, and the memory of every worker: RSS, PSS (shared pages divided among the
+processes using them) and private memory, plus the total PSS of the whole server.
+
+Each server is started as `python -m src.server` on a scratch vector store of the sample
+knowledge base padded with synthetic rules. The rule engine and response cache are disabled,
+so every request is embedded, searched and sent to the stub LLM.
+
+    python benchmarks/bench_prefork.py --workers 4
+    python benchmarks/bench_prefork.py --workers 4 --backend sentence_transformers --model all-MiniLM-L6-v2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import queue
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import yaml
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from benchmarks.synthetic import synthetic_knowledge_base, synthetic_sentences
+from src.embeddings import EMBEDDING_BACKENDS, load_embedding_backend
+from src.metrics import process_memory
+from src.vector_store import build_vector_store
+
+
+def scratch_config(config: dict, tmp_dir: str, args) -> str:
+    """Builds the scratch vector store and writes a config pointing at it."""
+    model_name = args.model or config['model']['embedding_model_name']
+    embedding_config = {**(config.get('embedding') or {}), 'backend': args.backend, 'index_backend': None}
+    with open(args.knowledge_base, 'r', encoding='utf-8') as f:
+        documents = json.load(f) + synthetic_knowledge_base(args.kb_size)
+    kb_path = os.path.join(tmp_dir, 'knowledge_base.json')
+    with open(kb_path, 'w', encoding='utf-8') as f:
+        json.dump(documents, f)
+    with contextlib.redirect_stdout(io.StringIO()):
+        encoder = load_embedding_backend(model_name, embedding_config)
+        build_vector_store(documents, encoder, os.path.join(tmp_dir, 'vector_store'), encoder.name,
+                           index_config=config.get('vector_index'), lexical_config=config.get('lexical_index'))
+
+    config = dict(config)
+    config['model'] = {**config['model'], 'embedding_model_name': model_name}
+    config['paths'] = {**config['paths'], 'knowledge_base': kb_path, 'vector_db': os.path.join(tmp_dir, 'vector_store'),
+                       'user_profiles': os.path.join(tmp_dir, 'user_profiles.json')}
+    config['profile_store'] = {**config.get('profile_store', {}), 'db_path': os.path.join(tmp_dir, 'profiles.sqlite3')}
+    config['embedding'] = embedding_config
+    config['embedding_cache'] = {**config.get('embedding_cache', {}), 'disk_path': None}
+    config['startup'] = {**config.get('startup', {}), 'mode': 'eager'}
+    config['rule_engine'] = {'enabled': False}
+    config['response_cache'] = {'enabled': False}
+    config['profile_analytics'] = {'enabled': False}
+    config_path = os.path.join(tmp_dir, 'config.yaml')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+    print(f"Scratch store: {len(documents)} rules embedded with '{encoder.name}'.")
+    return config_path
+
+
+def start_server(config_path: str, args, port: int, workers: int, preload: bool) -> subprocess.Popen:
+    command = [sys.executable, '-m', 'src.server', '--config', config_path, '--port', str(port),
+               '--stub-llm-ms', str(args.stub_llm_ms), '--workers', str(workers)]
+    if not preload:
+        command.append('--no-preload')
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    # Drain the server's output in the background; count the workers announcing themselves
+    lines = queue.Queue()
+    threading.Thread(target=lambda: [lines.put(line) for line in process.stdout], daemon=True).start()
+    deadline = time.monotonic() + args.startup_timeout
+    listening = 0
+    while listening < workers:
+        try:
+            line = lines.get(timeout=1.0)
+        except queue.Empty:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode} during startup (see --verbose).")
+            if time.monotonic() > deadline:
+                process.send_signal(signal.SIGTERM)
+                raise RuntimeError(f"Server did not start within {args.startup_timeout}s.")
+            continue
+        if args.verbose:
+            print("   |", line.rstrip())
+        # Workers write concurrently, so one line may hold several announcements
+        listening += line.count('listening on')
+    return process
+
+
+def server_processes(pid: int) -> list:
+    """The server process followed by its direct children (the workers), from /proc."""
+    children = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(name))
+    return [pid] + sorted(children)
+
+
+async def closed_loop(port: int, concurrency: int, total_requests: int, sentences: list) -> list:
+    counter = iter(range(total_requests))
+    latencies = []
+
+    async def learner(learner_id: int):
+        rng = random.Random(learner_id)
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for i in counter:
+            request = {"id": i, "sentence": rng.choice(sentences), "user_id": f"learner_{learner_id}"}
+            start = time.perf_counter()
+            writer.write((json.dumps(request) + "\n").encode('utf-8'))
+            reply = json.loads(await reader.readline() or b'{"error": "closed"}')
+            if reply.get('error') in ("shutting down", "closed"):
+                # A recycled worker: reconnect to another one
+                writer.close()
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                continue
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    await asyncio.gather(*(learner(i) for i in range(concurrency)))
+    return latencies
+
+
+def run_scenario(config_path: str, args, port: int, workers: int, preload: bool) -> dict:
+    process = start_server(config_path, args, port, workers, preload)
+    try:
+        sentences = synthetic_sentences(1000, seed=3)
+        asyncio.run(closed_loop(port, args.concurrency, args.concurrency * 4, sentences))
+        start = time.perf_counter()
+        latencies = asyncio.run(closed_loop(port, args.concurrency, args.requests, sentences))
+        elapsed = time.perf_counter() - start
+
+        pids = server_processes(process.pid)
+        worker_pids = pids[1:] if workers > 1 else pids
+        memory = [process_memory(pid) for pid in worker_pids]
+        total_pss = sum(process_memory(pid).get('pss_mb', 0.0) for pid in pids)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            exit_code = process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            exit_code = None
+    return {
+        "workers": workers,
+        "preload": preload,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1e3),
+        "p95_ms": float(np.percentile(latencies, 95) * 1e3),
+        "worker_rss_mb": float(np.mean([m.get('rss_mb', 0.0) for m in memory])),
+        "worker_pss_mb": float(np.mean([m.get('pss_mb', 0.0) for m in memory])),
+        "worker_private_mb": float(np.mean([m.get('private_mb', 0.0) for m in memory])),
+        "total_pss_mb": total_pss,
+        "exit_code": exit_code,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--backend', default='hashing', choices=EMBEDDING_BACKENDS)
+    parser.add_argument('--model', help="sentence-transformers model (defaults to model.embedding_model_name).")
+    parser.add_argument('--knowledge-base', default='data/sample_grammar_knowledge_base.json')
+    parser.add_argument('--kb-size', type=int, default=20000, help="Synthetic rules added to the knowledge base.")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--stub-llm-ms', type=float, default=40.0)
+    parser.add_argument('--port', type=int, default=18765)
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--verbose', action='store_true', help="Echo the servers' output.")
+    parser.add_argument('--output', help="Optional path for a JSON report.")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        config_path = scratch_config(config, tmp_dir, args)
+        scenarios = [(1, True), (args.workers, False), (args.workers, True)]
+        results = []
+        print(f"{'workers':>7} {'preload':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'RSS/worker':>11} {'PSS/worker':>11} {'private/wkr':>11} {'total PSS':>10}")
+        for i, (workers, preload) in enumerate(scenarios):
+            r = run_scenario(config_path, args, args.port + i, workers, preload)
+            results.append(r)
+            print(f"{r['workers']:>7} {'yes' if r['preload'] or workers == 1 else 'no':>7} {r['throughput']:>8.1f} "
+                  f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['worker_rss_mb']:>9.0f}MB {r['worker_pss_mb']:>9.0f}MB "
+                  f"{r['worker_private_mb']:>9.0f}MB {r['total_pss_mb']:>8.0f}MB")
+            if r['exit_code'] != 0:
+                print(f"  warning: server exited with code {r['exit_code']} after SIGTERM")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"backend": args.backend, "kb_size": args.kb_size, "results": results}, f, indent=2)
+        print(f"Report saved to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/bench_profile_analytics.py
+"""
+Times the cohort queries of src/profile_analytics.py against the same questions answered by
+scanning the profiles as Python dicts (the shape ProfileStore and the legacy JSON file return),
+on a synthetic population of up to millions of users. Also reports load time, the memory of
+the columnar arrays and the cost of applying incremental updates.
+
+Usage (from the repository root):
+    python benchmarks/bench_profile_analytics.py --users 1000000
+    python benchmarks/bench_profile_analytics.py --users 100000 --store   # also time loading from SQLite
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.profile_analytics import ProfileAnalytics
+from src.profile_store import ProfileStore
+
+TOPICS = ["Contractions", "Relative Pronouns", "Pronouns", "Articles and Gender", "Subjunctive",
+          "Passé Composé", "Agreement", "Prepositions", "Negation", "Conditional", "Partitive Articles",
+          "Adjective Placement"]
+START = datetime(2025, 6, 1)
+DAYS = 120
+STRUGGLING_TOPIC = "Articles and Gender"
+
+
+def synthetic_profiles(num_users: int) -> dict:
+    rng = random.Random(0)
+    return {
+        f"user_{i}": {
+            "error_counts": {topic: rng.randint(1, 20) for topic in rng.sample(TOPICS, rng.randint(1, 4))},
+            "last_seen": (START + timedelta(seconds=rng.randrange(DAYS * 86400))).isoformat()
+        }
+        for i in range(num_users)
+    }
+
+
+# --- The same questions answered by scanning dicts ---
+
+def scan_top_topics(profiles: dict, k: int, since: str) -> list:
+    totals = Counter()
+    for profile in profiles.values():
+        if profile["last_seen"] >= since:
+            totals.update(profile["error_counts"])
+    return totals.most_common(k)
+
+
+def scan_error_rates(profiles: dict, window_days: int) -> dict:
+    windows = {}
+    for profile in profiles.values():
+        day = (datetime.fromisoformat(profile["last_seen"]) - datetime(1970, 1, 1)).days
+        window = windows.setdefault(day // window_days, {"active": 0, "affected": Counter()})
+        window["active"] += 1
+        window["affected"].update(profile["error_counts"].keys())
+    return {w: {t: n / v["active"] for t, n in v["affected"].items()} for w, v in windows.items()}
+
+
+def scan_struggling(profiles: dict, topic: str, min_count: int, limit: int) -> list:
+    matches = [(profile["error_counts"][topic], user_id) for user_id, profile in profiles.items()
+               if profile["error_counts"].get(topic, 0) >= min_count]
+    return sorted(matches, key=lambda match: -match[0])[:limit]
+
+
+def best_of(repeats: int, function, *args, **kwargs) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--updates', type=int, default=100000, help="Increments applied in batches of 32.")
+    parser.add_argument('--store', action='store_true', help="Also time loading the profiles from a SQLite ProfileStore.")
+    args = parser.parse_args()
+
+    print(f"Generating {args.users} synthetic users over {len(TOPICS)} topics...")
+    profiles = synthetic_profiles(args.users)
+    since = (START + timedelta(days=DAYS - 30)).isoformat()
+
+    start = time.perf_counter()
+    analytics = ProfileAnalytics.from_profiles(profiles)
+    load_seconds = time.perf_counter() - start
+    array_mb = (analytics.columns.nbytes + analytics.last_seen.nbytes) / 2 ** 20
+    print(f"Columnar load: {load_seconds:.2f}s, {array_mb:.1f} MB of arrays.")
+
+    queries = [
+        ("top topics (last 30 days)",
+         lambda: scan_top_topics(profiles, 5, since),
+         lambda: analytics.top_topics(5, since=since)),
+        ("error rates per week",
+         lambda: scan_error_rates(profiles, 7),
+         lambda: analytics.topic_error_rates(7 * 86400)),
+        ("struggling users",
+         lambda: scan_struggling(profiles, STRUGGLING_TOPIC, 15, 100),
+         lambda: analytics.struggling_users(STRUGGLING_TOPIC, min_count=15)),
+    ]
+    print(f"{'query':<28} {'dict scan ms':>13} {'columnar ms':>12} {'speedup':>8}")
+    for name, scan, columnar in queries:
+        scan_seconds = best_of(args.repeats, scan)
+        columnar_seconds = best_of(args.repeats, columnar)
+        print(f"{name:<28} {scan_seconds * 1e3:>13.1f} {columnar_seconds * 1e3:>12.2f} {scan_seconds / columnar_seconds:>7.0f}x")
+
+    rng = random.Random(1)
+    # Half of the increments go to users not seen before
+    batches = [[(f"user_{rng.randrange(args.users * 2)}", rng.choice(TOPICS)) for _ in range(32)]
+               for _ in range(max(1, args.updates // 32))]
+    start = time.perf_counter()
+    for batch in batches:
+        analytics.record_many(batch, last_seen="2025-10-01T00:00:00")
+    update_seconds = time.perf_counter() - start
+    print(f"Incremental updates: {update_seconds / (len(batches) * 32) * 1e6:.2f} us per increment "
+          f"({analytics.num_users} users afterwards).")
+
+    if args.store:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            store = ProfileStore(os.path.join(tmp_dir, 'profiles.sqlite3'), flush_interval=0)
+            for topic in TOPICS:
+                updates = [user_id for user_id, profile in profiles.items() if topic in profile["error_counts"]]
+                store.increment_many([(user_id, topic) for user_id in updates], last_seen=since)
+            start = time.perf_counter()
+            ProfileAnalytics.from_store(store, follow=False)
+            print(f"Load from ProfileStore: {time.perf_counter() - start:.2f}s.")
+            store.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_profile_store.py
+"""
+Measures per-request profile I/O (one read plus one increment) as the number of users grows,
+for the SQLite profile store and the legacy whole-file JSON database.
+
+Usage (from the repository root):
+    python benchmarks/bench_profile_store.py --sizes 1000 10000 100000 1000000 --json-max 100000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.profile_store import ProfileStore
+
+TOPICS = ["Contractions", "Relative Pronouns", "Pronouns", "Articles and Gender"]
+
+
+def synthetic_profiles(num_users: int) -> dict:
+    rng = random.Random(0)
+    return {
+        f"user_{i}": {
+            "error_counts": {topic: rng.randint(1, 20) for topic in rng.sample(TOPICS, 2)},
+            "last_seen": "2025-08-30T10:00:00Z"
+        }
+        for i in range(num_users)
+    }
+
+
+def bench_json(path: str, user_ids: list) -> float:
+    """The pre-ProfileStore access pattern: parse the whole file to read, rewrite it to update."""
+    start = time.perf_counter()
+    for user_id in user_ids:
+        with open(path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f)
+        profiles.get(user_id)
+        with open(path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f)
+        profile = profiles.setdefault(user_id, {"error_counts": {}})
+        profile["error_counts"]["Contractions"] = profile["error_counts"].get("Contractions", 0) + 1
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, indent=2)
+    return (time.perf_counter() - start) / len(user_ids)
+
+
+def bench_store(store: ProfileStore, user_ids: list) -> float:
+    start = time.perf_counter()
+    for user_id in user_ids:
+        store.get(user_id)
+        store.increment(user_id, "Contractions")
+    store.flush()
+    return (time.perf_counter() - start) / len(user_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--requests', type=int, default=2000, help="Requests timed per size.")
+    parser.add_argument('--json-max', type=int, default=100000, help="Largest size also timed with the JSON database.")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        print(f"{'users':>10} {'sqlite us/req':>14} {'json us/req':>12}")
+        for num_users in args.sizes:
+            profiles = synthetic_profiles(num_users)
+            rng = random.Random(1)
+            user_ids = [f"user_{rng.randrange(num_users)}" for _ in range(args.requests)]
+
+            json_path = os.path.join(tmp_dir, f'profiles_{num_users}.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(profiles, f)
+            del profiles
+
+            store = ProfileStore.open(json_path, flush_interval=1.0)
+            store_seconds = bench_store(store, user_ids)
+            store.close()
+
+            json_cell = "-"
+            if num_users <= args.json_max:
+                # Each JSON request rewrites the whole file, so time fewer of them
+                json_cell = f"{bench_json(json_path, user_ids[:max(10, args.requests // 100)]) * 1e6:12.0f}"
+            print(f"{num_users:>10} {store_seconds * 1e6:>14.1f} {json_cell:>12}")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
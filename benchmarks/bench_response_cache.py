@@ -0,0 +1,119 @@
+# benchmarks/bench_response_cache.py
+"""
+Measures the response cache on traffic dominated by a few classic mistakes.
+
+Sentences are drawn from a dozen common errors with a Zipf-like popularity, and each draw is
+lightly perturbed (spacing, capitalisation, final punctuation) the way learners retype them.
+The same traffic runs through Tutor.correct with the cache off and on, with the stub LLM
+backend standing in for generation. Reports LLM prompts, hit rate and p50/p95 latency.
+
+Runs offline on the sample knowledge base with the hashing embedding backend:
+    python benchmarks/bench_response_cache.py --requests 2000 --stub-llm-ms 30
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.embeddings import HashingBackend
+from src.rag_pipeline import RAGPipeline
+from src.response_cache import ResponseCache
+from src.tutor import StubLLM, Tutor
+from src.vector_store import build_vector_store
+
+CLASSIC_MISTAKES = [
+    "Je vais à le parc.",
+    "C'est le livre que j'ai besoin.",
+    "J'ai mangé un pomme.",
+    "Ils sont les amis qui je joue avec.",
+    "Nous allons à le cinéma ce soir.",
+    "Elle parle de le film.",
+    "Je suis allé à le marché.",
+    "Il a besoin de le stylo.",
+    "C'est la chose que je parle.",
+    "Je pense de toi.",
+    "Elle est plus grande que moi.",
+    "Nous avons vu un maison.",
+]
+
+
+def realistic_traffic(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(CLASSIC_MISTAKES))]
+    sentences = []
+    for sentence in rng.choices(CLASSIC_MISTAKES, weights=weights, k=count):
+        if rng.random() < 0.3:
+            sentence = sentence.replace(" ", "  ", 1)
+        if rng.random() < 0.2:
+            sentence = sentence[:-1] + "!"
+        if rng.random() < 0.1:
+            sentence = sentence.lower()
+        sentences.append(sentence)
+    return sentences
+
+
+class CountingLLM(StubLLM):
+    def __init__(self, batch_latency_ms: float):
+        super().__init__(batch_latency_ms=batch_latency_ms)
+        self.prompts = 0
+
+    def generate_batch(self, prompts):
+        self.prompts += len(prompts)
+        return super().generate_batch(prompts)
+
+
+def run(tutor: Tutor, traffic: list) -> list:
+    latencies = []
+    for i, sentence in enumerate(traffic):
+        start = time.perf_counter()
+        tutor.correct(sentence, f"learner_{i % 200}")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--knowledge-base', default='data/sample_grammar_knowledge_base.json')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--stub-llm-ms', type=float, default=30.0)
+    parser.add_argument('--threshold', type=float, default=0.95)
+    args = parser.parse_args()
+
+    with open(args.knowledge_base, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    traffic = realistic_traffic(args.requests)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        encoder = HashingBackend(dim=128)
+        vector_db_path = os.path.join(tmp_dir, 'vector_store')
+        print(f"{'cache':<6} {'LLM prompts':>12} {'hit rate':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for enabled in (False, True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                build_vector_store(documents, encoder, vector_db_path, encoder.name)
+                pipeline = RAGPipeline(vector_db_path, os.path.join(tmp_dir, f'profiles_{enabled}.sqlite3'),
+                                       args.knowledge_base, embedding_model=encoder)
+                llm = CountingLLM(args.stub_llm_ms)
+                cache = ResponseCache(similarity_threshold=args.threshold) if enabled else None
+                tutor = Tutor("bench-base", "bench-adapter", vector_db_path, pipeline.user_profile_db_path,
+                              rag_pipeline=pipeline, llm=llm, response_cache=cache)
+                latencies = run(tutor, traffic)
+                tutor.profile_store.close()
+            hit_rate = cache.stats()["hit_rate"] if cache is not None else 0.0
+            print(f"{'on' if enabled else 'off':<6} {llm.prompts:>12} {hit_rate:>9.1%} "
+                  f"{np.percentile(latencies, 50) * 1e3:>8.2f} {np.percentile(latencies, 95) * 1e3:>8.2f}")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# benchmarks/bench_server_load.py
+"""
+Synthetic concurrent load against the asyncio tutor service (src/server.py).
+
+Runs the service in-process with the stub LLM backend and drives it with many simulated
+learners, once without micro-batching (max batch size 1) and once per requested batch size.
+Reports throughput, p50/p95/p99 latency, rejected requests and the mean batch size.
+
+Closed loop (each learner sends its next sentence as soon as it gets an answer):
+    python benchmarks/bench_server_load.py --concurrency 64 --requests 2000 --stub-llm-ms 40
+Open loop (Poisson arrivals at a fixed rate, which exposes queueing and backpressure):
+    python benchmarks/bench_server_load.py --rate 400 --duration 10 --stub-llm-ms 40
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.main import build_tutor
+from src.server import ServerBusyError, TutorService
+from src.tutor import StubLLM
+
+SENTENCES = [
+    "Je vais à le parc.",
+    "C'est le livre que j'ai besoin.",
+    "J'ai mangé un pomme.",
+    "Ils sont les amis qui je joue avec.",
+    "Nous allons à le cinéma ce soir.",
+    "Elle parle de le film.",
+]
+
+
+async def closed_loop(service: TutorService, concurrency: int, total_requests: int, latencies: list, rejected: list):
+    counter = iter(range(total_requests))
+
+    async def learner(learner_id: int):
+        rng = random.Random(learner_id)
+        for _ in counter:
+            start = time.perf_counter()
+            try:
+                await service.correct(rng.choice(SENTENCES), f"learner_{learner_id}")
+                latencies.append(time.perf_counter() - start)
+            except ServerBusyError:
+                rejected.append(1)
+
+    await asyncio.gather(*(learner(i) for i in range(concurrency)))
+
+
+async def open_loop(service: TutorService, rate: float, duration: float, latencies: list, rejected: list):
+    rng = random.Random(0)
+    tasks = []
+
+    async def one_request(i: int):
+        start = time.perf_counter()
+        try:
+            await service.correct(rng.choice(SENTENCES), f"learner_{i % 500}")
+            latencies.append(time.perf_counter() - start)
+        except ServerBusyError:
+            rejected.append(1)
+
+    end = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < end:
+        tasks.append(asyncio.ensure_future(one_request(i)))
+        i += 1
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+
+
+async def run_scenario(tutor, args, max_batch_size: int) -> dict:
+    service = TutorService(tutor, max_batch_size=max_batch_size, max_wait_ms=args.max_wait_ms,
+                           max_queue_size=args.max_queue_size)
+    await service.start()
+    latencies, rejected = [], []
+    start = time.perf_counter()
+    if args.rate:
+        await open_loop(service, args.rate, args.duration, latencies, rejected)
+    else:
+        await closed_loop(service, args.concurrency, args.requests, latencies, rejected)
+    elapsed = time.perf_counter() - start
+    await service.stop()
+    stats = service.batcher.stats()
+    return {
+        "max_batch_size": max_batch_size,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": np.percentile(latencies, 50) * 1e3,
+        "p95_ms": np.percentile(latencies, 95) * 1e3,
+        "p99_ms": np.percentile(latencies, 99) * 1e3,
+        "rejected": len(rejected),
+        "mean_batch": stats["mean_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rate', type=float, help="Open-loop arrival rate (requests/s). Overrides --concurrency.")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[8, 32])
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--max-queue-size', type=int, default=1024)
+    parser.add_argument('--stub-llm-ms', type=float, default=40.0, help="Stub LLM latency per batch.")
+    parser.add_argument('--stub-llm-per-prompt-ms', type=float, default=0.5, help="Stub LLM latency per prompt.")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+
+    # Scratch profile store so the benchmark leaves no trace
+    tmp_dir = tempfile.mkdtemp()
+    config['paths']['user_profiles'] = os.path.join(tmp_dir, 'user_profiles.json')
+    config.setdefault('profile_store', {})['db_path'] = os.path.join(tmp_dir, 'user_profiles.sqlite3')
+    config.setdefault('startup', {})['mode'] = 'eager'
+
+    try:
+        tutor = build_tutor(config)
+        tutor.llm = StubLLM(batch_latency_ms=args.stub_llm_ms, per_prompt_ms=args.stub_llm_per_prompt_ms)
+        load = f"open loop at {args.rate:g} req/s for {args.duration:g}s" if args.rate else \
+            f"{args.concurrency} concurrent learners, {args.requests} requests"
+        print(f"--- {load}; stub LLM {args.stub_llm_ms:g} ms/batch + {args.stub_llm_per_prompt_ms:g} ms/prompt ---")
+        print(f"{'max batch':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rejected':>9} {'mean batch':>11}")
+        for max_batch_size in [1] + args.batch_sizes:
+            with contextlib.redirect_stdout(io.StringIO()):
+                r = asyncio.run(run_scenario(tutor, args, max_batch_size))
+            print(f"{r['max_batch_size']:>9} {r['throughput']:>9.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+                  f"{r['p99_ms']:>9.1f} {r['rejected']:>9} {r['mean_batch']:>11.1f}")
+        tutor.profile_store.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/bench_startup.py
+"""
+Measures how quickly a fresh worker process becomes ready to serve, for each startup mode.
+
+Every measurement runs in a new Python process, so module imports, model loading and index
+reads are all cold (apart from the OS page cache). For each mode it reports:
+    import      time to import the application modules
+    construct   time until the Tutor constructor returns
+    ready       time until Tutor.readiness() reports every component loaded
+    first req   latency of the first correction
+    total       process start to first correction, as seen by the parent
+    rss         peak resident memory of the worker
+
+Usage (from the repository root, after running scripts/03_build_vector_store.py):
+    python benchmarks/bench_startup.py --modes eager background lazy --repeats 3
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(config_path: str, mode: str):
+    """Runs inside the worker process and prints its timings as JSON on the last line."""
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import yaml
+    from src.main import build_tutor
+    imported = time.perf_counter()
+
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    config.setdefault('startup', {})['mode'] = mode
+
+    tutor = build_tutor(config)
+    constructed = time.perf_counter()
+
+    if mode == 'background':
+        while not tutor.readiness()["ready"] and not tutor.readiness()["errors"]:
+            time.sleep(0.002)
+    ready = time.perf_counter()
+
+    tutor.correct("Je vais à le parc.", user_id="startup_bench")
+    first_request = time.perf_counter()
+    if mode == 'lazy':
+        # Lazy workers become ready by serving their first request
+        ready = first_request
+    tutor.profile_store.close()
+
+    print(json.dumps({
+        "import": imported - start,
+        "construct": constructed - imported,
+        "ready": ready - start,
+        "first_request": first_request - ready if mode != 'lazy' else first_request - constructed,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "load_seconds": tutor.readiness()["load_seconds"],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--modes', nargs='+', default=['eager', 'background', 'lazy'])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--child-mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_mode:
+        run_child(args.config, args.child_mode)
+        return
+
+    import yaml
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+
+    # Give the workers a scratch profile store so the benchmark leaves no trace
+    tmp_dir = tempfile.mkdtemp()
+    config['paths']['user_profiles'] = os.path.join(tmp_dir, 'user_profiles.json')
+    config.setdefault('profile_store', {})['db_path'] = os.path.join(tmp_dir, 'user_profiles.sqlite3')
+    config_path = os.path.join(tmp_dir, 'config.yaml')
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f)
+
+    try:
+        print(f"{'mode':<11} {'import s':>9} {'construct s':>12} {'ready s':>8} {'first req s':>12} {'total s':>8} {'rss MB':>8}")
+        for mode in args.modes:
+            runs = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--config', config_path, '--child-mode', mode],
+                    cwd=os.getcwd(), capture_output=True, text=True, check=True).stdout
+                total = time.perf_counter() - start
+                result = json.loads(output.strip().splitlines()[-1])
+                result["total"] = total
+                runs.append(result)
+
+            def best(key):
+                return min(run[key] for run in runs)
+            print(f"{mode:<11} {best('import'):>9.3f} {best('construct'):>12.3f} {best('ready'):>8.3f} "
+                  f"{best('first_request'):>12.3f} {best('total'):>8.3f} {best('rss_mb'):>8.0f}")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# benchmarks/run_benchmarks.py
+"""
+Benchmark suite for the tutor hot paths, with regression checks against a stored baseline.
+
+Runs fully offline: the knowledge base, user profiles and sentences are synthetic
+(benchmarks/synthetic.py) and embeddings come from a deterministic hashing stub, so the
+numbers measure our code rather than the embedding model. For each size it times:
+    grammar_db      RAGPipeline._query_grammar_db (embed + FAISS search + hit lookup)
+    user_profile    RAGPipeline._query_user_profile
+    update_profile  Tutor._update_user_profile
+    build_prompt    Tutor._build_prompt
+    end_to_end      Tutor.correct
+
+Each stage is timed in `repeats` rounds of fresh sentences and users, and the median of the
+rounds is kept, so a single noisy round does not move the result; `--runs` repeats the whole
+suite (deployments included) and takes the median over every round of every run, which also
+evens out slower and faster periods of the machine. Record baselines that way. Results are written as JSON
+with the hardware they ran on and compared (p50 per stage and size) with the baseline; the run
+exits with status 1 if any stage is slower than the baseline by more than its tolerance.
+Tolerances, sizes and the baseline path live in the `benchmarks` section of config.yaml.
+Re-record the baseline, on the machine that runs the comparisons, in every change that makes
+a measured stage faster or slower on purpose.
+
+Usage (from the repository root):
+    python benchmarks/run_benchmarks.py                      # run and compare with the baseline
+    python benchmarks/run_benchmarks.py --sizes 10 1000000   # scale up to 1M entries
+    python benchmarks/run_benchmarks.py --update-baseline --runs 3   # accept the current numbers
+    python benchmarks/run_benchmarks.py --metrics            # instrumentation on (overhead check)
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import populate_profile_store, synthetic_knowledge_base, synthetic_sentences
+from src.embeddings import HashingBackend
+from src.metrics import Metrics
+from src.profile_store import ProfileStore
+from src.rag_pipeline import RAGPipeline
+from src.tutor import Tutor
+from src.vector_store import build_vector_store
+
+STAGES = ['grammar_db', 'user_profile', 'update_profile', 'build_prompt', 'end_to_end']
+
+DEFAULT_SETTINGS = {
+    "baseline": "benchmarks/baseline.json",
+    "output": "benchmarks/results/latest.json",
+    "sizes": [10, 1000, 100000],
+    "iterations": 300,
+    "repeats": 5,
+    "min_delta_us": {"default": 5.0, "stages": {}},
+    "regression_tolerance": {"default": 0.3, "stages": {}},
+}
+
+
+def summarize(samples_ns: list) -> dict:
+    samples_us = np.asarray(samples_ns, dtype='float64') / 1000
+    return {
+        "p50_us": float(np.percentile(samples_us, 50)),
+        "p95_us": float(np.percentile(samples_us, 95)),
+        "mean_us": float(samples_us.mean()),
+    }
+
+
+def time_calls(fn, args_list: list) -> dict:
+    samples = []
+    for args in args_list:
+        start = time.perf_counter_ns()
+        fn(*args)
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+def median_summary(rounds: list) -> dict:
+    """Median of each statistic over the rounds, with every round's p50 for reference."""
+    summary = {key: float(np.median([timing[key] for timing in rounds])) for key in rounds[0]}
+    summary["p50_rounds_us"] = [timing["p50_us"] for timing in rounds]
+    return summary
+
+
+def bench_size(size: int, iterations: int, work_dir: str, metrics_enabled: bool = False, repeats: int = 1,
+               seed_offset: int = 0) -> dict:
+    """
+    Builds a synthetic deployment of `size` rules and users and times every stage in `repeats`
+    rounds. Returns the timings of every round for each stage.
+    """
+    encoder = HashingBackend(dim=128)
+    documents = synthetic_knowledge_base(size)
+    kb_path = os.path.join(work_dir, 'knowledge_base.json')
+    with open(kb_path, 'w', encoding='utf-8') as f:
+        json.dump(documents, f, ensure_ascii=False)
+    vector_db_path = os.path.join(work_dir, 'vector_store')
+    build_vector_store(documents, encoder, vector_db_path, encoder.name, batch_size=4096)
+    del documents
+
+    store = ProfileStore(os.path.join(work_dir, 'profiles.sqlite3'), flush_interval=1.0)
+    populate_profile_store(store, size)
+
+    pipeline = RAGPipeline(vector_db_path, store.db_path, kb_path, embedding_model=encoder, profile_store=store,
+                           metrics=Metrics(enabled=metrics_enabled))
+    tutor = Tutor("bench-base", "bench-adapter", vector_db_path, store.db_path, rag_pipeline=pipeline)
+
+    rounds = {stage: [] for stage in STAGES}
+    for repeat in range(repeats):
+        # Fresh sentences and users each round, so no round is served from another's caches
+        seed = size * 1000 + seed_offset + repeat
+        rng = random.Random(seed)
+        sentences = synthetic_sentences(iterations, seed=seed)
+        users = [f"user_{rng.randrange(size)}" for _ in range(iterations)]
+        topics = [pipeline._query_grammar_db(sentence)["topic"] for sentence in sentences[:10]]
+        context = pipeline.get_context(sentences[0], users[0])
+
+        rounds["grammar_db"].append(time_calls(pipeline._query_grammar_db, [(s,) for s in sentences]))
+        rounds["user_profile"].append(time_calls(pipeline._query_user_profile, [(u,) for u in users]))
+        rounds["update_profile"].append(time_calls(tutor._update_user_profile,
+                                                   [(u, topics[i % len(topics)]) for i, u in enumerate(users)]))
+        rounds["build_prompt"].append(time_calls(tutor._build_prompt, [(s, context) for s in sentences]))
+        rounds["end_to_end"].append(time_calls(tutor.correct, list(zip(sentences, users))))
+    store.close()
+    return rounds
+
+
+def hardware() -> dict:
+    """The CPU model and platform of this machine, recorded with the results."""
+    cpu_model = platform.processor()
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            cpu_model = next((line.split(':', 1)[1].strip() for line in f if line.startswith('model name')), cpu_model)
+    except OSError:
+        pass
+    return {"cpu_model": cpu_model, "platform": platform.platform(), "machine": platform.machine(),
+            "cpu_count": os.cpu_count()}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(current: dict, baseline: dict, tolerance: dict, min_delta_us) -> list:
+    """
+    Lists every (size, stage) whose p50 grew by more than its tolerance, ignoring changes smaller
+    than its `min_delta_us` ({"default", "stages"}, or one number for every stage). Sizes or
+    stages missing from the baseline are skipped.
+    """
+    if not isinstance(min_delta_us, dict):
+        min_delta_us = {"default": min_delta_us}
+    regressions = []
+    for size, stages in current["results"].items():
+        for stage, timing in stages.items():
+            reference = baseline.get("results", {}).get(size, {}).get(stage)
+            if reference is None:
+                continue
+            allowed = tolerance.get("stages", {}).get(stage, tolerance.get("default", 0.3))
+            min_delta = min_delta_us.get("stages", {}).get(stage, min_delta_us.get("default", 5.0))
+            delta = timing["p50_us"] - reference["p50_us"]
+            if delta > min_delta and delta > allowed * reference["p50_us"]:
+                regressions.append({
+                    "size": size,
+                    "stage": stage,
+                    "baseline_p50_us": reference["p50_us"],
+                    "current_p50_us": timing["p50_us"],
+                    "change": delta / reference["p50_us"],
+                    "tolerance": allowed,
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--sizes', type=int, nargs='+')
+    parser.add_argument('--iterations', type=int)
+    parser.add_argument('--repeats', type=int, help="Rounds per size; the median round is reported.")
+    parser.add_argument('--runs', type=int, default=1, help="Runs of the whole suite pooled into the medians.")
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--update-baseline', action='store_true', help="Write these results as the new baseline.")
+    parser.add_argument('--metrics', action='store_true', help="Enable the per-stage metrics instrumentation.")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        settings = {**DEFAULT_SETTINGS, **(yaml.safe_load(f).get('benchmarks') or {})}
+    sizes = args.sizes or settings['sizes']
+    iterations = args.iterations or settings['iterations']
+    repeats = args.repeats or settings['repeats']
+    output_path = args.output or settings['output']
+    baseline_path = args.baseline or settings['baseline']
+
+    current = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            **hardware(),
+            "iterations": iterations,
+            "repeats": repeats,
+            "runs": args.runs,
+            "metrics_enabled": args.metrics,
+        },
+        "results": {},
+    }
+    rounds = {size: {stage: [] for stage in STAGES} for size in sizes}
+    for run in range(args.runs):
+        for size in sizes:
+            work_dir = tempfile.mkdtemp()
+            try:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timings = bench_size(size, iterations, work_dir, metrics_enabled=args.metrics, repeats=repeats,
+                                         seed_offset=run * repeats)
+                for stage, stage_rounds in timings.items():
+                    rounds[size][stage].extend(stage_rounds)
+                print(f"Run {run + 1}/{args.runs}, size {size}: done in {time.perf_counter() - start:.1f}s")
+            finally:
+                shutil.rmtree(work_dir)
+    for size in sizes:
+        current["results"][str(size)] = {stage: median_summary(timings) for stage, timings in rounds[size].items()}
+
+    print(f"\n{'size':>8} " + " ".join(f"{stage:>15}" for stage in STAGES) + "   (p50 µs)")
+    for size, stages in current["results"].items():
+        print(f"{size:>8} " + " ".join(f"{stages[stage]['p50_us']:>15.1f}" for stage in STAGES))
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResults saved to '{output_path}'.")
+
+    if args.update_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline updated at '{baseline_path}'.")
+        return
+
+    try:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at '{baseline_path}'; run with --update-baseline to create one.")
+        return
+
+    if any(baseline["meta"].get(key) != current["meta"][key] for key in ("cpu_model", "machine", "cpu_count")):
+        print("Warning: the baseline was recorded on a different machine; expect noisy comparisons.")
+    print(f"Baseline recorded at commit {baseline['meta'].get('git_commit') or 'unknown'} on "
+          f"{baseline['meta'].get('cpu_model') or 'unknown hardware'} ({baseline['meta'].get('cpu_count')} CPUs), "
+          f"median of {baseline['meta'].get('repeats', 1) * baseline['meta'].get('runs', 1)} rounds.")
+    regressions = compare_results(current, baseline, settings['regression_tolerance'], settings['min_delta_us'])
+    if not regressions:
+        print("No regressions against the baseline.")
+        return
+    print(f"{len(regressions)} regression(s) against the baseline:")
+    for r in regressions:
+        print(f"  size {r['size']:>8} {r['stage']:<15} {r['baseline_p50_us']:10.1f} -> {r['current_p50_us']:10.1f} µs "
+              f"(+{r['change']:.0%}, tolerance {r['tolerance']:.0%})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# benchmarks/sweep_vector_index.py
+"""
+Sweeps FAISS index types and parameters over a knowledge base and a query set.
+
+For every candidate it reports recall@k against exact (flat) search, p50/p99 single-query
+latency, build time and serialized index size, so the `vector_index` section of config.yaml
+can be chosen from data.
+
+Candidates are written as `type:key=value,...`, for example:
+    python benchmarks/sweep_vector_index.py --k 5 \
+        --candidates flat ivf:nlist=64,nprobe=8 hnsw:M=32,ef_search=64 ivfpq:nlist=64,m=16,nbits=8
+
+Knowledge-base vectors are read from the vector store built by scripts/03_build_vector_store.py
+when available. --synthetic-size pads the knowledge base with perturbed copies of its vectors
+to see how each candidate behaves at a larger scale.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.embeddings import load_embedding_backend
+from src.vector_store import create_index, load_embeddings, load_manifest
+
+DEFAULT_CANDIDATES = [
+    "flat",
+    "ivf:nlist=64,nprobe=1", "ivf:nlist=64,nprobe=8", "ivf:nlist=64,nprobe=32",
+    "hnsw:M=16,ef_search=16", "hnsw:M=32,ef_search=64", "hnsw:M=32,ef_search=128",
+    "ivfpq:nlist=64,nprobe=8,m=16,nbits=8",
+]
+
+
+def parse_candidate(spec: str) -> dict:
+    """Turns 'ivf:nlist=64,nprobe=8' into {"type": "ivf", "nlist": 64, "nprobe": 8}."""
+    index_type, _, params = spec.partition(':')
+    config = {"type": index_type}
+    for item in filter(None, params.split(',')):
+        key, _, value = item.partition('=')
+        config[key] = int(value)
+    return config
+
+
+def load_queries(path: str) -> list:
+    """Reads a JSON list of sentences, or of dataset records with an 'input' field."""
+    with open(path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    return [record['input'] if isinstance(record, dict) else record for record in records]
+
+
+def load_vectors(config: dict, args):
+    """Returns (knowledge-base vectors, query vectors) as float32 matrices."""
+    model = None
+
+    def encode(texts):
+        nonlocal model
+        if model is None:
+            model = load_embedding_backend(config['model']['embedding_model_name'], config.get('embedding'))
+        return model.encode(texts)
+
+    manifest = load_manifest(config['paths']['vector_db'])
+    stored = load_embeddings(config['paths']['vector_db'], manifest) if manifest else None
+    if stored is not None:
+        print(f"Using {stored.shape[0]} stored knowledge-base vectors from '{config['paths']['vector_db']}'.")
+        kb_vectors = np.array(stored, dtype='float32')
+    else:
+        with open(config['paths']['knowledge_base'], 'r', encoding='utf-8') as f:
+            kb_vectors = encode([doc['content'] for doc in json.load(f)])
+
+    query_vectors = encode(load_queries(args.queries))
+    return kb_vectors, query_vectors
+
+
+def perturb(vectors: np.ndarray, count: int, rng: np.random.RandomState, noise: float) -> np.ndarray:
+    """Samples `count` noisy, re-normalised copies of the given vectors."""
+    picks = vectors[rng.randint(0, len(vectors), size=count)]
+    noisy = picks + rng.normal(scale=noise, size=picks.shape).astype('float32')
+    return (noisy / np.linalg.norm(noisy, axis=1, keepdims=True)).astype('float32')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--queries', default='data/sample_dataset.json', help="JSON list of sentences or dataset records.")
+    parser.add_argument('--candidates', nargs='+', default=DEFAULT_CANDIDATES)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--synthetic-size', type=int, default=0, help="Extra perturbed vectors added to the knowledge base.")
+    parser.add_argument('--min-queries', type=int, default=500, help="Pad the query set with perturbed vectors up to this size.")
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('--output', help="Optional path for a JSON report.")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+
+    rng = np.random.RandomState(0)
+    kb_vectors, query_vectors = load_vectors(config, args)
+    if args.synthetic_size:
+        kb_vectors = np.vstack([kb_vectors, perturb(kb_vectors, args.synthetic_size, rng, args.noise)])
+    if len(query_vectors) < args.min_queries:
+        query_vectors = np.vstack([query_vectors, perturb(kb_vectors, args.min_queries - len(query_vectors), rng, args.noise)])
+    ids = np.arange(len(kb_vectors), dtype='int64')
+    k = min(args.k, len(kb_vectors))
+    print(f"Sweeping {len(args.candidates)} candidates over {len(kb_vectors)} vectors and {len(query_vectors)} queries (k={k}).")
+
+    # Ground truth from exact search
+    exact = create_index(kb_vectors, ids, {"type": "flat"})
+    _, true_ids = exact.search(query_vectors, k)
+
+    results = []
+    for spec in args.candidates:
+        index_config = parse_candidate(spec)
+        start = time.perf_counter()
+        index = create_index(kb_vectors, ids, index_config)
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        found_ids = np.empty_like(true_ids)
+        for row, query in enumerate(query_vectors):
+            start = time.perf_counter()
+            _, found = index.search(query[None, :], k)
+            latencies.append(time.perf_counter() - start)
+            found_ids[row] = found[0]
+
+        recall = np.mean([len(set(found) & set(truth)) / k for found, truth in zip(found_ids, true_ids)])
+        results.append({
+            "candidate": spec,
+            "recall_at_k": float(recall),
+            "p50_ms": float(np.percentile(latencies, 50) * 1e3),
+            "p99_ms": float(np.percentile(latencies, 99) * 1e3),
+            "build_s": build_seconds,
+            "memory_mb": len(faiss.serialize_index(index)) / 1e6,
+        })
+
+    print(f"{'candidate':<42} {'recall@' + str(k):>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'MB':>8}")
+    for r in results:
+        print(f"{r['candidate']:<42} {r['recall_at_k']:>9.3f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['build_s']:>8.2f} {r['memory_mb']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"k": k, "num_vectors": len(kb_vectors), "num_queries": len(query_vectors), "results": results}, f, indent=2)
+        print(f"Report saved to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
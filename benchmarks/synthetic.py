@@ -0,0 +1,75 @@
+# benchmarks/synthetic.py
+"""
+Deterministic synthetic data for the benchmark suite, so the hot paths can be timed offline
+(with the hashing embedding backend of src/embeddings.py) at any scale from 10 to 1M
+knowledge-base entries or users.
+"""
+import random
+from typing import Dict, List
+
+TOPICS = [
+    "Contractions", "Relative Pronouns", "Pronouns", "Articles and Gender", "Verb Conjugation",
+    "Subjunctive", "Agreement of Past Participles", "Prepositions", "Negation", "Adjective Placement",
+]
+
+WORDS = [
+    "parc", "livre", "pomme", "amis", "maison", "école", "voiture", "chanson", "fenêtre", "table",
+    "besoin", "parler", "rêver", "aller", "venir", "manger", "jouer", "ville", "hôpital", "arbre",
+]
+
+ARTICLES = ["le", "la", "les", "un", "une", "des", "du", "au", "aux"]
+
+SENTENCE_TEMPLATES = [
+    "Je vais à {article} {word}.",
+    "C'est {article} {word} que j'ai besoin.",
+    "J'ai mangé {article} {word}.",
+    "Ils sont les {word} qui je joue avec.",
+    "Nous parlons de {article} {word}.",
+]
+
+
+def synthetic_knowledge_base(size: int, seed: int = 0) -> List[dict]:
+    """Generates `size` grammar-rule documents with unique rule_ids and varied content."""
+    rng = random.Random(seed)
+    documents = []
+    for i in range(size):
+        topic = TOPICS[i % len(TOPICS)]
+        a, b = rng.sample(WORDS, 2)
+        article = rng.choice(ARTICLES)
+        documents.append({
+            "rule_id": f"rule_{i:07d}",
+            "topic": topic,
+            "content": f"{topic}: with '{a}', the article '{article}' changes before '{b}'. "
+                       f"For example, 'à {article} {a}' is corrected when it precedes '{b}'.",
+        })
+    return documents
+
+
+def synthetic_profiles(num_users: int, seed: int = 0) -> Dict[str, dict]:
+    """Generates user profiles in the legacy JSON shape, two to four topics per user."""
+    rng = random.Random(seed)
+    return {
+        f"user_{i}": {
+            "error_counts": {topic: rng.randint(1, 30) for topic in rng.sample(TOPICS, rng.randint(2, 4))},
+            "last_seen": f"2025-08-{rng.randint(1, 30):02d}T10:00:00",
+        }
+        for i in range(num_users)
+    }
+
+
+def populate_profile_store(store, num_users: int, seed: int = 0, chunk_size: int = 50000):
+    """Fills a ProfileStore with synthetic users, chunk by chunk to bound memory at 1M users."""
+    rng = random.Random(seed)
+    for start in range(0, num_users, chunk_size):
+        updates = []
+        for i in range(start, min(start + chunk_size, num_users)):
+            for topic in rng.sample(TOPICS, rng.randint(2, 4)):
+                updates.extend([(f"user_{i}", topic)] * rng.randint(1, 3))
+        store.increment_many(updates, last_seen="2025-08-30T10:00:00")
+        store.flush()
+
+
+def synthetic_sentences(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [rng.choice(SENTENCE_TEMPLATES).format(article=rng.choice(ARTICLES), word=rng.choice(WORDS))
+            for _ in range(count)]
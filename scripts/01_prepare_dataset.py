@@ -1,8 +1,29 @@
 # scripts/01_prepare_dataset.py
-import pandas as pd
+import argparse
 import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import pandas as pd
 import yaml
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.dataset_dedup import dedup_dataset, dedup_output_path, format_dedup_report, load_dedup_options
+
+INSTRUCTION = "Analyze the user's French sentence. If it contains a grammatical error, provide the corrected sentence and a detailed, step-by-step explanation of the rule that was broken. The explanation should be encouraging and educational."
+
+EXPLANATION_MAP = {
+    "'pomme' is feminine, use 'une' not 'un'": "Excellent try! The error here is with the article. The noun 'pomme' (apple) is a feminine noun in French. Therefore, you need to use the feminine indefinite article 'une' instead of the masculine 'un'. Keep up the great work!",
+    "'avoir besoin de', relative clause requires 'dont'": "Très bien ! The verb 'avoir besoin' is always followed by the preposition 'de'. When this is the object of a relative clause, you must use the pronoun 'dont'. This is a common point of confusion!",
+    "use 'Ce sont' for identification, preposition 'avec' moves before 'qui'": "Good sentence structure! In French, it's more natural to use 'Ce sont' instead of 'Ils sont' when identifying people. Also, the preposition 'avec' should come before the relative pronoun 'qui'. You're doing great!"
+}
+
+DEFAULT_EXPLANATION = "A grammatical rule has been applied to correct this sentence."
+
+RAW_COLUMNS = ['incorrect_sentence', 'correct_sentence', 'explanation_notes']
+
 
 def create_instruction(row):
     """
@@ -10,55 +31,153 @@ def create_instruction(row):
     This function enriches the concise explanation notes into a more complete,
     human-like response suitable for training an educational model.
     """
-    instruction = "Analyze the user's French sentence. If it contains a grammatical error, provide the corrected sentence and a detailed, step-by-step explanation of the rule that was broken. The explanation should be encouraging and educational."
-    
-    explanation_map = {
-        "'pomme' is feminine, use 'une' not 'un'": "Excellent try! The error here is with the article. The noun 'pomme' (apple) is a feminine noun in French. Therefore, you need to use the feminine indefinite article 'une' instead of the masculine 'un'. Keep up the great work!",
-        "'avoir besoin de', relative clause requires 'dont'": "Très bien ! The verb 'avoir besoin' is always followed by the preposition 'de'. When this is the object of a relative clause, you must use the pronoun 'dont'. This is a common point of confusion!",
-        "use 'Ce sont' for identification, preposition 'avec' moves before 'qui'": "Good sentence structure! In French, it's more natural to use 'Ce sont' instead of 'Ils sont' when identifying people. Also, the preposition 'avec' should come before the relative pronoun 'qui'. You're doing great!"
-    }
-    
     # Use the map to get the full explanation, or provide a default if a note is not found
-    full_explanation = explanation_map.get(row['explanation_notes'], "A grammatical rule has been applied to correct this sentence.")
+    full_explanation = EXPLANATION_MAP.get(row['explanation_notes'], DEFAULT_EXPLANATION)
 
     formatted_output = {
         "correction": row['correct_sentence'],
         "explanation": full_explanation
     }
-    
+
     return {
-        "instruction": instruction,
+        "instruction": INSTRUCTION,
         "input": row['incorrect_sentence'],
         "output": formatted_output
     }
 
+
+def create_instructions(chunk: pd.DataFrame) -> List[dict]:
+    """
+    Vectorized `create_instruction` for a whole chunk: the explanation notes are mapped
+    column-wise and the records are assembled from the columns, without a per-row apply.
+    """
+    explanations = chunk['explanation_notes'].map(EXPLANATION_MAP).fillna(DEFAULT_EXPLANATION)
+    return [
+        {"instruction": INSTRUCTION, "input": incorrect, "output": {"correction": correct, "explanation": explanation}}
+        for incorrect, correct, explanation in zip(chunk['incorrect_sentence'].tolist(), chunk['correct_sentence'].tolist(),
+                                                   explanations.tolist())
+    ]
+
+
+def serialize_chunk(chunk: pd.DataFrame, jsonl: bool) -> str:
+    """
+    Formats a chunk and serializes its records: one line each for JSONL, or the indented
+    array elements `json.dump(records, indent=2)` would write, joined with ",\\n".
+    """
+    records = create_instructions(chunk)
+    if jsonl:
+        return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+    return ",\n".join("  " + json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  ") for record in records)
+
+
+def prepare_dataset(raw_data_path: str, output_path: str, chunk_size: int = 100000, workers: int = 1) -> int:
+    """
+    Streams the raw CSV into the instruction-tuning dataset, one chunk at a time.
+
+    The output format follows the file extension: `.jsonl` writes one record per line,
+    anything else writes the indented JSON array of the original script, byte for byte.
+    The file is written next to `output_path` and moved into place when complete.
+
+    Args:
+        raw_data_path (str): CSV with incorrect_sentence, correct_sentence and explanation_notes columns.
+        output_path (str): Destination file.
+        chunk_size (int): Rows read and formatted at a time.
+        workers (int): Processes formatting chunks in parallel. 1 formats in this process.
+
+    Returns:
+        int: The number of records written.
+    """
+    jsonl = output_path.endswith('.jsonl')
+    # Read the text columns as strings so every chunk has the same types; empty cells stay NaN
+    chunks = pd.read_csv(raw_data_path, usecols=RAW_COLUMNS, dtype=str, chunksize=chunk_size)
+    tmp_path = f"{output_path}.tmp"
+    num_records = 0
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if not jsonl:
+                f.write("[")
+            pending = []
+            first = True
+
+            def write(serialized: str, rows: int):
+                nonlocal first, num_records
+                if not rows:
+                    return
+                if not jsonl:
+                    serialized = ("\n" if first else ",\n") + serialized
+                f.write(serialized)
+                first = False
+                num_records += rows
+
+            for chunk in chunks:
+                if executor is None:
+                    write(serialize_chunk(chunk, jsonl), len(chunk))
+                    continue
+                # Keep a bounded number of chunks in flight and write results in input order
+                pending.append((executor.submit(serialize_chunk, chunk, jsonl), len(chunk)))
+                if len(pending) >= 2 * workers:
+                    future, rows = pending.pop(0)
+                    write(future.result(), rows)
+            for future, rows in pending:
+                write(future.result(), rows)
+
+            if not jsonl:
+                f.write("]" if first else "\n]")
+        os.replace(tmp_path, output_path)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return num_records
+
+
 def main():
     """
     Processes the raw data, transforms it into the instruction-tuning
-    format, and saves the result as a JSON file based on paths in config.yaml.
+    format, and saves the result based on paths in config.yaml.
     """
+    parser = argparse.ArgumentParser(description="Prepare the instruction-tuning dataset from the raw error corpus.")
+    parser.add_argument('--input', help="Raw CSV (defaults to paths.raw_data).")
+    parser.add_argument('--output', help="Output .json or .jsonl file (defaults to finetune.dataset_path, "
+                                         "the dataset scripts/02_finetune_with_lora.py trains on).")
+    parser.add_argument('--chunk-size', type=int, help="Rows formatted at a time.")
+    parser.add_argument('--workers', type=int, help="Processes formatting chunks in parallel.")
+    parser.add_argument('--dedup', action='store_true', help="Also write a copy without near-duplicate records (see dataset_dedup).")
+    parser.add_argument('--no-dedup', action='store_true', help="Skip deduplication even when dataset_dedup.enabled is set.")
+    parser.add_argument('--dedup-in-place', action='store_true', help="Deduplicate the output file itself instead of a copy.")
+    args = parser.parse_args()
+
     print("Starting dataset preparation...")
-    
+
     with open('config.yaml', 'r') as f:
         config = yaml.safe_load(f)
+    preparation_config = config.get('dataset_preparation', {})
 
-    raw_data_path = config['paths']['raw_data']
-    output_path = config['paths']['finetune_dataset_sample']
+    raw_data_path = args.input or config['paths']['raw_data']
+    output_path = args.output or config.get('finetune', {}).get('dataset_path', 'data/final_dataset.json')
+    chunk_size = args.chunk_size or preparation_config.get('chunk_size', 100000)
+    workers = args.workers or preparation_config.get('workers', 1)
 
+    print(f"Formatting '{raw_data_path}' into instruction-tuning format "
+          f"({chunk_size} rows per chunk, {workers} worker{'s' if workers > 1 else ''})...")
     try:
-        raw_df = pd.read_csv(raw_data_path)
-        print(f"Loaded {len(raw_df)} records from '{raw_data_path}'.")
+        num_records = prepare_dataset(raw_data_path, output_path, chunk_size=chunk_size, workers=workers)
     except FileNotFoundError:
         print(f"Error: Raw data file not found at '{raw_data_path}'.")
         return
 
-    print("Formatting data into instruction-tuning format...")
-    formatted_data = raw_df.apply(create_instruction, axis=1).tolist()
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(formatted_data, f, indent=2, ensure_ascii=False)
-        
-    print(f"Dataset preparation complete. Formatted sample saved to '{output_path}'.")
+    print(f"Dataset preparation complete. {num_records} formatted records saved to '{output_path}'.")
+
+    dedup_config = config.get('dataset_dedup', {})
+    if (args.dedup or args.dedup_in_place or dedup_config.get('enabled')) and not args.no_dedup:
+        in_place = args.dedup_in_place or dedup_config.get('in_place', False)
+        dedup_path = output_path if in_place else dedup_output_path(output_path)
+        print(f"Removing near-duplicate records into '{dedup_path}'...")
+        report = dedup_dataset(output_path, dedup_path, **load_dedup_options(dedup_config))
+        print(format_dedup_report(report))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
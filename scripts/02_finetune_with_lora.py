@@ -1,6 +1,8 @@
 # scripts/02_finetune_with_lora.py
+import os
+import sys
 import torch
-from datasets import load_dataset
+import yaml
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
@@ -10,6 +12,22 @@ from transformers import (
 from peft import LoraConfig
 from trl import SFTTrainer
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.sequence_packing import PackedDataset, build_packed_dataset, format_padding_report, torch_collator
+
+
+class TorchPackedDataset(torch.utils.data.Dataset):
+    """Exposes the memory-mapped packed shards to the Trainer."""
+    def __init__(self, packed: PackedDataset):
+        self.packed = packed
+
+    def __len__(self):
+        return len(self.packed)
+
+    def __getitem__(self, index):
+        return self.packed[index]
+
+
 def main():
     """
     This script fine-tunes the Qwen3-8B-Instruct model using LoRA.
@@ -19,9 +37,15 @@ def main():
     print("Starting the fine-tuning process for Qwen3-8B-Instruct...")
 
     # --- 1. Configuration ---
-    model_name = "Qwen/Qwen3-8B-Instruct" # CORRECTED to the SOTA model series
-    dataset_path = "data/final_dataset.json"
-    lora_adapter_path = "models/qwen3-8b-lora" # CORRECTED path
+    with open('config.yaml', 'r') as f:
+        config = yaml.safe_load(f)
+    finetune_config = config.get('finetune', {})
+    model_name = config['model']['base_model_name']
+    dataset_path = finetune_config.get('dataset_path', "data/final_dataset.json")
+    lora_adapter_path = config['model']['lora_adapter_path']
+    max_seq_length = finetune_config.get('max_seq_length', 1024)
+    per_device_train_batch_size = finetune_config.get('per_device_train_batch_size', 4)
+    attn_implementation = finetune_config.get('attn_implementation', 'sdpa')
 
     # --- The rest of the script remains the same ---
     print("Step 1: Loading base model with 4-bit quantization...")
@@ -34,6 +58,7 @@ def main():
     model = AutoModelForCausalLM.from_pretrained(
         model_name,
         quantization_config=bnb_config,
+        attn_implementation=attn_implementation,
         device_map="auto"
     )
     model.config.use_cache = False
@@ -54,25 +79,31 @@ def main():
         target_modules=["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj", "up_proj", "down_proj"]
     )
 
-    # --- 5. Format the dataset with the Qwen2 Chat Template ---
-    # This is a crucial step for instruction-tuned models.
-    def format_dataset(example):
-        # This function would format your instruction/input/output into the model's required chat format.
-        # For demonstration, we assume a simple concatenation.
-        text = f"<|im_start|>system\n{example['instruction']}<|im_end|>\n<|im_start|>user\n{example['input']}<|im_end|>\n<|im_start|>assistant\n{example['output']}<|im_end|>"
-        return {"text": text}
-
-    print("Step 4: Loading and preparing dataset with chat template...")
-    # dataset = load_dataset("json", data_files=dataset_path, split="train")
-    # formatted_dataset = dataset.map(format_dataset)
-    print("Dataset loaded and formatted successfully (simulation).")
+    # --- 5. Load the pre-tokenized, packed dataset ---
+    # Examples are rendered with the ChatML template, tokenized once and packed into full-length
+    # sequences (see src/sequence_packing.py). The shards are cached by tokenizer, template and
+    # dataset hash, so this step is a memory-map when `python -m src.sequence_packing` already ran.
+    print("Step 4: Loading the packed, pre-tokenized dataset...")
+    manifest = build_packed_dataset(
+        dataset_path,
+        tokenizer,
+        finetune_config.get('packed_cache_dir', 'data/packed'),
+        max_seq_length=max_seq_length,
+        shard_size=finetune_config.get('shard_size', 8192),
+        batch_size=per_device_train_batch_size
+    )
+    packed_dataset = PackedDataset(manifest["path"])
+    print(format_padding_report(manifest["stats"]))
 
     # --- 6. Set Training Arguments ---
     training_arguments = TrainingArguments(
         output_dir="./results",
         num_train_epochs=1,
-        per_device_train_batch_size=4,
+        per_device_train_batch_size=per_device_train_batch_size,
         gradient_accumulation_steps=1,
+        # Packed sequences are stored longest first; keep batches of similar length together
+        group_by_length=True,
+        remove_unused_columns=False,
         optim="paged_adamw_32bit",
         bf16=True, # A6000 supports bfloat16
         # ... other args
@@ -80,12 +111,18 @@ def main():
 
     # --- 7. Initialize Trainer ---
     print("Step 5: Initializing the SFTTrainer...")
+    # Packed examples must not attend to each other. flash_attention_2 finds their boundaries in
+    # the restarting position ids, as long as the batch carries no attention_mask; eager and
+    # SDPA attention get the 4D block-diagonal mask from the collator instead.
+    data_collator = torch_collator(packed_dataset.pad_token_id,
+                                   block_diagonal=attn_implementation != "flash_attention_2",
+                                   dtype=torch.bfloat16)
     trainer = SFTTrainer(
         model=model,
-        # train_dataset=formatted_dataset, # Use the formatted dataset
+        train_dataset=TorchPackedDataset(packed_dataset),
         peft_config=peft_config,
-        dataset_text_field="text",
-        max_seq_length=1024,
+        data_collator=data_collator,
+        dataset_kwargs={"skip_prepare_dataset": True},
         tokenizer=tokenizer,
         args=training_arguments,
     )
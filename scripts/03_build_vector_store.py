@@ -1,21 +1,38 @@
 # scripts/03_build_vector_store.py
+import argparse
+import functools
 import json
 import os
-import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+import sys
 import yaml
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.embeddings import backend_name, embedding_config_with_defaults, load_embedding_backend
+from src.vector_store import build_vector_store
+
 def main():
     """
     This script builds the FAISS vector store for the RAG pipeline.
     
     It performs the following steps:
     1. Loads the grammar knowledge base documents.
-    2. Uses a pre-trained Sentence Transformer model to generate embeddings for each document.
-    3. Creates a FAISS index from these embeddings.
-    4. Saves the FAISS index and a corresponding mapping file to disk.
+    2. Compares them with the build manifest to find added, changed and deleted rules.
+    3. Uses the embedding backend configured in config.yaml (`embedding.index_backend`, or
+       `embedding.backend`) to embed only the documents that need it (or all of them with --full).
+       Large jobs are split into shards (`vector_store_build`), embedded across worker processes
+       into on-disk memmaps; an interrupted build resumes from the completed shards.
+    4. Builds an ID-mapped FAISS index of the type chosen in config.yaml (`vector_index`),
+       so every rule keeps a stable id across builds.
+    5. Builds the BM25 lexical index (`lexical_index`) over the same rules and ids.
+    6. Saves the FAISS index, the lexical index, the docstore and the manifest to disk.
     """
+    parser = argparse.ArgumentParser(description="Build or update the FAISS vector store.")
+    parser.add_argument('--full', action='store_true', help="Re-embed every document instead of only the changed ones.")
+    parser.add_argument('--backend', help="Embedding backend overriding the config (sentence_transformers, quantized, hashing).")
+    parser.add_argument('--workers', type=int, help="Processes embedding shards in parallel (overrides vector_store_build.workers).")
+    parser.add_argument('--shard-size', type=int, help="Documents per shard (overrides vector_store_build.shard_size).")
+    args = parser.parse_args()
+
     print("Starting the vector store build process...")
 
     with open('config.yaml', 'r') as f:
@@ -24,12 +41,14 @@ def main():
     knowledge_base_path = config['paths']['knowledge_base']
     output_dir = config['paths']['vector_db']
     model_name = config['model']['embedding_model_name']
-
-    index_path = os.path.join(output_dir, 'faiss_index.bin')
-    corpus_path = os.path.join(output_dir, 'corpus.json')
-
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
+    embedding_config = embedding_config_with_defaults(config.get('embedding'))
+    backend = args.backend or embedding_config['index_backend'] or embedding_config['backend']
+    build_config = config.get('vector_store_build', {})
+    workers = args.workers or build_config.get('workers', 1)
+    shard_size = args.shard_size or build_config.get('shard_size')
+    if workers > 1 and not embedding_config['num_threads']:
+        # Split the cores between the workers instead of letting each use all of them
+        embedding_config['num_threads'] = max(1, (os.cpu_count() or 1) // workers)
 
     # 1. Load the knowledge base
     try:
@@ -40,38 +59,18 @@ def main():
         print(f"Error: Knowledge base file not found at '{knowledge_base_path}'.")
         return
 
-    # The corpus is the text content we want to embed and retrieve
-    corpus = [doc['content'] for doc in documents]
-
-    # 2. Initialize the embedding model
-    print("Loading sentence transformer model ('all-MiniLM-L6-v2')...")
-    # This model is small, efficient, and great for this task.
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    # 2. Initialize the embedding backend (in each worker process when embedding in parallel)
+    encoder_factory = functools.partial(load_embedding_backend, model_name, embedding_config, backend)
+    model = encoder_factory() if workers <= 1 else None
 
-    # 3. Generate embeddings
-    print("Generating embeddings for the corpus... This may take a moment.")
-    embeddings = model.encode(corpus, convert_to_tensor=False, show_progress_bar=True)
-    
-    # Ensure embeddings are in the right format (float32) for FAISS
-    embeddings = np.array(embeddings).astype('float32')
-    
-    # 4. Build the FAISS index
-    embedding_dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(embedding_dimension)
-    index.add(embeddings)
-    
-    print(f"FAISS index built successfully with {index.ntotal} vectors.")
-
-    # 5. Save the index and the corpus mapping
-    faiss.write_index(index, index_path)
-    print(f"FAISS index saved to '{index_path}'.")
-    
-    # The corpus file maps the index position to the original document content
-    with open(corpus_path, 'w', encoding='utf-8') as f:
-        json.dump(corpus, f, indent=2, ensure_ascii=False)
-    print(f"Corpus mapping saved to '{corpus_path}'.")
+    # 3-6. Embed what changed, update the indexes and save everything
+    build_vector_store(documents, model, output_dir, backend_name(model_name, embedding_config, backend),
+                       incremental=not args.full, batch_size=embedding_config['max_batch_size'],
+                       index_config=config.get('vector_index'), lexical_config=config.get('lexical_index'),
+                       shard_size=shard_size, workers=workers, encoder_factory=encoder_factory)
+    print(f"Vector store saved to '{output_dir}'.")
     
     print("Vector store build process complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
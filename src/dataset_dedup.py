@@ -0,0 +1,354 @@
+# src/dataset_dedup.py
+"""
+Near-duplicate removal for the instruction dataset, run between scripts/01_prepare_dataset.py
+and fine-tuning.
+
+Each record is reduced to the character shingles (`shingle_size` consecutive characters) of
+its lowercased, whitespace-collapsed `input` and `output.correction`, and summarised by a
+MinHash signature of `num_perm` values: the fraction of equal values between two signatures
+estimates the Jaccard similarity of their shingle sets. Signatures are split into bands for
+locality-sensitive hashing, so a record is compared only with the kept records sharing a
+band with it, not with every other record. A record whose estimated similarity to one of
+them reaches `threshold` is dropped; the first occurrence is kept.
+
+Records that survive are also capped per explanation (`max_per_explanation`): the dataset
+repeats a few explanation templates thousands of times, and past the cap extra copies add
+training tokens rather than signal.
+
+The dataset is streamed in chunks of `chunk_size` records (shingle hashing and MinHash are
+vectorized over a chunk), and only the kept records' signatures and band keys are held in
+memory, so removals make the pass cheaper. Run it with:
+    python -m src.dataset_dedup --input data/final_dataset.jsonl --output data/final_dataset.dedup.jsonl
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .sequence_packing import format_example, iter_examples
+
+DEFAULT_DEDUP_CONFIG = {
+    "threshold": 0.8,
+    "num_perm": 128,
+    "shingle_size": 5,
+    "max_per_explanation": None,
+    "chunk_size": 10000,
+    "seed": 0,
+}
+# Rough characters per token of the training text, for the savings estimate without a tokenizer
+CHARS_PER_TOKEN = 4.0
+# Shingle hashes per MinHash block (bounds the num_perm x block working matrix)
+_BLOCK_SHINGLES = 32768
+# Index of the high 32 bits when a uint64 array is viewed as uint32 pairs
+_HIGH_HALF = 1 if sys.byteorder == 'little' else 0
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so nearby shingle hashes end up far apart."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def dedup_text(record: dict) -> str:
+    """The text a record is compared on: its normalized input and corrected sentence."""
+    output = record.get('output')
+    correction = output.get('correction') if isinstance(output, dict) else output
+    return " ".join(f"{record.get('input') or ''}\x1f{correction or ''}".lower().split())
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Picks the (bands, rows) split of a signature: among the splits with bands * rows ==
+    num_perm, the one whose collision threshold (1 / bands) ** (1 / rows) is the highest not
+    above `threshold`. Pairs at the threshold then share a band with high probability; the
+    false candidates this lets through are removed by comparing signatures.
+    """
+    splits = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [(bands, rows) for bands, rows in splits if (1 / bands) ** (1 / rows) <= threshold]
+    return max(below, key=lambda split: (1 / split[0]) ** (1 / split[1])) if below else splits[0]
+
+
+class MinHasher:
+    """
+    Vectorized MinHash over character shingles: `signatures(texts)` returns a
+    (len(texts), num_perm) uint32 array.
+    """
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 0):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash family: h_i(x) = (a_i * x + b_i) >> 32, with odd a_i
+        self._a = rng.integers(1, 2 ** 63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=(num_perm, 1), dtype=np.uint64)
+        self._powers = np.uint64(1000003) ** np.arange(shingle_size - 1, -1, -1, dtype=np.uint64)
+
+    def shingle_hashes(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Hashes every shingle of every text at once.
+
+        Returns:
+            tuple: (hashes uint64, starts) where the shingles of text i are hashes[starts[i]:starts[i + 1]].
+        """
+        k = self.shingle_size
+        # Texts shorter than a shingle are padded to one shingle
+        texts = [text.ljust(k, '\0') for text in texts]
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        codes = np.frombuffer("".join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        windows = np.lib.stride_tricks.sliding_window_view(codes, k)
+        hashes = _mix((windows * self._powers).sum(axis=1, dtype=np.uint64))
+        # Drop the windows that straddle two texts
+        counts = lengths - k + 1
+        ends = np.cumsum(lengths)
+        keep = np.ones(len(hashes), dtype=bool)
+        for offset in range(1, k):
+            straddling = ends[:-1] - offset
+            keep[straddling[straddling < len(keep)]] = False
+        starts = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=starts[1:])
+        return hashes[keep], starts
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        hashes, starts = self.shingle_hashes(texts)
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        first = 0
+        while first < len(texts):
+            # Group whole texts into blocks of about _BLOCK_SHINGLES shingles
+            last = max(int(np.searchsorted(starts, starts[first] + _BLOCK_SHINGLES, side='right')) - 1, first + 1)
+            last = min(last, len(texts))
+            block = hashes[starts[first]:starts[last]]
+            values = np.multiply(self._a, block[None, :])
+            values += self._b
+            # The high 32 bits, read in place instead of shifted and cast
+            high = values.view(np.uint32)[:, _HIGH_HALF::2]
+            signatures[first:last] = np.minimum.reduceat(high, starts[first:last] - starts[first], axis=1).T
+            first = last
+        return signatures
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of the kept records' signatures. `add_if_new(signature)` returns True and
+    indexes the signature when no kept record is estimated at least `threshold` similar.
+    """
+    def __init__(self, num_perm: int = 128, threshold: float = 0.8, seed: int = 0):
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        rng = np.random.default_rng(seed + 1)
+        self._band_coefficients = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._buckets = [dict() for _ in range(self.bands)]
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.size = 0
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """One uint64 key per band of each signature: a (len(signatures), bands) array."""
+        banded = signatures[:, :self.bands * self.rows].reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (banded * self._band_coefficients).sum(axis=2, dtype=np.uint64)
+
+    def _best_match(self, signature: np.ndarray, candidates: set) -> int:
+        """The most signature values any candidate row has in common with `signature`."""
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        return int(np.count_nonzero(self._signatures[rows] == signature, axis=1).max())
+
+    def add_if_new(self, signature: np.ndarray, keys: List[int]) -> bool:
+        # A bucket holds a row number, or a list once several kept rows share the key. Rows met
+        # alone are checked first: a near-duplicate usually shares several bands with its match,
+        # so the crowded buckets of common phrasings rarely need scanning
+        single, shared = set(), set()
+        for bucket, key in zip(self._buckets, keys):
+            rows = bucket.get(key)
+            if rows is None:
+                continue
+            if isinstance(rows, list):
+                shared.update(rows)
+            else:
+                single.add(rows)
+        for candidates in (single, shared - single):
+            if candidates and self._best_match(signature, candidates) >= self.threshold * self.num_perm:
+                return False
+        if self.size == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        self._signatures[self.size] = signature
+        for bucket, key in zip(self._buckets, keys):
+            rows = bucket.get(key)
+            if rows is None:
+                bucket[key] = self.size
+            elif isinstance(rows, list):
+                rows.append(self.size)
+            else:
+                bucket[key] = [rows, self.size]
+        self.size += 1
+        return True
+
+
+def iter_deduplicated(records: Iterator[dict], threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 5,
+                      max_per_explanation: Optional[int] = None, chunk_size: int = 10000, seed: int = 0,
+                      tokenizer=None, report: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Yields the records that are neither near-duplicates of an earlier kept record nor past
+    the per-explanation cap, in input order.
+
+    Args:
+        records (iterator[dict]): Instruction records (`instruction`, `input`, `output`).
+        threshold (float): Estimated Jaccard similarity of shingle sets at which a record is a duplicate.
+        num_perm (int): MinHash signature length.
+        shingle_size (int): Characters per shingle.
+        max_per_explanation (int, optional): Kept records per distinct `output.explanation`. None keeps all.
+        chunk_size (int): Records signed at a time.
+        seed (int): Seed of the hash functions.
+        tokenizer (optional): Hugging Face-style tokenizer counting the training tokens; without
+            one they are estimated from the text length.
+        report (dict, optional): Filled in with the counts of `dedup_report`, and updated as records stream.
+    """
+    report = report if report is not None else {}
+    report.update({"records": 0, "kept": 0, "near_duplicates": 0, "over_explanation_cap": 0,
+                   "tokens": 0, "kept_tokens": 0, "tokens_estimated": tokenizer is None})
+    hasher = MinHasher(num_perm, shingle_size, seed)
+    index = NearDuplicateIndex(num_perm, threshold, seed)
+    per_explanation = {}
+
+    def token_counts(chunk: List[dict]) -> List[int]:
+        texts = ["".join(format_example(record)) for record in chunk]
+        if tokenizer is None:
+            return [math.ceil(len(text) / CHARS_PER_TOKEN) for text in texts]
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def process(chunk: List[dict]) -> Iterator[dict]:
+        # Exact repeats within the chunk are signed once; all but the first are duplicates
+        texts, rows = {}, []
+        for record in chunk:
+            rows.append(texts.setdefault(dedup_text(record), len(texts)))
+        signatures = hasher.signatures(list(texts))
+        keys = index.band_keys(signatures).tolist()
+        tokens = token_counts(chunk)
+        signed = set()
+        for record, row, record_tokens in zip(chunk, rows, tokens):
+            report["records"] += 1
+            report["tokens"] += record_tokens
+            repeat = row in signed
+            signed.add(row)
+            if repeat or not index.add_if_new(signatures[row], keys[row]):
+                report["near_duplicates"] += 1
+                continue
+            if max_per_explanation is not None:
+                output = record.get('output')
+                explanation = output.get('explanation') if isinstance(output, dict) else None
+                seen = per_explanation.get(explanation, 0)
+                if seen >= max_per_explanation:
+                    report["over_explanation_cap"] += 1
+                    continue
+                per_explanation[explanation] = seen + 1
+            report["kept"] += 1
+            report["kept_tokens"] += record_tokens
+            yield record
+
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield from process(chunk)
+            chunk = []
+    if chunk:
+        yield from process(chunk)
+
+
+def dedup_dataset(input_path: str, output_path: str, tokenizer=None, **options) -> dict:
+    """
+    Streams a dataset file through `iter_deduplicated` into `output_path`, in the format its
+    extension names (.jsonl one record per line, otherwise the indented JSON array of
+    scripts/01_prepare_dataset.py). The file is written next to `output_path` and moved into
+    place when complete, so the input may be overwritten.
+
+    Args:
+        input_path (str): Instruction dataset (.json array or .jsonl).
+        output_path (str): Destination file.
+        tokenizer (optional): See `iter_deduplicated`.
+        **options: threshold, num_perm, shingle_size, max_per_explanation, chunk_size, seed.
+
+    Returns:
+        dict: The report of `iter_deduplicated`.
+    """
+    report = {}
+    jsonl = output_path.endswith('.jsonl')
+    tmp_path = f"{output_path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            first = True
+            if not jsonl:
+                f.write("[")
+            for record in iter_deduplicated(iter_examples(input_path), tokenizer=tokenizer, report=report, **options):
+                if jsonl:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                else:
+                    f.write(("\n" if first else ",\n") + "  " + json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+                first = False
+            if not jsonl:
+                f.write("]" if first else "\n]")
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return report
+
+
+def format_dedup_report(report: dict) -> str:
+    removed = report["records"] - report["kept"]
+    saved = report["tokens"] - report["kept_tokens"]
+    return (f"Deduplication: kept {report['kept']} of {report['records']} records, removed {removed} "
+            f"({report['near_duplicates']} near-duplicates, {report['over_explanation_cap']} over the per-explanation cap). "
+            f"Training tokens: {report['kept_tokens']} of {report['tokens']}{' (estimated)' if report['tokens_estimated'] else ''}, "
+            f"{saved} saved ({saved / max(report['tokens'], 1):.1%}).")
+
+
+def dedup_output_path(path: str) -> str:
+    """Where a deduplicated copy of `path` goes unless it is rewritten in place: `<name>.dedup<ext>`."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.dedup{ext}"
+
+
+def load_dedup_options(dedup_config: Optional[dict] = None) -> dict:
+    """The `iter_deduplicated` options from the `dataset_dedup` section of config.yaml."""
+    config = {**DEFAULT_DEDUP_CONFIG, **(dedup_config or {})}
+    return {name: config[name] for name in DEFAULT_DEDUP_CONFIG}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove near-duplicate records from the fine-tuning dataset.")
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--input', help="Instruction dataset (defaults to finetune.dataset_path).")
+    parser.add_argument('--output', help="Deduplicated dataset (defaults to <input>.dedup.json, or .jsonl).")
+    parser.add_argument('--in-place', action='store_true', help="Overwrite the input with the deduplicated dataset.")
+    parser.add_argument('--threshold', type=float, help="Similarity at which records are duplicates.")
+    parser.add_argument('--max-per-explanation', type=int, help="Kept records per explanation template.")
+    parser.add_argument('--tokenizer', help="Count training tokens with this tokenizer instead of estimating them.")
+    args = parser.parse_args()
+
+    import yaml
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    options = load_dedup_options(config.get('dataset_dedup'))
+    if args.threshold is not None:
+        options['threshold'] = args.threshold
+    if args.max_per_explanation is not None:
+        options['max_per_explanation'] = args.max_per_explanation
+    tokenizer = None
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, trust_remote_code=True)
+
+    input_path = args.input or config.get('finetune', {}).get('dataset_path', 'data/final_dataset.json')
+    output_path = args.output or (input_path if args.in_place else dedup_output_path(input_path))
+    report = dedup_dataset(input_path, output_path, tokenizer=tokenizer, **options)
+    print(format_dedup_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# src/docstore.py
+"""
+Compact, memory-mapped store of the knowledge-base documents, written next to the FAISS index
+by `build_vector_store` and read by the RAG pipeline instead of the knowledge-base JSON.
+
+One file holds, after a small JSON header, fixed-width columns indexed by row:
+    ids              int64[n]    stable index ids, ascending (rows are looked up by binary search)
+    topic_codes      uint32[n]   position of the row's topic in the header's `topics` list
+    content_offsets  uint64[n+1] start of each row's content in the content blob
+    rule_id_offsets  uint64[n+1] start of each row's rule_id in the rule_id blob
+followed by the two UTF-8 blobs. Opening the store maps the file and reads only the header;
+a document's strings are decoded when it is looked up, so memory and load time no longer
+grow with the knowledge base, and processes serving the same store share its pages.
+"""
+import json
+import mmap
+import os
+import struct
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+DOCSTORE_FILE = 'docstore.bin'
+MAGIC = b'KBDOCS01'
+# Column sections start on multiples of this many bytes
+ALIGNMENT = 8
+
+
+def _padding(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+
+def write_docstore(path: str, documents: List[dict], ids: List[int]):
+    """
+    Writes the documents and their stable index ids to a docstore file.
+
+    Args:
+        path (str): Destination file.
+        documents (list[dict]): Knowledge-base entries with `content`, `rule_id` and optionally `topic`.
+        ids (list[int]): The index id of each document (unique).
+    """
+    order = np.argsort(np.asarray(ids, dtype='int64'), kind='stable')
+    sorted_ids = np.asarray(ids, dtype='int64')[order]
+    if len(sorted_ids) > 1 and (np.diff(sorted_ids) == 0).any():
+        raise ValueError("Docstore ids must be unique.")
+
+    topics = {}
+    topic_codes = np.empty(len(order), dtype='uint32')
+    contents, rule_ids = [], []
+    for row, position in enumerate(order):
+        document = documents[position]
+        topic_codes[row] = topics.setdefault(document.get('topic', 'General'), len(topics))
+        contents.append(document['content'].encode('utf-8'))
+        rule_ids.append((document.get('rule_id') or '').encode('utf-8'))
+    content_offsets = np.zeros(len(order) + 1, dtype='uint64')
+    np.cumsum([len(text) for text in contents], out=content_offsets[1:])
+    rule_id_offsets = np.zeros(len(order) + 1, dtype='uint64')
+    np.cumsum([len(text) for text in rule_ids], out=rule_id_offsets[1:])
+
+    header = json.dumps({"count": len(order), "topics": list(topics)}, ensure_ascii=False).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+        f.write(b'\0' * _padding(f.tell()))
+        for column in (sorted_ids, topic_codes, content_offsets, rule_id_offsets):
+            f.write(column.tobytes())
+            f.write(b'\0' * _padding(f.tell()))
+        f.writelines(contents)
+        f.writelines(rule_ids)
+
+
+class DocStore:
+    """
+    Read-only view of a docstore file (see the module docstring). `get` mirrors `dict.get` on
+    a {index id: document} mapping, returning {"content", "topic", "rule_id"} dicts.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"'{path}' is not a docstore file.")
+        header_size, = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        offset = len(MAGIC) + 8
+        header = json.loads(self._mmap[offset:offset + header_size].decode('utf-8'))
+        offset += header_size
+        offset += _padding(offset)
+
+        count = header['count']
+        self.topics: List[str] = header['topics']
+        columns = []
+        for dtype, length in (('<i8', count), ('<u4', count), ('<u8', count + 1), ('<u8', count + 1)):
+            columns.append(np.frombuffer(self._mmap, dtype=dtype, count=length, offset=offset))
+            offset += columns[-1].nbytes
+            offset += _padding(offset)
+        self.ids, self.topic_codes, self._content_offsets, self._rule_id_offsets = columns
+        self._content_start = offset
+        self._rule_id_start = offset + int(self._content_offsets[-1])
+
+    @classmethod
+    def open(cls, output_dir: str) -> Optional['DocStore']:
+        """Opens the docstore of a vector store directory, or returns None for a store built without one."""
+        path = os.path.join(output_dir, DOCSTORE_FILE)
+        return cls(path) if os.path.exists(path) else None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, doc_id) -> bool:
+        return self._row(doc_id) is not None
+
+    def __iter__(self) -> Iterator[dict]:
+        """Yields every document, in ascending id order."""
+        for row in range(len(self.ids)):
+            yield self._document(row)
+
+    def get(self, doc_id, default=None) -> Optional[dict]:
+        """The document with index id `doc_id`, decoded from the mapped file, or `default`."""
+        row = self._row(doc_id)
+        return default if row is None else self._document(row)
+
+    def get_many(self, doc_ids) -> List[Optional[dict]]:
+        """Looks up several ids with one binary search; unknown ids give None."""
+        doc_ids = np.asarray(doc_ids, dtype='int64')
+        rows = np.minimum(np.searchsorted(self.ids, doc_ids), max(len(self.ids) - 1, 0))
+        found = self.ids[rows] == doc_ids if len(self.ids) else np.zeros(len(doc_ids), dtype=bool)
+        return [self._document(int(row)) if hit else None for row, hit in zip(rows, found)]
+
+    def contents(self) -> List[str]:
+        """Every document's content, in ascending id order."""
+        return [self._text(self._content_start, self._content_offsets, row) for row in range(len(self.ids))]
+
+    def close(self):
+        # The column arrays are views of the map; drop them before closing it
+        self.ids = self.topic_codes = self._content_offsets = self._rule_id_offsets = None
+        self._mmap.close()
+
+    def _row(self, doc_id) -> Optional[int]:
+        try:
+            doc_id = int(doc_id)
+        except (TypeError, ValueError):
+            return None
+        # Ids assigned by a single full build are the row numbers themselves
+        if 0 <= doc_id < len(self.ids) and self.ids[doc_id] == doc_id:
+            return doc_id
+        row = int(np.searchsorted(self.ids, doc_id))
+        return row if row < len(self.ids) and self.ids[row] == doc_id else None
+
+    def _text(self, start: int, offsets: np.ndarray, row: int) -> str:
+        return self._mmap[start + int(offsets[row]):start + int(offsets[row + 1])].decode('utf-8')
+
+    def _document(self, row: int) -> dict:
+        return {
+            "content": self._text(self._content_start, self._content_offsets, row),
+            "topic": self.topics[self.topic_codes[row]],
+            "rule_id": self._text(self._rule_id_start, self._rule_id_offsets, row) or None,
+        }
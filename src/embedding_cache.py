@@ -0,0 +1,279 @@
+# src/embedding_cache.py
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def normalize_sentence(sentence: str) -> str:
+    """
+    Canonical form used as the cache key: Unicode NFC with surrounding and repeated
+    whitespace collapsed. Case and punctuation are kept, since they change the embedding.
+    """
+    return unicodedata.normalize('NFC', ' '.join(sentence.split()))
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query embeddings, keyed by normalized sentence plus embedding model name.
+
+    The first tier is an in-memory LRU bounded by `max_entries`. The optional second tier
+    lives in `disk_path` and survives restarts: a memory-mapped float32 matrix of
+    `disk_capacity` rows used as a ring buffer, plus an append-only key index mapping
+    sentence keys to rows (a line with an empty key releases a row about to be overwritten). The directory also records the model name and dimension; opening
+    it with a different model wipes it, so stale vectors are never served.
+
+    The disk tier has a single writer. Processes sharing it (pre-forked service workers) set
+    `read_only`: they serve the vectors on disk but keep new ones in memory.
+    """
+    META_FILE = 'meta.json'
+    VECTORS_FILE = 'vectors.f32'
+    KEYS_FILE = 'keys.tsv'
+
+    def __init__(self, model_name: str, max_entries: int = 10000, disk_path: Optional[str] = None, disk_capacity: int = 100000):
+        """
+        Args:
+            model_name (str): Name of the embedding model the cached vectors come from.
+            max_entries (int): Maximum number of embeddings kept in the in-memory tier.
+            disk_path (str, optional): Directory for the persistent tier. None keeps the cache in memory only.
+            disk_capacity (int): Maximum number of embeddings kept on disk.
+        """
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.disk_capacity = disk_capacity
+        self.read_only = False
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        # The disk tier is opened lazily, once the embedding dimension is known
+        self._vectors = None
+        self._disk_index: Dict[str, int] = {}
+        self._row_keys: List[Optional[str]] = []
+        self._next_row = 0
+        self._key_lines = 0
+        if disk_path is not None:
+            self._load_disk_tier()
+
+    @classmethod
+    def from_config(cls, cache_config: dict, model_name: str) -> Optional['EmbeddingCache']:
+        """
+        Builds a cache from the `embedding_cache` section of config.yaml, or returns None if it is disabled.
+        """
+        if not cache_config or not cache_config.get('enabled', False):
+            return None
+        return cls(
+            model_name,
+            max_entries=cache_config.get('max_entries', 10000),
+            disk_path=cache_config.get('disk_path'),
+            disk_capacity=cache_config.get('disk_capacity', 100000)
+        )
+
+    def key(self, sentence: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{normalize_sentence(sentence)}".encode('utf-8')).hexdigest()
+
+    def get_many(self, sentences: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Looks up each sentence, returning its embedding or None on a miss, in input order.
+        """
+        with self._lock:
+            return [self._get(self.key(sentence)) for sentence in sentences]
+
+    def put_many(self, sentences: List[str], embeddings: np.ndarray):
+        """
+        Stores one embedding per sentence in both tiers.
+        """
+        embeddings = np.asarray(embeddings, dtype='float32')
+        with self._lock:
+            keys = [self.key(sentence) for sentence in sentences]
+            for key, embedding in zip(keys, embeddings):
+                self._remember(key, embedding)
+            if self.disk_path is not None and not self.read_only:
+                self._write_disk(keys, embeddings)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_index),
+        }
+
+    def clear(self):
+        """Drops every cached embedding, including the on-disk tier."""
+        with self._lock:
+            self._memory.clear()
+            if self.disk_path is not None:
+                self._reset_disk_tier()
+
+    def flush(self):
+        """Makes sure all on-disk vectors have reached the file."""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+
+    # --- In-memory tier ---
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        embedding = self._memory.get(key)
+        if embedding is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+        row = self._disk_index.get(key)
+        if row is not None and self._vectors is not None:
+            embedding = np.array(self._vectors[row])
+            self._remember(key, embedding)
+            self.hits += 1
+            self.disk_hits += 1
+            return embedding
+
+        self.misses += 1
+        return None
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # --- On-disk tier ---
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.disk_path, name)
+
+    def _load_disk_tier(self):
+        os.makedirs(self.disk_path, exist_ok=True)
+        try:
+            with open(self._path(self.META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._reset_disk_tier()
+            return
+
+        if not os.path.exists(self._path(self.VECTORS_FILE)):
+            self._reset_disk_tier()
+            return
+        if meta.get('model_name') != self.model_name or meta.get('capacity') != self.disk_capacity:
+            print(f"Embedding cache at '{self.disk_path}' was built for another model or size; discarding it.")
+            self._reset_disk_tier()
+            return
+
+        self._open_vectors(meta['dim'], mode='r+')
+        self._row_keys = [None] * self.disk_capacity
+        try:
+            with open(self._path(self.KEYS_FILE), 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) != 2 or len(parts[1]) != 10:
+                        # A torn final line from a crash; everything before it is valid
+                        continue
+                    if parts[0]:
+                        self._assign_row(parts[0], int(parts[1]))
+                    else:
+                        self._release_row(int(parts[1]))
+                    self._key_lines += 1
+        except FileNotFoundError:
+            pass
+        self._next_row = meta.get('next_row', 0) % self.disk_capacity
+        print(f"Embedding cache loaded {len(self._disk_index)} vectors from '{self.disk_path}'.")
+
+    def _reset_disk_tier(self):
+        for name in (self.META_FILE, self.VECTORS_FILE, self.KEYS_FILE):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self._vectors = None
+        self._disk_index = {}
+        self._row_keys = [None] * self.disk_capacity
+        self._next_row = 0
+        self._key_lines = 0
+
+    def _open_vectors(self, dim: int, mode: str):
+        self._vectors = np.memmap(self._path(self.VECTORS_FILE), dtype='float32', mode=mode, shape=(self.disk_capacity, dim))
+
+    def _write_meta(self):
+        meta = {
+            "model_name": self.model_name,
+            "dim": int(self._vectors.shape[1]),
+            "capacity": self.disk_capacity,
+            "next_row": self._next_row,
+        }
+        tmp_path = self._path(self.META_FILE) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(self.META_FILE))
+
+    def _release_row(self, row: int):
+        previous = self._row_keys[row]
+        if previous is not None and self._disk_index.get(previous) == row:
+            del self._disk_index[previous]
+        self._row_keys[row] = None
+
+    def _assign_row(self, key: str, row: int):
+        self._release_row(row)
+        self._row_keys[row] = key
+        self._disk_index[key] = row
+
+    def _append_keys(self, lines: List[str]):
+        with open(self._path(self.KEYS_FILE), 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+        self._key_lines += len(lines)
+
+    def _write_disk(self, keys: List[str], embeddings: np.ndarray):
+        if self._vectors is None:
+            self._open_vectors(embeddings.shape[1], mode='w+')
+        elif self._vectors.shape[1] != embeddings.shape[1]:
+            print("Embedding dimension changed; discarding the on-disk embedding cache.")
+            self._reset_disk_tier()
+            self._open_vectors(embeddings.shape[1], mode='w+')
+
+        writes, written = [], set()
+        for key, embedding in zip(keys, embeddings):
+            if key in self._disk_index or key in written:
+                continue
+            written.add(key)
+            writes.append((key, self._next_row, embedding))
+            self._next_row = (self._next_row + 1) % self.disk_capacity
+        if not writes:
+            return
+
+        # Rows still holding a key are released in the key log before they are overwritten,
+        # so a crash part-way through never leaves an old key pointing at a new vector
+        evicted = sorted({row for _, row, _ in writes if self._row_keys[row] is not None})
+        if evicted:
+            self._append_keys([f"\t{row:010d}\n" for row in evicted])
+            for row in evicted:
+                self._release_row(row)
+        for key, row, embedding in writes:
+            self._vectors[row] = embedding
+            self._assign_row(key, row)
+
+        # Vectors reach the file before the keys that point at them
+        self._vectors.flush()
+        self._append_keys([f"{key}\t{row:010d}\n" for key, row, _ in writes])
+        self._write_meta()
+
+        # The key log only ever appends; rewrite it once it holds mostly overwritten rows
+        if self._key_lines > 2 * self.disk_capacity:
+            self._compact_keys()
+
+    def _compact_keys(self):
+        tmp_path = self._path(self.KEYS_FILE) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(f"{key}\t{row:010d}\n" for key, row in self._disk_index.items())
+        os.replace(tmp_path, self._path(self.KEYS_FILE))
+        self._key_lines = len(self._disk_index)
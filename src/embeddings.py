@@ -0,0 +1,151 @@
+# src/embeddings.py
+import re
+import warnings
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+EMBEDDING_BACKENDS = ('sentence_transformers', 'quantized', 'hashing')
+
+DEFAULT_EMBEDDING_CONFIG = {
+    # Backend used to encode queries
+    "backend": "sentence_transformers",
+    # Backend used by scripts/03_build_vector_store.py to embed the knowledge base (None: same as `backend`)
+    "index_backend": None,
+    # PyTorch intra-op threads (process-wide); None keeps the library default
+    "num_threads": None,
+    # Largest number of sentences passed to the model in one forward pass
+    "max_batch_size": 64,
+    "device": "cpu",
+    "hashing_dim": 384,
+}
+
+
+def embedding_config_with_defaults(embedding_config: Optional[dict] = None) -> dict:
+    return {**DEFAULT_EMBEDDING_CONFIG, **(embedding_config or {})}
+
+
+def backend_name(model_name: str, embedding_config: Optional[dict] = None, backend: Optional[str] = None) -> str:
+    """
+    Identifies the vectors a backend produces, without loading it. Used to key the embedding
+    cache and the vector store manifest, so switching backends never mixes their vectors.
+    """
+    config = embedding_config_with_defaults(embedding_config)
+    backend = backend or config['backend']
+    if backend == 'sentence_transformers':
+        return model_name
+    if backend == 'quantized':
+        return f"{model_name}@int8"
+    if backend == 'hashing':
+        return f"hashing-{config['hashing_dim']}"
+    raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of: {', '.join(EMBEDDING_BACKENDS)}.")
+
+
+def set_torch_threads(num_threads: Optional[int]):
+    """Sets PyTorch's intra-op thread count for the whole process (no-op for None)."""
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+
+
+class EmbeddingBackend:
+    """
+    Common interface of the sentence encoders used for retrieval and for building the index.
+
+    `encode(sentences)` returns a float32 matrix with one row per sentence and accepts the
+    keyword arguments of `SentenceTransformer.encode`, so a backend can stand in wherever a
+    model was used. Sentences are passed to the model `max_batch_size` at a time.
+    """
+    def __init__(self, name: str, max_batch_size: int = 64):
+        self.name = name
+        self.max_batch_size = max_batch_size
+
+    def encode(self, sentences: List[str], convert_to_tensor: bool = False, batch_size: Optional[int] = None, **kwargs) -> np.ndarray:
+        batch_size = min(batch_size or self.max_batch_size, self.max_batch_size)
+        chunks = [self._encode_batch(sentences[start:start + batch_size]) for start in range(0, len(sentences), batch_size)]
+        if not chunks:
+            return np.zeros((0, 0), dtype='float32')
+        return np.ascontiguousarray(np.vstack(chunks), dtype='float32')
+
+    def _encode_batch(self, sentences: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """The sentence-transformers model in full-precision PyTorch."""
+    def __init__(self, model_name: str, max_batch_size: int = 64, num_threads: Optional[int] = None, device: str = 'cpu'):
+        super().__init__(model_name, max_batch_size)
+        from sentence_transformers import SentenceTransformer
+        set_torch_threads(num_threads)
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def _encode_batch(self, sentences: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(sentences, batch_size=len(sentences), convert_to_numpy=True,
+                                            show_progress_bar=False), dtype='float32')
+
+
+class QuantizedSentenceTransformerBackend(SentenceTransformerBackend):
+    """
+    The sentence-transformers model with its Linear layers dynamically quantized to int8:
+    weights are stored as int8 and activations quantized on the fly, which speeds up CPU
+    inference of MiniLM-sized models at a small cost in embedding precision. Compare it with
+    the fp32 model using benchmarks/bench_embedding_backends.py.
+    """
+    def __init__(self, model_name: str, max_batch_size: int = 64, num_threads: Optional[int] = None, device: str = 'cpu'):
+        super().__init__(model_name, max_batch_size, num_threads, device)
+        import torch
+        self.name = backend_name(model_name, backend='quantized')
+        with warnings.catch_warnings():
+            # Recent PyTorch releases flag the quantized tensor API as deprecated; it still works
+            warnings.simplefilter('ignore', UserWarning)
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Deterministic offline stand-in for a sentence-transformers model: hashed word counts (plus
+    character n-gram counts when `char_ngram` is set), L2-normalised. Sentences that share words
+    land close together, which is enough to exercise retrieval in tests and benchmarks.
+    """
+    def __init__(self, dim: int = 384, char_ngram: int = 3, max_batch_size: int = 64):
+        super().__init__(f"hashing-{dim}", max_batch_size)
+        self.dim = dim
+        self.char_ngram = char_ngram
+
+    def _encode_batch(self, sentences: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(sentences), self.dim), dtype='float32')
+        n = self.char_ngram
+        for row, sentence in enumerate(sentences):
+            text = sentence.lower()
+            features = re.findall(r"\w+", text)
+            if n:
+                features += [text[i:i + n] for i in range(len(text) - n + 1)]
+            buckets = [zlib.crc32(feature.encode('utf-8')) % self.dim for feature in features]
+            np.add.at(vectors[row], buckets, 1.0)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def load_embedding_backend(model_name: str, embedding_config: Optional[dict] = None,
+                           backend: Optional[str] = None) -> EmbeddingBackend:
+    """
+    Loads the backend described by the `embedding` section of config.yaml.
+
+    Args:
+        model_name (str): The sentence-transformers model (`model.embedding_model_name`).
+        embedding_config (dict, optional): The `embedding` section (see DEFAULT_EMBEDDING_CONFIG).
+        backend (str, optional): Overrides `embedding_config['backend']`, e.g. with `index_backend`.
+    """
+    config = embedding_config_with_defaults(embedding_config)
+    backend = backend or config['backend']
+    if backend == 'hashing':
+        return HashingBackend(config['hashing_dim'], max_batch_size=config['max_batch_size'])
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of: {', '.join(EMBEDDING_BACKENDS)}.")
+    backend_class = QuantizedSentenceTransformerBackend if backend == 'quantized' else SentenceTransformerBackend
+    threads = f" with {config['num_threads']} threads" if config['num_threads'] else ''
+    print(f"Loading {backend} embedding backend for '{model_name}'{threads}...")
+    return backend_class(model_name, max_batch_size=config['max_batch_size'], num_threads=config['num_threads'],
+                         device=config['device'])
@@ -0,0 +1,181 @@
+# src/lexical_index.py
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+LEXICAL_INDEX_FILE = 'lexical_index.npz'
+LEXICAL_VOCAB_FILE = 'lexical_vocab.json'
+
+DEFAULT_LEXICAL_CONFIG = {
+    "k1": 1.2,
+    "b": 0.75,
+    "char_ngram": 4,
+    # Terms found in more than this share of documents are dropped (they barely score)
+    "max_df_ratio": 0.5,
+    # Query-time weight of each feature type
+    "weights": {"word": 1.0, "bigram": 1.5, "char": 0.3},
+}
+
+FEATURE_TYPES = {'w': 'word', 'b': 'bigram', 'c': 'char'}
+
+
+def analyze(text: str, char_ngram: int = 4) -> Counter:
+    """
+    Splits text into lexical features: lower-cased words ('w:'), adjacent word pairs ('b:'),
+    which catch constructions such as "à le" or "j ai besoin", and character n-grams ('c:')
+    over the space-joined words, which tolerate inflection and small typos.
+    """
+    text = unicodedata.normalize('NFC', text.lower()).replace('’', "'")
+    words = re.findall(r"\w+", text)
+    features = Counter(f"w:{word}" for word in words)
+    features.update(f"b:{first} {second}" for first, second in zip(words, words[1:]))
+    padded = f" {' '.join(words)} "
+    features.update(f"c:{padded[i:i + char_ngram]}" for i in range(len(padded) - char_ngram + 1))
+    return features
+
+
+def document_text(document: dict) -> str:
+    """The indexed text of a knowledge-base entry: its content plus its rule_id as words."""
+    return f"{document['content']} {document.get('rule_id', '').replace('_', ' ')}"
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over the grammar knowledge base.
+
+    Postings are stored term by term in flat NumPy arrays (CSR layout): for every term, the
+    documents containing it and their precomputed BM25 impact, so scoring a query is a single
+    gather over its terms' postings and a weighted bincount. Documents are identified by the
+    same stable ids as the FAISS index, which lets lexical and vector hits be fused directly.
+    """
+    def __init__(self, vocabulary: Dict[str, int], term_offsets: np.ndarray, postings: np.ndarray, impacts: np.ndarray,
+                 doc_ids: np.ndarray, params: dict):
+        self.vocabulary = vocabulary
+        self.term_offsets = term_offsets
+        self.postings = postings
+        self.impacts = impacts
+        self.doc_ids = doc_ids
+        self.params = params
+        self.char_ngram = params['char_ngram']
+        self.weights = {prefix: params['weights'][name] for prefix, name in FEATURE_TYPES.items()}
+
+    @classmethod
+    def build(cls, documents: List[dict], ids: List[int], config: Optional[dict] = None) -> 'LexicalIndex':
+        """
+        Indexes the documents' content and rule_id.
+
+        Args:
+            documents (list[dict]): Knowledge-base entries.
+            ids (list[int]): The stable index id of each document.
+            config (dict, optional): The `lexical_index` section of config.yaml (see DEFAULT_LEXICAL_CONFIG).
+        """
+        params = {**DEFAULT_LEXICAL_CONFIG, **(config or {})}
+        params['weights'] = {**DEFAULT_LEXICAL_CONFIG['weights'], **params.get('weights', {})}
+        k1, b = params['k1'], params['b']
+
+        term_postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = np.zeros(len(documents), dtype='float32')
+        for position, document in enumerate(documents):
+            features = analyze(document_text(document), params['char_ngram'])
+            doc_lengths[position] = sum(features.values())
+            for term, tf in features.items():
+                term_postings.setdefault(term, []).append((position, tf))
+
+        num_docs = len(documents)
+        average_length = float(doc_lengths.mean()) if num_docs else 0.0
+        max_df = params['max_df_ratio'] * num_docs
+        vocabulary, offsets, postings, impacts = {}, [0], [], []
+        for term in sorted(term_postings):
+            entries = term_postings[term]
+            if num_docs > 1 and len(entries) > max_df:
+                continue
+            idf = math.log(1 + (num_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            positions = np.fromiter((position for position, _ in entries), dtype='int32', count=len(entries))
+            tfs = np.fromiter((tf for _, tf in entries), dtype='float32', count=len(entries))
+            norms = k1 * (1 - b + b * doc_lengths[positions] / average_length)
+            vocabulary[term] = len(vocabulary)
+            postings.append(positions)
+            impacts.append((idf * tfs * (k1 + 1) / (tfs + norms)).astype('float32'))
+            offsets.append(offsets[-1] + len(entries))
+
+        return cls(
+            vocabulary,
+            np.asarray(offsets, dtype='int64'),
+            np.concatenate(postings) if postings else np.zeros(0, dtype='int32'),
+            np.concatenate(impacts) if impacts else np.zeros(0, dtype='float32'),
+            np.asarray(ids, dtype='int64'),
+            params
+        )
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Scores every document against the query with BM25.
+
+        Returns:
+            list[tuple]: Up to `k` (stable id, score) pairs with a positive score, best first.
+        """
+        terms = [(self.vocabulary[term], self.weights[term[0]]) for term in analyze(query, self.char_ngram)
+                 if term in self.vocabulary]
+        k = min(k, len(self.doc_ids))
+        if not terms or k == 0:
+            return []
+
+        # Gather the postings of all query terms at once and sum their weighted impacts per document
+        term_indices = np.fromiter((term_index for term_index, _ in terms), dtype='int64', count=len(terms))
+        starts = self.term_offsets[term_indices]
+        counts = self.term_offsets[term_indices + 1] - starts
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        weights = np.repeat(np.fromiter((weight for _, weight in terms), dtype='float32', count=len(terms)), counts)
+        scores = np.bincount(self.postings[positions], weights=self.impacts[positions] * weights, minlength=len(self.doc_ids))
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.doc_ids[position]), float(scores[position])) for position in top if scores[position] > 0]
+
+    def save(self, output_dir: str):
+        """Writes the index files into `output_dir`, each replaced atomically."""
+        arrays_path = os.path.join(output_dir, LEXICAL_INDEX_FILE)
+        with open(arrays_path + '.tmp', 'wb') as f:
+            np.savez(f, term_offsets=self.term_offsets, postings=self.postings, impacts=self.impacts, doc_ids=self.doc_ids)
+        os.replace(arrays_path + '.tmp', arrays_path)
+        vocab_path = os.path.join(output_dir, LEXICAL_VOCAB_FILE)
+        with open(vocab_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({"params": self.params, "terms": sorted(self.vocabulary, key=self.vocabulary.get)}, f, ensure_ascii=False)
+        os.replace(vocab_path + '.tmp', vocab_path)
+
+    @classmethod
+    def load(cls, output_dir: str) -> 'LexicalIndex':
+        """Loads an index saved by `save`. Raises FileNotFoundError if the store has none."""
+        with open(os.path.join(output_dir, LEXICAL_VOCAB_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = np.load(os.path.join(output_dir, LEXICAL_INDEX_FILE))
+        vocabulary = {term: i for i, term in enumerate(meta["terms"])}
+        return cls(vocabulary, arrays['term_offsets'], arrays['postings'], arrays['impacts'], arrays['doc_ids'], meta["params"])
+
+
+def is_decisive(hits: List[Tuple[int, float]], min_score: float, margin: float) -> bool:
+    """
+    True when the best lexical hit is strong enough on its own: its score reaches `min_score`
+    and is at least `margin` times the runner-up's.
+    """
+    if not hits or hits[0][1] < min_score:
+        return False
+    return len(hits) == 1 or hits[0][1] >= margin * hits[1][1]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], rrf_k: int = 60) -> List[int]:
+    """
+    Merges ranked id lists: each id scores the sum of 1 / (rrf_k + rank) over the lists it
+    appears in. Ties keep the order of first appearance.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
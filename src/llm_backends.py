@@ -0,0 +1,428 @@
+# src/llm_backends.py
+"""
+LLM backends generating the tutor's corrections.
+
+Every backend answers ChatML prompts built by `Tutor._build_prompt` with the fine-tuned model's
+output, a JSON object {"correction", "explanation"} (see `parse_response`), and shares:
+- `generate(prompt)` and `generate_batch(prompts)`, which submits prompts to the model
+  `max_batch_size` at a time;
+- `stream(prompt)`, which yields the response text chunk by chunk as it is generated;
+- coalescing: a prompt identical to one already being generated, by this call or by another
+  thread, attaches to that generation instead of starting a new one. Streams attached late
+  replay the chunks generated so far, then follow the live ones. A stream's generation runs
+  on its own producer thread, so a caller waiting for it never depends on the stream's
+  reader being scheduled; waits give up after `wait_timeout_seconds`;
+- the system prefix shared by every prompt (SYSTEM_PREFIX), which the local model tokenizes
+  once instead of once per prompt.
+
+Backends:
+- 'fake': deterministic offline stand-in answering like `simulate_llm_response`, with
+  configurable per-batch, per-prompt and per-token latency (optionally jittered from a seed);
+- 'local': `model.base_model_name` through transformers, with the LoRA adapter found at
+  `model.lora_adapter_path` applied via peft.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+LLM_BACKENDS = ('fake', 'local')
+
+DEFAULT_LLM_CONFIG = {
+    "backend": "fake",
+    # Largest number of prompts generated together (None: as many as a call submits)
+    "max_batch_size": 32,
+    # Attach identical in-flight prompts to one generation
+    "coalesce": True,
+    # Longest wait for a generation this caller attached to (None: no limit)
+    "wait_timeout_seconds": 300.0,
+    # Local model only
+    "max_new_tokens": 256,
+    "device": "cpu",
+    # Fake backend only: sleeps `batch_latency_ms + per_prompt_ms * prompts`, then `token_latency_ms`
+    # per token of the longest response; `jitter` scales each sleep by up to +/- that fraction
+    "fake": {"batch_latency_ms": 0.0, "per_prompt_ms": 0.0, "token_latency_ms": 0.0, "jitter": 0.0, "seed": 0},
+}
+
+SYSTEM_MESSAGE = "You are an expert French language tutor..."
+# Identical for every prompt, so it is formatted once here and tokenized once by the local model
+SYSTEM_PREFIX = f"<|im_start|>system\n{SYSTEM_MESSAGE}<|im_end|>\n"
+USER_TEMPLATE = "<|im_start|>user\nContext: {context}\nSentence: {sentence}<|im_end|>\n<|im_start|>assistant\n"
+END_OF_TURN = "<|im_end|>"
+
+# Words with their trailing whitespace: the "tokens" the fake backend streams
+_FAKE_TOKENS = re.compile(r'\S+\s*')
+
+
+def simulate_llm_response(prompt: str) -> dict:
+    """Simulates the response from the actual fine-tuned LLM."""
+    if "le parc" in prompt:
+        return {
+          "correction": "Je vais au parc.",
+          "explanation": "Bon travail ! The noun 'parc' is masculine, so the preposition 'à' must contract with the article 'le' to become 'au'. I see you've been working on this, and you're very close to mastering it!"
+        }
+    if "j'ai besoin" in prompt:
+        return {
+          "correction": "C'est le livre dont j'ai besoin.",
+          "explanation": "Très bien ! The verb 'avoir besoin' is always followed by the preposition 'de'. When this is the object of a relative clause, you must use the pronoun 'dont'. This is a common point of confusion!"
+        }
+    return {
+        "correction": "Sentence appears correct.",
+        "explanation": "I couldn't find any grammatical errors in this sentence. Well done!"
+    }
+
+
+def parse_response(text: str) -> dict:
+    """
+    Turns the model's output into a response dict. Output that is not the expected JSON
+    object is returned whole as the explanation, with the sentence judged correct.
+    """
+    text = text.split(END_OF_TURN, 1)[0].strip()
+    try:
+        response = json.loads(text)
+    except json.JSONDecodeError:
+        response = None
+    if isinstance(response, dict) and 'correction' in response:
+        return {"correction": str(response['correction']), "explanation": str(response.get('explanation', ''))}
+    return {"correction": "Sentence appears correct.", "explanation": text}
+
+
+class _Generation:
+    """One in-flight generation, which identical requests attach to and read chunks from."""
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 1
+        self.cancelled = False
+        self._condition = threading.Condition()
+
+    def append(self, chunk: str):
+        with self._condition:
+            self.chunks.append(chunk)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._condition:
+            self.error = error
+            self.done = True
+            self._condition.notify_all()
+
+    def text(self, timeout: Optional[float] = None) -> str:
+        """Waits for the generation to finish and returns its full text."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.done, timeout):
+                raise TimeoutError(f"No response from the LLM within {timeout:g}s.")
+        if self.error is not None:
+            raise self.error
+        return "".join(self.chunks)
+
+    def follow(self, timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Yields the chunks generated so far, then each new one until the generation finishes;
+        raises TimeoutError when no chunk arrives for `timeout` seconds.
+        """
+        position = 0
+        while True:
+            with self._condition:
+                if not self._condition.wait_for(lambda: self.done or len(self.chunks) > position, timeout):
+                    raise TimeoutError(f"No output from the LLM within {timeout:g}s.")
+                chunks, done, error = self.chunks[position:], self.done, self.error
+            position += len(chunks)
+            yield from chunks
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class LLMBackend:
+    """
+    Common interface of the LLM backends (see the module docstring). Subclasses implement
+    `_generate_texts` and may override `_stream_text` to stream natively.
+    """
+    def __init__(self, name: str, max_batch_size: Optional[int] = None, coalesce: bool = True,
+                 wait_timeout: Optional[float] = 300.0):
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.coalesce = coalesce
+        self.wait_timeout = wait_timeout
+        self.system_prefix = SYSTEM_PREFIX
+        self.generations = 0
+        self.coalesced = 0
+        self._in_flight: Dict[str, _Generation] = {}
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str) -> dict:
+        return self.generate_batch([prompt])[0]
+
+    def generate_batch(self, prompts: List[str]) -> List[dict]:
+        """
+        Generates a response for every prompt, in input order. Distinct prompts not already in
+        flight are generated `max_batch_size` at a time (all together without a limit); the
+        others wait for the generation they attached to.
+        """
+        generations, owned = self._attach(prompts)
+        batch_size = self.max_batch_size or max(len(owned), 1)
+        try:
+            for start in range(0, len(owned), batch_size):
+                chunk = owned[start:start + batch_size]
+                texts = self._generate_texts(chunk)
+                for prompt, text in zip(chunk, texts):
+                    generations[prompt].append(text)
+                    self._finish(prompt, generations[prompt])
+        except BaseException as e:
+            for prompt in owned:
+                if not generations[prompt].done:
+                    self._finish(prompt, generations[prompt], e)
+            raise
+        return [parse_response(generations[prompt].text(self.wait_timeout)) for prompt in prompts]
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Yields the response text in chunks as they are generated. The caller that starts a
+        generation runs it on a producer thread, so it advances whether or not this iterator
+        is being read; once every reader has stopped early, it is cancelled at the next chunk.
+        """
+        generations, owned = self._attach([prompt])
+        generation = generations[prompt]
+        if owned:
+            threading.Thread(target=self._produce, args=(prompt, generation), name="llm-stream-producer",
+                             daemon=True).start()
+        finished = False
+        try:
+            yield from generation.follow(self.wait_timeout)
+            finished = True
+        finally:
+            if not finished:
+                with self._lock:
+                    generation.readers -= 1
+                    generation.cancelled = generation.readers == 0
+                    # Later requests for the prompt start afresh instead of attaching to it
+                    if generation.cancelled and self._in_flight.get(prompt) is generation:
+                        del self._in_flight[prompt]
+
+    def _produce(self, prompt: str, generation: _Generation):
+        """Runs a streamed generation to the end, or until every reader has gone."""
+        chunks = self._stream_text(prompt)
+        try:
+            for chunk in chunks:
+                if generation.cancelled:
+                    chunks.close()
+                    self._finish(prompt, generation, RuntimeError("Generation cancelled."))
+                    return
+                generation.append(chunk)
+        except BaseException as e:
+            self._finish(prompt, generation, e)
+            return
+        self._finish(prompt, generation)
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return {"backend": self.name, "generations": self.generations, "coalesced": self.coalesced, "in_flight": in_flight}
+
+    def _attach(self, prompts: List[str]):
+        """Maps each distinct prompt to its generation, registering the ones this caller must run."""
+        generations: Dict[str, _Generation] = {}
+        owned = []
+        with self._lock:
+            for prompt in prompts:
+                if prompt in generations:
+                    self.coalesced += 1
+                    continue
+                generation = self._in_flight.get(prompt) if self.coalesce else None
+                if generation is not None:
+                    generation.readers += 1
+                    self.coalesced += 1
+                else:
+                    generation = _Generation()
+                    if self.coalesce:
+                        self._in_flight[prompt] = generation
+                    owned.append(prompt)
+                    self.generations += 1
+                generations[prompt] = generation
+        return generations, owned
+
+    def _finish(self, prompt: str, generation: _Generation, error: Optional[BaseException] = None):
+        with self._lock:
+            if self._in_flight.get(prompt) is generation:
+                del self._in_flight[prompt]
+        generation.finish(error)
+
+    def _generate_texts(self, prompts: List[str]) -> List[str]:
+        """Generates the raw output text of each prompt, in one model call."""
+        raise NotImplementedError
+
+    def _stream_text(self, prompt: str) -> Iterator[str]:
+        """Yields the raw output text of one prompt in chunks; by default all at once."""
+        yield self._generate_texts([prompt])[0]
+
+
+class FakeLLM(LLMBackend):
+    """
+    Deterministic local stand-in for the fine-tuned model, for running and benchmarking the
+    tutor without a GPU. Answers with `simulate_llm_response` as JSON text, after sleeping like
+    a batched decoder: `batch_latency_ms + per_prompt_ms * len(prompts)` for the prompt pass,
+    then `token_latency_ms` per token (word) of the longest response, every prompt of a batch
+    decoding in step. Streams word by word. `jitter` > 0 randomises each sleep by up to that
+    fraction, reproducibly for a given `seed`.
+    """
+    def __init__(self, batch_latency_ms: float = 0.0, per_prompt_ms: float = 0.0, token_latency_ms: float = 0.0,
+                 jitter: float = 0.0, seed: int = 0, max_batch_size: Optional[int] = None, coalesce: bool = True,
+                 wait_timeout: Optional[float] = 300.0):
+        super().__init__('fake', max_batch_size=max_batch_size, coalesce=coalesce, wait_timeout=wait_timeout)
+        self.batch_latency_ms = batch_latency_ms
+        self.per_prompt_ms = per_prompt_ms
+        self.token_latency_ms = token_latency_ms
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def _sleep(self, delay_ms: float):
+        if self.jitter:
+            with self._lock:
+                delay_ms *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    @staticmethod
+    def _tokens(prompt: str) -> List[str]:
+        return _FAKE_TOKENS.findall(json.dumps(simulate_llm_response(prompt), ensure_ascii=False))
+
+    def _generate_texts(self, prompts: List[str]) -> List[str]:
+        tokens = [self._tokens(prompt) for prompt in prompts]
+        self._sleep(self.batch_latency_ms + self.per_prompt_ms * len(prompts)
+                    + self.token_latency_ms * max((len(t) for t in tokens), default=0))
+        return ["".join(t) for t in tokens]
+
+    def _stream_text(self, prompt: str) -> Iterator[str]:
+        self._sleep(self.batch_latency_ms + self.per_prompt_ms)
+        for token in self._tokens(prompt):
+            self._sleep(self.token_latency_ms)
+            yield token
+
+
+class LocalLLM(LLMBackend):
+    """
+    The fine-tuned model run in-process with transformers: the base model, plus the LoRA
+    adapter from `lora_adapter_path` when that directory exists (needs peft). Decoding is
+    greedy; batches are left-padded. The system prefix is tokenized once and prepended to the
+    tokens of each prompt's remainder.
+    """
+    def __init__(self, base_model_name: str, lora_adapter_path: Optional[str] = None, max_batch_size: Optional[int] = 32,
+                 max_new_tokens: int = 256, device: str = 'cpu', coalesce: bool = True,
+                 wait_timeout: Optional[float] = 300.0):
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        super().__init__(base_model_name, max_batch_size=max_batch_size, coalesce=coalesce, wait_timeout=wait_timeout)
+        self.max_new_tokens = max_new_tokens
+        self.device = device
+        self.tokenizer = AutoTokenizer.from_pretrained(base_model_name)
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        model = AutoModelForCausalLM.from_pretrained(base_model_name)
+        if lora_adapter_path and os.path.isdir(lora_adapter_path):
+            from peft import PeftModel
+            model = PeftModel.from_pretrained(model, lora_adapter_path)
+            self.name = f"{base_model_name}+{os.path.basename(os.path.normpath(lora_adapter_path))}"
+        elif lora_adapter_path:
+            print(f"Warning: LoRA adapter not found at '{lora_adapter_path}'; generating with the base model.")
+        self.model = model.to(device).eval()
+        self._prefix_ids = self.tokenizer(self.system_prefix, add_special_tokens=False)['input_ids']
+        end_ids = self.tokenizer(END_OF_TURN, add_special_tokens=False)['input_ids']
+        self._stop_ids = [self.tokenizer.eos_token_id] + (end_ids if len(end_ids) == 1 else [])
+
+    def _input_ids(self, prompt: str) -> List[int]:
+        if prompt.startswith(self.system_prefix):
+            return self._prefix_ids + self.tokenizer(prompt[len(self.system_prefix):], add_special_tokens=False)['input_ids']
+        return self.tokenizer(prompt, add_special_tokens=False)['input_ids']
+
+    def _batch_inputs(self, prompts: List[str]) -> dict:
+        import torch
+
+        ids = [self._input_ids(prompt) for prompt in prompts]
+        length = max(len(row) for row in ids)
+        pad = self.tokenizer.pad_token_id
+        return {
+            "input_ids": torch.tensor([[pad] * (length - len(row)) + row for row in ids], device=self.device),
+            "attention_mask": torch.tensor([[0] * (length - len(row)) + [1] * len(row) for row in ids], device=self.device),
+        }
+
+    def _generate_kwargs(self) -> dict:
+        return {"max_new_tokens": self.max_new_tokens, "do_sample": False, "eos_token_id": self._stop_ids,
+                "pad_token_id": self.tokenizer.pad_token_id}
+
+    def _generate_texts(self, prompts: List[str]) -> List[str]:
+        import torch
+
+        inputs = self._batch_inputs(prompts)
+        with torch.inference_mode():
+            output = self.model.generate(**inputs, **self._generate_kwargs())
+        return self.tokenizer.batch_decode(output[:, inputs['input_ids'].shape[1]:], skip_special_tokens=True)
+
+    def _stream_text(self, prompt: str) -> Iterator[str]:
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancelled = threading.Event()
+
+        class Cancelled(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return torch.full((input_ids.shape[0],), cancelled.is_set(), dtype=torch.bool, device=input_ids.device)
+
+        errors = []
+
+        def run():
+            try:
+                with torch.inference_mode():
+                    self.model.generate(**self._batch_inputs([prompt]), **self._generate_kwargs(), streamer=streamer,
+                                        stopping_criteria=StoppingCriteriaList([Cancelled()]))
+            except Exception as e:
+                errors.append(e)
+                # Unblock the reader
+                streamer.end()
+
+        thread = threading.Thread(target=run, name="llm-stream", daemon=True)
+        thread.start()
+        finished = False
+        try:
+            for chunk in streamer:
+                if chunk:
+                    yield chunk
+            finished = True
+        finally:
+            if not finished:
+                # A reader that stops early ends the generation at the next token
+                cancelled.set()
+                for _ in streamer:
+                    pass
+            thread.join()
+        if errors:
+            raise errors[0]
+
+
+def load_llm_backend(model_config: dict, llm_config: Optional[dict] = None) -> LLMBackend:
+    """
+    Loads the backend described by the `llm` section of config.yaml.
+
+    Args:
+        model_config (dict): The `model` section (`base_model_name`, `lora_adapter_path`).
+        llm_config (dict, optional): The `llm` section (see DEFAULT_LLM_CONFIG).
+    """
+    config = {**DEFAULT_LLM_CONFIG, **(llm_config or {})}
+    backend = config['backend']
+    if backend == 'fake':
+        return FakeLLM(**{**DEFAULT_LLM_CONFIG['fake'], **(config.get('fake') or {})},
+                       max_batch_size=config['max_batch_size'], coalesce=config['coalesce'],
+                       wait_timeout=config['wait_timeout_seconds'])
+    if backend == 'local':
+        print(f"Loading base model '{model_config['base_model_name']}' and adapter '{model_config.get('lora_adapter_path')}'...")
+        return LocalLLM(model_config['base_model_name'], model_config.get('lora_adapter_path'),
+                        max_batch_size=config['max_batch_size'], max_new_tokens=config['max_new_tokens'],
+                        device=config['device'], coalesce=config['coalesce'],
+                        wait_timeout=config['wait_timeout_seconds'])
+    raise ValueError(f"Unknown LLM backend '{backend}'. Expected one of: {', '.join(LLM_BACKENDS)}.")
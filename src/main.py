@@ -1,7 +1,48 @@
 # main.py
 import yaml
+from src.embedding_cache import EmbeddingCache
+from src.embeddings import backend_name
+from src.llm_backends import load_llm_backend
+from src.metrics import Metrics
+from src.profile_store import ProfileStore
+from src.rag_pipeline import RAGPipeline
+from src.response_cache import ResponseCache
+from src.rule_engine import RuleEngine
 from src.tutor import Tutor
 
+
+def build_tutor(config: dict) -> Tutor:
+    """
+    Builds the RAG pipeline and Tutor described by a loaded config.yaml.
+    """
+    model_name = config['model']['embedding_model_name']
+    embedding_config = config.get('embedding')
+    rag_pipeline = RAGPipeline(
+        vector_db_path=config['paths']['vector_db'],
+        user_profile_db_path=config['paths']['user_profiles'],
+        knowledge_base_path=config['paths']['knowledge_base'],
+        model_name=model_name,
+        embedding_cache=EmbeddingCache.from_config(config.get('embedding_cache', {}), backend_name(model_name, embedding_config)),
+        profile_store=ProfileStore.from_config(config),
+        index_config=config.get('vector_index'),
+        startup=config.get('startup', {}).get('mode', 'eager'),
+        mmap_index=config.get('startup', {}).get('mmap_index', True),
+        metrics=Metrics.from_config(config),
+        retrieval_config=config.get('retrieval'),
+        embedding_config=embedding_config
+    )
+    return Tutor(
+        base_model_name=config['model']['base_model_name'],
+        lora_adapter_path=config['model']['lora_adapter_path'],
+        vector_db_path=config['paths']['vector_db'],
+        user_profile_db_path=config['paths']['user_profiles'],
+        knowledge_base_path=config['paths']['knowledge_base'],
+        rag_pipeline=rag_pipeline,
+        llm=load_llm_backend(config['model'], config.get('llm')),
+        response_cache=ResponseCache.from_config(config.get('response_cache', {})),
+        rule_engine=RuleEngine.from_config(config.get('rule_engine', {}), rag_pipeline)
+    )
+
 def main():
     """
     Main entry point for demonstrating the Tutor's functionality.
@@ -19,12 +60,7 @@ def main():
         return
 
     # Initialize the tutor using settings from the config file
-    tutor = Tutor(
-        base_model_name=config['model']['base_model_name'],
-        lora_adapter_path=config['model']['lora_adapter_path'],
-        vector_db_path=config['paths']['vector_db'],
-        user_profile_db_path=config['paths']['user_profiles']
-    )
+    tutor = build_tutor(config)
     
     # --- The rest of the demonstration remains the same ---
     user_id = "user_123"
@@ -0,0 +1,233 @@
+# src/metrics.py
+import bisect
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Latency buckets grow by 2^(1/4) (about 19%) from 1 µs to about 2 minutes, so quantile
+# estimates are within roughly 10% while a bucket lookup stays a short binary search.
+LATENCY_BUCKETS = [1e-6 * 2 ** (i / 4) for i in range(108)]
+SIZE_BUCKETS = [float(2 ** i) for i in range(14)]
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with estimated quantiles. Observing a value is a binary search over
+    the bucket bounds plus a few integer updates, and memory does not grow with the sample count.
+    """
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the q-quantile by interpolating inside the bucket that holds it, clamped to
+        the observed minimum and maximum.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            seen += bucket_count
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            **{f"p{round(q * 100)}": self.quantile(q) for q in QUANTILES},
+        }
+
+
+class _Span:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics: 'Metrics', stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe_latency(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """
+    In-process metrics for the tutor: per-stage latency histograms fed by timing spans,
+    value histograms (such as batch sizes) and counters (such as embedding cache hits).
+
+    Usage:
+        with metrics.span("search"):
+            index.search(...)
+        metrics.increment("embedding_cache_hits", 3)
+
+    A disabled instance hands out one shared no-op span and returns from `increment` and
+    `observe` straight away, so instrumented code costs a method call per stage when off.
+    Snapshots can be exported as JSON (`to_dict`, `to_json`) or in the Prometheus text
+    format (`to_prometheus`), where histograms appear as summaries with p50/p95/p99.
+    """
+    def __init__(self, enabled: bool = True, namespace: str = 'tutor'):
+        """
+        Args:
+            enabled (bool): Record measurements. When False every call is a no-op.
+            namespace (str): Prefix of the exported Prometheus metric names.
+        """
+        self.enabled = enabled
+        self.namespace = namespace
+        self._latencies: Dict[str, Histogram] = {}
+        self._values: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'Metrics':
+        """Builds metrics from the `metrics` section of config.yaml (disabled if the section is missing)."""
+        metrics_config = config.get('metrics') or {}
+        return cls(enabled=metrics_config.get('enabled', False), namespace=metrics_config.get('namespace', 'tutor'))
+
+    def span(self, stage: str):
+        """Context manager timing one stage into its latency histogram."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def observe_latency(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._latencies.get(stage)
+            if histogram is None:
+                histogram = self._latencies[stage] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe(self, name: str, value: float):
+        """Records a value such as a batch size (power-of-two buckets up to 8192)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._values.get(name)
+            if histogram is None:
+                histogram = self._values[name] = Histogram(SIZE_BUCKETS)
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1):
+        if not self.enabled or not amount:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self._values.clear()
+            self._counters.clear()
+
+    def to_dict(self) -> dict:
+        """
+        Snapshot of every metric. Stage latencies are reported in milliseconds.
+
+        Returns:
+            dict: {"enabled", "stages": {stage: {count, sum, mean, max, p50, p95, p99}},
+                "histograms": {name: {...}}, "counters": {name: value}}.
+        """
+        with self._lock:
+            stages = {}
+            for stage, histogram in sorted(self._latencies.items()):
+                summary = histogram.summary()
+                stages[stage] = {key: value if key == "count" else value * 1000 for key, value in summary.items()}
+            return {
+                "enabled": self.enabled,
+                "stages": stages,
+                "histograms": {name: histogram.summary() for name, histogram in sorted(self._values.items())},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def to_json(self, indent: Optional[int] = None) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            if self._latencies:
+                name = f"{self.namespace}_stage_latency_seconds"
+                lines += [f"# HELP {name} Latency of each stage of a correction.", f"# TYPE {name} summary"]
+                for stage, histogram in sorted(self._latencies.items()):
+                    lines += _summary_lines(name, histogram, f'stage="{stage}"')
+            for value_name, histogram in sorted(self._values.items()):
+                name = f"{self.namespace}_{value_name}"
+                lines += [f"# TYPE {name} summary"] + _summary_lines(name, histogram)
+            for counter_name, value in sorted(self._counters.items()):
+                name = f"{self.namespace}_{counter_name}_total"
+                lines += [f"# TYPE {name} counter", f"{name} {value:g}"]
+        return "\n".join(lines) + "\n"
+
+
+def _summary_lines(name: str, histogram: Histogram, labels: str = '') -> List[str]:
+    separator = ',' if labels else ''
+    suffix = f"{{{labels}}}" if labels else ''
+    return [f'{name}{{{labels}{separator}quantile="{q:g}"}} {histogram.quantile(q):.9g}' for q in QUANTILES] + [
+        f"{name}_sum{suffix} {histogram.sum:.9g}",
+        f"{name}_count{suffix} {histogram.count}",
+    ]
+
+
+def process_memory(pid='self') -> Dict[str, float]:
+    """
+    Memory of a process in MB from /proc/<pid>/smaps_rollup (Linux): resident set (rss),
+    proportional set (pss, shared pages divided among the processes mapping them), and the
+    shared and private parts of the resident set. Empty where /proc is unavailable.
+    """
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_mb", "Shared_Dirty": "shared_mb",
+              "Private_Clean": "private_mb", "Private_Dirty": "private_mb"}
+    memory: Dict[str, float] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    key = fields[name]
+                    memory[key] = memory.get(key, 0.0) + int(value.split()[0]) / 1024
+    except (FileNotFoundError, PermissionError, ProcessLookupError):
+        return {}
+    return memory
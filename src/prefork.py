@@ -0,0 +1,259 @@
+# src/prefork.py
+"""
+Pre-fork multi-worker mode of the tutor service (src/server.py).
+
+The parent process builds the tutor and loads its read-only parts (knowledge base, FAISS and
+lexical indexes, embedding model weights, rule engine) once, then forks `workers` children
+that share those pages copy-on-write instead of each loading a copy. Every worker accepts on
+the same listening socket, so the kernel spreads connections across them.
+
+What cannot cross a fork is opened per worker. Each worker opens its own connection to the
+SQLite profile store; increments are additive upserts, so no worker ever loses another's
+updates, and workers flush at least every `worker_profile_flush_seconds` so the others read
+them promptly. A worker cannot follow the others' increments, so profile analytics are not
+kept up to date in memory: an analytics query finding the worker's copy
+`profile_analytics.worker_max_age_seconds` old reloads it from the database in the
+background, so every worker answers from the same data, a load behind at most. Embedding-cache disk tiers are read-only in the workers (a single writer
+owns a tier), and response caches and metrics are per worker.
+
+The parent only supervises. A worker that exits, after `max_requests_per_worker` corrections
+or in a crash, is replaced by a fresh fork; SIGHUP replaces every worker the same way.
+SIGTERM or SIGINT shuts down gracefully: workers stop accepting, answer the requests they
+already have, flush their profile updates and exit, and any still running after
+`graceful_timeout_seconds` are killed.
+
+    python -m src.server --workers 4 --stub-llm-ms 40
+"""
+import asyncio
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Callable, Dict, Optional
+
+from .embeddings import set_torch_threads
+from .profile_analytics import ReloadingAnalytics
+from .profile_store import ProfileStore
+from .server import TutorService
+
+DEFAULT_PREFORK_CONFIG = {
+    "workers": 1,
+    # Load the read-only parts in the parent and share them; False makes every worker load its own
+    "preload": True,
+    # Replace a worker after this many corrections (0: never)
+    "max_requests_per_worker": 0,
+    "graceful_timeout_seconds": 30.0,
+    # Upper bound on the profile store flush interval inside workers
+    "worker_profile_flush_seconds": 0.1,
+}
+
+# A worker exiting sooner than this after its start is restarted only after a pause
+MIN_WORKER_LIFETIME_SECONDS = 1.0
+
+
+class PreforkServer:
+    """
+    Supervisor of pre-forked TutorService workers sharing one listening socket (see the module docstring).
+    """
+    def __init__(self, tutor_factory: Callable, profile_store_factory: Callable[[], ProfileStore], workers: int = 2,
+                 preload: bool = True, max_requests: int = 0, graceful_timeout: float = 30.0,
+                 service_options: Optional[dict] = None, analytics_config: Optional[dict] = None,
+                 threads_per_worker: Optional[int] = None):
+        """
+        Args:
+            tutor_factory (callable): Builds a Tutor; called once in the parent with `preload`,
+                otherwise once in every worker.
+            profile_store_factory (callable): Opens the ProfileStore used by one worker.
+            workers (int): Number of worker processes.
+            preload (bool): Load the tutor in the parent and share it copy-on-write.
+            max_requests (int): Corrections after which a worker is replaced (0: never).
+            graceful_timeout (float): Seconds workers get to finish on shutdown before being killed.
+            service_options (dict, optional): Keyword arguments of TutorService (micro-batching settings).
+            analytics_config (dict, optional): The `profile_analytics` section of config.yaml.
+            threads_per_worker (int, optional): PyTorch intra-op threads set in each worker.
+        """
+        self.tutor_factory = tutor_factory
+        self.profile_store_factory = profile_store_factory
+        self.num_workers = workers
+        self.preload = preload
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.service_options = service_options or {}
+        self.analytics_config = analytics_config or {}
+        self.threads_per_worker = threads_per_worker
+
+        self.tutor = None
+        self.restarts = 0
+        self._sock: Optional[socket.socket] = None
+        self._workers: Dict[int, int] = {}
+        self._started: Dict[int, float] = {}
+        self._stopping = False
+        self._deadline = None
+
+    @classmethod
+    def from_config(cls, config: dict, tutor_factory: Callable, workers: Optional[int] = None,
+                    preload: Optional[bool] = None) -> 'PreforkServer':
+        """
+        Builds a supervisor from a loaded config.yaml (`server`, `profile_store`, `embedding`
+        and `profile_analytics` sections). `workers` and `preload` override the config.
+        """
+        server_config = {**DEFAULT_PREFORK_CONFIG, **config.get('server', {})}
+        workers = workers or server_config['workers']
+        store_config = dict(config.get('profile_store', {}))
+        store_config['flush_interval_seconds'] = min(store_config.get('flush_interval_seconds', 1.0),
+                                                     server_config['worker_profile_flush_seconds'])
+        worker_config = {**config, 'profile_store': store_config}
+
+        # Without an explicit thread count, split the cores between the workers
+        threads = (config.get('embedding') or {}).get('num_threads') or max(1, (os.cpu_count() or 1) // workers)
+        return cls(
+            tutor_factory,
+            lambda: ProfileStore.from_config(worker_config),
+            workers=workers,
+            preload=server_config['preload'] if preload is None else preload,
+            max_requests=server_config['max_requests_per_worker'],
+            graceful_timeout=server_config['graceful_timeout_seconds'],
+            service_options={
+                "max_batch_size": server_config.get('max_batch_size', 32),
+                "max_wait_ms": server_config.get('max_wait_ms', 5.0),
+                "max_queue_size": server_config.get('max_queue_size', 1024),
+            },
+            analytics_config=config.get('profile_analytics', {}),
+            threads_per_worker=threads
+        )
+
+    # --- Parent ---
+
+    def serve(self, host: str = '127.0.0.1', port: int = 8765):
+        """Loads the tutor (with `preload`), forks the workers and supervises them until shut down."""
+        self._sock = socket.create_server((host, port), backlog=1024)
+        if self.preload:
+            start = time.perf_counter()
+            self.tutor = self._load_tutor()
+            # The parent's connection cannot be used across the fork; each worker opens its own
+            self.tutor.profile_store.close()
+            print(f"Parent (pid {os.getpid()}) loaded the tutor in {time.perf_counter() - start:.2f}s; "
+                  f"forking {self.num_workers} workers.", flush=True)
+            # Keep the loaded objects out of the collector, whose bookkeeping writes would
+            # otherwise copy their pages into every worker
+            gc.collect()
+            gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        for worker_id in range(self.num_workers):
+            self._spawn(worker_id)
+        try:
+            self._supervise()
+        finally:
+            self._sock.close()
+        print(f"All workers stopped ({self.restarts} restarts).", flush=True)
+
+    def _load_tutor(self):
+        tutor = self.tutor_factory()
+        tutor.rag_pipeline.wait_until_ready()
+        tutor.rag_pipeline.warm_up()
+        cache = tutor.rag_pipeline.embedding_cache
+        if cache is not None and cache.disk_path is not None and self.num_workers > 1:
+            cache.flush()
+            cache.read_only = True
+        return tutor
+
+    def _spawn(self, worker_id: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = self._run_worker(worker_id)
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                # Skip the parent's atexit handlers and finalizers
+                os._exit(code)
+        self._workers[pid] = worker_id
+        self._started[pid] = time.monotonic()
+
+    def _supervise(self):
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if self._stopping and time.monotonic() > self._deadline:
+                    print(f"Killing {len(self._workers)} workers still running after {self.graceful_timeout:g}s.", flush=True)
+                    self._signal_workers(signal.SIGKILL)
+                    self._deadline = float('inf')
+                time.sleep(0.05)
+                continue
+
+            worker_id = self._workers.pop(pid)
+            lifetime = time.monotonic() - self._started.pop(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if self._stopping:
+                continue
+            if code != 0:
+                print(f"Worker {worker_id} (pid {pid}) exited with code {code}; replacing it.", flush=True)
+            if lifetime < MIN_WORKER_LIFETIME_SECONDS:
+                # Do not spin when workers fail right after starting
+                time.sleep(MIN_WORKER_LIFETIME_SECONDS)
+            self.restarts += 1
+            self._spawn(worker_id)
+
+    def _signal_workers(self, signum: int):
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _handle_stop(self, signum, frame):
+        if self._stopping:
+            return
+        print(f"Shutting down {len(self._workers)} workers...", flush=True)
+        self._stopping = True
+        self._deadline = time.monotonic() + self.graceful_timeout
+        self._signal_workers(signal.SIGTERM)
+
+    def _handle_reload(self, signum, frame):
+        # Each worker finishes its requests and exits; the supervisor forks a replacement
+        print("Replacing all workers...", flush=True)
+        self._signal_workers(signal.SIGTERM)
+
+    # --- Worker ---
+
+    def _run_worker(self, worker_id: int) -> int:
+        # The parent coordinates shutdown: a terminal Ctrl-C reaches it and is forwarded as SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+
+        tutor = self.tutor
+        if tutor is None:
+            tutor = self._load_tutor()
+            tutor.profile_store.close()
+        # Only PyTorch backends need this; importing torch for it would cost every worker its memory
+        if 'torch' in sys.modules:
+            set_torch_threads(self.threads_per_worker)
+        store = self.profile_store_factory()
+        tutor.use_profile_store(store)
+        # Loaded from the database here rather than forked, so a replaced worker starts current
+        analytics = ReloadingAnalytics.from_config(self.analytics_config, store)
+
+        service = TutorService(tutor, analytics=analytics, worker_id=worker_id, **self.service_options)
+
+        async def run():
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, service.shutdown)
+            await service.serve(sock=self._sock, max_requests=self.max_requests)
+
+        try:
+            asyncio.run(run())
+        finally:
+            store.close()
+        return 0
@@ -0,0 +1,390 @@
+# src/profile_analytics.py
+"""
+Cohort analytics over the user profiles: the most frequent error topics, topic error rates per
+time window and the learners who struggle with a topic.
+
+Profiles are loaded once into columnar arrays (topics coded as integers, one contiguous column
+of per-user counts for each) so each query is a handful of vectorized NumPy operations instead of a scan of millions
+of Python dicts. Attached to a ProfileStore, the arrays follow every later increment.
+
+    python -m src.profile_analytics --top 10
+    python -m src.profile_analytics --struggling "Articles and Gender" --since 2025-09-01
+    python -m src.profile_analytics --window-days 7
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import yaml
+
+from .profile_store import ProfileStore
+
+# last_seen of users whose profile has no timestamp (the same bit pattern as NaT)
+NO_TIMESTAMP = np.iinfo(np.int64).min
+
+QUERIES = ('top_topics', 'topic_error_rates', 'struggling_users')
+
+Timestamp = Union[str, datetime, None]
+
+
+def to_epoch_seconds(values: List[Optional[str]]) -> np.ndarray:
+    """
+    Parses ISO-8601 timestamps (as written by the tutor, with or without a UTC suffix) into
+    int64 seconds since the epoch. Missing values become NO_TIMESTAMP.
+    """
+    # Timestamps are UTC; numpy rejects explicit offsets, so keep the date and time only
+    trimmed = [value[:19] if value else None for value in values]
+    return np.array(trimmed, dtype='datetime64[s]').astype(np.int64)
+
+
+def _epoch_seconds(value: Timestamp) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        value = value.isoformat()
+    return int(to_epoch_seconds([value])[0])
+
+
+def _isoformat(seconds: int) -> Optional[str]:
+    if seconds == NO_TIMESTAMP:
+        return None
+    return str(np.datetime64(int(seconds), 's'))
+
+
+class ProfileAnalytics:
+    """
+    Columnar, incrementally updated copy of the error counts of every user.
+
+    Users map to positions and topics to integer ids in first-seen order. Counts are stored
+    topic-major, one contiguous int32 column of per-user counts for each topic, next to an
+    int64 vector of `last_seen` epoch seconds; both are over-allocated and grow by doubling,
+    so recording a correction is an O(1) array update.
+    Queries take an optional [since, until) range on `last_seen`, the only time information
+    the profiles keep: a window selects the users last active in it, with their lifetime counts.
+    """
+    def __init__(self, initial_users: int = 1024, initial_topics: int = 16):
+        self.user_ids: List[str] = []
+        self.topics: List[str] = []
+        self._user_rows: Dict[str, int] = {}
+        self._topic_ids: Dict[str, int] = {}
+        self._columns = np.zeros((max(1, initial_topics), max(1, initial_users)), dtype=np.int32)
+        self._last_seen = np.full(max(1, initial_users), NO_TIMESTAMP, dtype=np.int64)
+        self._lock = threading.Lock()
+        self.updates = 0
+
+    @classmethod
+    def from_store(cls, store: ProfileStore, follow: bool = True) -> 'ProfileAnalytics':
+        """
+        Loads every profile of `store`. With `follow`, increments made through the store from
+        then on are applied as they happen.
+        """
+        analytics = cls()
+        profiles, counts = store.scan(listener=analytics.record_many if follow else None)
+        analytics._load_rows(profiles, counts)
+        return analytics
+
+    @classmethod
+    def from_profiles(cls, profiles: Dict[str, dict]) -> 'ProfileAnalytics':
+        """Loads profiles in the shape returned by ProfileStore.get_many (or the legacy JSON file)."""
+        analytics = cls()
+        analytics._load_rows(
+            [(user_id, profile.get("last_seen")) for user_id, profile in profiles.items()],
+            [(user_id, topic, count)
+             for user_id, profile in profiles.items()
+             for topic, count in profile.get("error_counts", {}).items()])
+        return analytics
+
+    @classmethod
+    def from_config(cls, analytics_config: dict, store: ProfileStore) -> Optional['ProfileAnalytics']:
+        """
+        Builds analytics from the `profile_analytics` section of config.yaml, or returns None when disabled.
+        """
+        if not analytics_config.get('enabled', False):
+            return None
+        analytics = cls.from_store(store, follow=analytics_config.get('follow_updates', True))
+        print(f"Loaded profile analytics for {analytics.num_users} users and {len(analytics.topics)} topics.")
+        return analytics
+
+    @property
+    def num_users(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def columns(self) -> np.ndarray:
+        """The (topics x users) error counts, one row per topic (a view; do not modify)."""
+        return self._columns[:len(self.topics), :self.num_users]
+
+    @property
+    def counts(self) -> np.ndarray:
+        """The (users x topics) error counts (a transposed view of `columns`)."""
+        return self.columns.T
+
+    @property
+    def last_seen(self) -> np.ndarray:
+        """Last activity of each user in epoch seconds (a view; do not modify)."""
+        return self._last_seen[:self.num_users]
+
+    # --- Loading and updates ---
+
+    def _reserve(self, num_users: int, num_topics: int):
+        """Grows the arrays (by doubling) to hold at least this many users and topics."""
+        topics, users = self._columns.shape
+        if num_users <= users and num_topics <= topics:
+            return
+        while users < num_users:
+            users *= 2
+        while topics < num_topics:
+            topics *= 2
+        columns = np.zeros((topics, users), dtype=np.int32)
+        columns[:self._columns.shape[0], :self._columns.shape[1]] = self._columns
+        last_seen = np.full(users, NO_TIMESTAMP, dtype=np.int64)
+        last_seen[:len(self._last_seen)] = self._last_seen
+        self._columns, self._last_seen = columns, last_seen
+
+    def _rows_for(self, user_ids: List[str]) -> np.ndarray:
+        for user_id in user_ids:
+            if user_id not in self._user_rows:
+                self._user_rows[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+        return np.fromiter((self._user_rows[user_id] for user_id in user_ids), dtype=np.int64, count=len(user_ids))
+
+    def _topic_ids_for(self, topics: List[str]) -> np.ndarray:
+        for topic in topics:
+            if topic not in self._topic_ids:
+                self._topic_ids[topic] = len(self.topics)
+                self.topics.append(topic)
+        return np.fromiter((self._topic_ids[topic] for topic in topics), dtype=np.int64, count=len(topics))
+
+    def _load_rows(self, profiles: List[Tuple[str, Optional[str]]], counts: List[Tuple[str, str, int]]):
+        with self._lock:
+            rows = self._rows_for([user_id for user_id, _ in profiles])
+            count_rows = self._rows_for([user_id for user_id, _, _ in counts])
+            topic_ids = self._topic_ids_for([topic for _, topic, _ in counts])
+            self._reserve(self.num_users, len(self.topics))
+            np.maximum.at(self._last_seen, rows, to_epoch_seconds([last_seen for _, last_seen in profiles]))
+            np.add.at(self._columns, (topic_ids, count_rows), np.array([count for _, _, count in counts], dtype=np.int32))
+
+    def record_many(self, updates: List[Tuple[str, str]], count: int = 1, last_seen: Timestamp = None):
+        """
+        Adds `count` for each (user_id, error_topic) pair; the signature of ProfileStore.increment_many,
+        so it can be subscribed to a store.
+        """
+        if not updates:
+            return
+        seconds = _epoch_seconds(last_seen or datetime.utcnow())
+        with self._lock:
+            rows = self._rows_for([user_id for user_id, _ in updates])
+            topic_ids = self._topic_ids_for([topic for _, topic in updates])
+            self._reserve(self.num_users, len(self.topics))
+            np.add.at(self._columns, (topic_ids, rows), count)
+            np.maximum.at(self._last_seen, rows, seconds)
+            self.updates += len(updates)
+
+    def record(self, user_id: str, error_topic: str, count: int = 1, last_seen: Timestamp = None):
+        self.record_many([(user_id, error_topic)], count=count, last_seen=last_seen)
+
+    # --- Queries ---
+
+    def _active(self, since: Timestamp, until: Timestamp) -> Optional[np.ndarray]:
+        """Boolean mask of the users last seen in [since, until), or None for all users."""
+        since, until = _epoch_seconds(since), _epoch_seconds(until)
+        if since is None and until is None:
+            return None
+        last_seen = self.last_seen
+        mask = last_seen != NO_TIMESTAMP
+        if since is not None:
+            mask &= last_seen >= since
+        if until is not None:
+            mask &= last_seen < until
+        return mask
+
+    def top_topics(self, k: int = 10, since: Timestamp = None, until: Timestamp = None) -> List[dict]:
+        """
+        The `k` topics with the most errors, among users last seen in [since, until).
+
+        Returns:
+            list[dict]: {"topic", "errors", "users"} (users with at least one such error), most errors first.
+        """
+        with self._lock:
+            columns = self.columns
+            mask = self._active(since, until)
+            if mask is not None:
+                columns = columns[:, mask]
+            errors = columns.sum(axis=1, dtype=np.int64)
+            users = np.count_nonzero(columns, axis=1)
+        order = np.argsort(-errors, kind='stable')[:k]
+        return [{"topic": self.topics[t], "errors": int(errors[t]), "users": int(users[t])}
+                for t in order if errors[t] > 0]
+
+    def topic_error_rates(self, window_seconds: int = 86400, since: Timestamp = None,
+                          until: Timestamp = None) -> List[dict]:
+        """
+        Groups users into consecutive windows of `window_seconds` by `last_seen` and reports,
+        per window, how many were active and the share of them with each error topic.
+
+        Returns:
+            list[dict]: One {"start", "active_users", "errors": {topic: n}, "rates": {topic: share}}
+                per non-empty window, oldest first.
+        """
+        with self._lock:
+            mask = self.last_seen != NO_TIMESTAMP
+            window_mask = self._active(since, until)
+            if window_mask is not None:
+                mask &= window_mask
+            columns = self.columns[:, mask]
+            last_seen = self.last_seen[mask]
+        if len(last_seen) == 0:
+            return []
+        buckets = last_seen // window_seconds
+        first = buckets.min()
+        buckets -= first
+        num_buckets = int(buckets.max()) + 1
+        active = np.bincount(buckets, minlength=num_buckets)
+        # (topics x windows) sums of the counts and of the users with a nonzero count
+        errors = np.array([np.bincount(buckets, weights=column, minlength=num_buckets) for column in columns]).T
+        affected = np.array([np.bincount(buckets, weights=column > 0, minlength=num_buckets) for column in columns]).T
+
+        windows = []
+        for bucket in np.flatnonzero(active):
+            present = np.flatnonzero(errors[bucket])
+            windows.append({
+                "start": _isoformat((first + bucket) * window_seconds),
+                "active_users": int(active[bucket]),
+                "errors": {self.topics[t]: int(errors[bucket, t]) for t in present},
+                "rates": {self.topics[t]: float(affected[bucket, t] / active[bucket]) for t in present},
+            })
+        return windows
+
+    def struggling_users(self, topic: str, min_count: int = 3, min_share: float = 0.0, limit: int = 100,
+                         since: Timestamp = None, until: Timestamp = None) -> List[dict]:
+        """
+        Users with at least `min_count` errors on `topic`, making up at least `min_share` of their
+        errors, among users last seen in [since, until).
+
+        Returns:
+            list[dict]: Up to `limit` {"user_id", "count", "share", "last_seen"}, most errors first.
+        """
+        with self._lock:
+            topic_id = self._topic_ids.get(topic)
+            if topic_id is None:
+                return []
+            columns = self.columns
+            column = columns[topic_id]
+            mask = column >= min_count
+            if min_share > 0:
+                mask &= column >= min_share * columns.sum(axis=0, dtype=np.int64)
+            window_mask = self._active(since, until)
+            if window_mask is not None:
+                mask &= window_mask
+            rows = np.flatnonzero(mask)
+            # Stable sort on the selected rows only: ties keep user order
+            rows = rows[np.argsort(-column[rows], kind='stable')[:limit]]
+            totals = columns[:, rows].sum(axis=0, dtype=np.int64)
+            return [{"user_id": self.user_ids[row], "count": int(column[row]),
+                     "share": float(column[row] / total), "last_seen": _isoformat(self._last_seen[row])}
+                    for row, total in zip(rows, totals)]
+
+    def query(self, name: str, params: Optional[dict] = None):
+        """Runs one of QUERIES by name with keyword parameters (as sent to the tutor service)."""
+        if name not in QUERIES:
+            raise ValueError(f"Unknown analytics query '{name}'. Expected one of: {', '.join(QUERIES)}.")
+        return getattr(self, name)(**(params or {}))
+
+    def stats(self) -> dict:
+        return {"users": self.num_users, "topics": len(self.topics), "updates": self.updates}
+
+
+class ReloadingAnalytics:
+    """
+    ProfileAnalytics for a process that does not see every increment, such as a pre-forked
+    worker (other workers write to the same database). A query finding the loaded copy older
+    than `max_age_seconds` starts a reload from the store on a background thread and is
+    answered from the current copy; the fresh one replaces it once loaded. Every process thus
+    answers from the shared database, at most `max_age_seconds` plus one load behind it, and
+    no query waits for a full load.
+    """
+    def __init__(self, store: ProfileStore, max_age_seconds: float = 1.0):
+        """
+        Args:
+            store (ProfileStore): This process's connection to the shared profile store.
+            max_age_seconds (float): Age of the loaded copy past which a query starts a reload
+                (0: every query).
+        """
+        self.store = store
+        self.max_age_seconds = max_age_seconds
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._reloading: Optional[threading.Thread] = None
+        self.analytics = ProfileAnalytics.from_store(store, follow=False)
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def from_config(cls, analytics_config: dict, store: ProfileStore) -> Optional['ReloadingAnalytics']:
+        """Like `ProfileAnalytics.from_config`, with `worker_max_age_seconds` as the reload age."""
+        if not analytics_config.get('enabled', False):
+            return None
+        return cls(store, max_age_seconds=analytics_config.get('worker_max_age_seconds', 1.0))
+
+    def _reload(self):
+        started = time.monotonic()
+        try:
+            analytics = ProfileAnalytics.from_store(self.store, follow=False)
+        except Exception as e:
+            print(f"Warning: could not reload profile analytics: {e}")
+            analytics = None
+        with self._lock:
+            if analytics is not None:
+                self.analytics, self.loaded_at = analytics, started
+                self.reloads += 1
+            self._reloading = None
+
+    def query(self, name: str, params: Optional[dict] = None):
+        """Runs `ProfileAnalytics.query` on the loaded copy, starting a reload if it is too old."""
+        with self._lock:
+            if self._reloading is None and time.monotonic() - self.loaded_at >= self.max_age_seconds:
+                self._reloading = threading.Thread(target=self._reload, name="analytics-reload", daemon=True)
+                self._reloading.start()
+            analytics = self.analytics
+        return analytics.query(name, params)
+
+    def stats(self) -> dict:
+        return {**self.analytics.stats(), "reloads": self.reloads,
+                "age_seconds": round(time.monotonic() - self.loaded_at, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cohort analytics over the user profiles.")
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--top', type=int, default=10, help="Number of error topics listed.")
+    parser.add_argument('--since', help="Only users last seen at or after this ISO date.")
+    parser.add_argument('--until', help="Only users last seen before this ISO date.")
+    parser.add_argument('--window-days', type=float, help="Also print topic error rates per window of this many days.")
+    parser.add_argument('--struggling', metavar='TOPIC', help="List the users who struggle most with this topic.")
+    parser.add_argument('--min-count', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    store = ProfileStore.from_config(config)
+    analytics = ProfileAnalytics.from_store(store, follow=False)
+    store.close()
+    print(f"{analytics.num_users} users, {len(analytics.topics)} topics.")
+
+    print(json.dumps({"top_topics": analytics.top_topics(args.top, since=args.since, until=args.until)},
+                     ensure_ascii=False, indent=2))
+    if args.window_days:
+        rates = analytics.topic_error_rates(int(args.window_days * 86400), since=args.since, until=args.until)
+        print(json.dumps({"topic_error_rates": rates}, ensure_ascii=False, indent=2))
+    if args.struggling:
+        users = analytics.struggling_users(args.struggling, min_count=args.min_count, since=args.since, until=args.until)
+        print(json.dumps({"struggling_users": users}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# src/profile_store.py
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    user_id TEXT PRIMARY KEY,
+    last_seen TEXT
+);
+CREATE TABLE IF NOT EXISTS error_counts (
+    user_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, topic)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+class ProfileStore:
+    """
+    Indexed, incrementally-written store of user learning profiles.
+
+    Profiles live in SQLite in WAL mode, keyed by user id, so reading or updating one user
+    touches a handful of B-tree pages no matter how many users exist. Error-count increments
+    are buffered in memory and written by a background thread at most `flush_interval`
+    seconds later, in a single transaction per flush. Writes are additive upserts, so several
+    processes sharing the database never lose each other's updates. Reads always include
+    increments that are still waiting to be flushed.
+
+    Profiles are returned in the same shape as the legacy JSON database:
+    {"error_counts": {topic: count}, "last_seen": iso_timestamp}.
+    """
+    def __init__(self, db_path: str, flush_interval: float = 1.0, max_pending: int = 1000, legacy_json_path: Optional[str] = None):
+        """
+        Args:
+            db_path (str): Path to the SQLite database file (created if missing).
+            flush_interval (float): Maximum number of seconds an increment waits before being written.
+                Zero or less writes every increment immediately.
+            max_pending (int): Number of buffered users that triggers an early flush.
+            legacy_json_path (str, optional): A `user_profiles.json` file to import once, the first
+                time this database is opened.
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+
+        self._lock = threading.RLock()
+        self._pending: Dict[str, dict] = {}
+        self._listeners: List[Callable] = []
+        self._closed = False
+
+        if legacy_json_path is not None:
+            self.migrate_from_json(legacy_json_path)
+
+        self._stop = threading.Event()
+        self._flusher = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="profile-store-flusher", daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def open(cls, path: str, **kwargs) -> 'ProfileStore':
+        """
+        Opens a store from a path as used by the rest of the code. A legacy `.json` path maps to
+        a sibling `.sqlite3` database, which imports the JSON file the first time it is created.
+        """
+        if path.endswith('.json'):
+            return cls(os.path.splitext(path)[0] + '.sqlite3', legacy_json_path=path, **kwargs)
+        return cls(path, **kwargs)
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'ProfileStore':
+        """
+        Builds a store from a loaded config.yaml (`profile_store` section plus `paths.user_profiles`).
+        """
+        store_config = config.get('profile_store', {})
+        legacy_path = config['paths']['user_profiles']
+        if 'db_path' not in store_config:
+            return cls.open(legacy_path)
+        return cls(
+            store_config['db_path'],
+            flush_interval=store_config.get('flush_interval_seconds', 1.0),
+            max_pending=store_config.get('max_pending_users', 1000),
+            legacy_json_path=legacy_path if legacy_path.endswith('.json') else None
+        )
+
+    # --- Reads ---
+
+    def get(self, user_id: str) -> Optional[dict]:
+        """Returns the profile of one user, or None if nothing has been logged for them."""
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, dict]:
+        """
+        Returns the profiles of the given users that exist, keyed by user id.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        profiles: Dict[str, dict] = {}
+        with self._lock:
+            for start in range(0, len(user_ids), _QUERY_CHUNK):
+                chunk = user_ids[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for user_id, last_seen in self._conn.execute(
+                        f"SELECT user_id, last_seen FROM profiles WHERE user_id IN ({placeholders})", chunk):
+                    profiles[user_id] = {"error_counts": {}, "last_seen": last_seen}
+                for user_id, topic, count in self._conn.execute(
+                        f"SELECT user_id, topic, count FROM error_counts WHERE user_id IN ({placeholders})", chunk):
+                    profiles.setdefault(user_id, {"error_counts": {}, "last_seen": None})["error_counts"][topic] = count
+
+            # Overlay increments that have not reached the database yet
+            for user_id in user_ids:
+                pending = self._pending.get(user_id)
+                if pending is None:
+                    continue
+                profile = profiles.setdefault(user_id, {"error_counts": {}, "last_seen": None})
+                for topic, count in pending["counts"].items():
+                    profile["error_counts"][topic] = profile["error_counts"].get(topic, 0) + count
+                profile["last_seen"] = max(filter(None, [profile["last_seen"], pending["last_seen"]]))
+        return profiles
+
+    def iter_profiles(self, batch_size: int = 10000) -> Iterable[Tuple[str, dict]]:
+        """
+        Streams every (user_id, profile) pair in user id order, after flushing pending writes.
+        """
+        self.flush()
+        last_user_id = ""
+        while True:
+            with self._lock:
+                user_ids = [row[0] for row in self._conn.execute(
+                    "SELECT user_id FROM profiles WHERE user_id > ? ORDER BY user_id LIMIT ?", (last_user_id, batch_size))]
+            if not user_ids:
+                return
+            profiles = self.get_many(user_ids)
+            for user_id in user_ids:
+                yield user_id, profiles[user_id]
+            last_user_id = user_ids[-1]
+
+    def scan(self, listener: Optional[Callable] = None) -> Tuple[list, list]:
+        """
+        Reads both tables whole, after flushing pending writes, for bulk consumers such as
+        `ProfileAnalytics`.
+
+        Args:
+            listener (callable, optional): Subscribed (see `subscribe`) in the same critical
+                section as the read, so every later increment reaches it exactly once. This
+                holds the store lock for the whole read; without a listener the tables are read
+                through a separate connection, and reads and writes carry on meanwhile.
+
+        Returns:
+            tuple: ([(user_id, last_seen)], [(user_id, topic, count)]).
+        """
+        if listener is not None:
+            with self._lock:
+                self.flush()
+                profiles, counts = self._read_tables(self._conn)
+                self.subscribe(listener)
+            return profiles, counts
+        self.flush()
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=5000")
+            # One read transaction, so both tables come from the same snapshot
+            conn.execute("BEGIN")
+            profiles, counts = self._read_tables(conn)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return profiles, counts
+
+    @staticmethod
+    def _read_tables(conn: sqlite3.Connection) -> Tuple[list, list]:
+        profiles = conn.execute("SELECT user_id, last_seen FROM profiles").fetchall()
+        counts = conn.execute("SELECT user_id, topic, count FROM error_counts").fetchall()
+        return profiles, counts
+
+    def __len__(self) -> int:
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+            if not self._pending:
+                return stored
+            placeholders = ",".join("?" * len(self._pending))
+            already_stored = self._conn.execute(
+                f"SELECT COUNT(*) FROM profiles WHERE user_id IN ({placeholders})", list(self._pending)).fetchone()[0]
+            return stored + len(self._pending) - already_stored
+
+    # --- Writes ---
+
+    def subscribe(self, listener: Callable[[List[Tuple[str, str]], int, str], None]):
+        """
+        Calls `listener(updates, count, last_seen)` with every batch of increments made through
+        this store. Increments written by other processes sharing the database are not seen.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def increment(self, user_id: str, error_topic: str, count: int = 1, last_seen: Optional[str] = None):
+        """Adds `count` to one topic of one user."""
+        self.increment_many([(user_id, error_topic)], count=count, last_seen=last_seen)
+
+    def increment_many(self, updates: List[Tuple[str, str]], count: int = 1, last_seen: Optional[str] = None):
+        """
+        Buffers one increment per (user_id, error_topic) pair. The buffer is written by the
+        background flusher, or immediately once `max_pending` users are waiting.
+        """
+        last_seen = last_seen or datetime.utcnow().isoformat()
+        with self._lock:
+            for user_id, error_topic in updates:
+                pending = self._pending.setdefault(user_id, {"counts": Counter(), "last_seen": last_seen})
+                pending["counts"][error_topic] += count
+                pending["last_seen"] = max(pending["last_seen"], last_seen)
+            for listener in self._listeners:
+                listener(updates, count, last_seen)
+            if self.flush_interval <= 0 or len(self._pending) >= self.max_pending:
+                self.flush()
+
+    def flush(self):
+        """Writes every buffered increment in one transaction."""
+        with self._lock:
+            if not self._pending or self._closed:
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "INSERT INTO profiles (user_id, last_seen) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET last_seen = MAX(COALESCE(last_seen, ''), excluded.last_seen)",
+                    [(user_id, entry["last_seen"]) for user_id, entry in pending.items()])
+                self._conn.executemany(
+                    "INSERT INTO error_counts (user_id, topic, count) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id, topic) DO UPDATE SET count = count + excluded.count",
+                    [(user_id, topic, count) for user_id, entry in pending.items() for topic, count in entry["counts"].items()])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                # Put the increments back first so the next flush retries them, then undo the
+                # transaction if one was opened ("database is locked" fails BEGIN itself)
+                for user_id, entry in pending.items():
+                    merged = self._pending.setdefault(user_id, {"counts": Counter(), "last_seen": entry["last_seen"]})
+                    merged["counts"].update(entry["counts"])
+                    merged["last_seen"] = max(merged["last_seen"], entry["last_seen"])
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        """Stops the background flusher and writes anything still buffered."""
+        if self._closed:
+            return
+        self._stop.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        with self._lock:
+            self.flush()
+            self._closed = True
+            self._conn.close()
+        atexit.unregister(self.close)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Warning: could not flush user profiles to '{self.db_path}': {e}")
+
+    # --- Migration ---
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        One-shot import of a legacy `user_profiles.json` file. The import is recorded in the
+        database, so calling this again (or reopening the store) never double-counts.
+
+        Returns:
+            int: The number of user profiles imported (0 if already migrated or no file exists).
+        """
+        with self._lock:
+            marker = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+            if marker is not None:
+                return 0
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    profiles = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                profiles = {}
+
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                # Another process may have migrated while this one waited for the write lock
+                if self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone() is not None:
+                    self._conn.execute("ROLLBACK")
+                    return 0
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO profiles (user_id, last_seen) VALUES (?, ?)",
+                    [(user_id, profile.get("last_seen")) for user_id, profile in profiles.items()])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO error_counts (user_id, topic, count) VALUES (?, ?, ?)",
+                    [(user_id, topic, count)
+                     for user_id, profile in profiles.items()
+                     for topic, count in profile.get("error_counts", {}).items()])
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from', ?)", (json_path,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+        if profiles:
+            print(f"Migrated {len(profiles)} user profiles from '{json_path}' into '{self.db_path}'.")
+        return len(profiles)
@@ -1,9 +1,34 @@
 # src/rag_pipeline.py
 import json
 import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+from .docstore import DocStore
+from .embedding_cache import EmbeddingCache
+from .embeddings import load_embedding_backend
+from .lexical_index import is_decisive, reciprocal_rank_fusion
+from .metrics import Metrics
+from .profile_store import ProfileStore
+
+# Heavy dependencies (faiss, torch via sentence_transformers) are imported by the component
+# loaders below rather than at module import, so constructing a pipeline can return at once.
+COMPONENTS = ('knowledge_base', 'index', 'embedding_model')
+STARTUP_MODES = ('eager', 'background', 'lazy')
+RETRIEVAL_MODES = ('vector', 'lexical', 'hybrid')
+# Components each retrieval mode needs, in loading order (cheapest first)
+MODE_COMPONENTS = {
+    'vector': COMPONENTS,
+    'lexical': ('knowledge_base', 'lexical_index'),
+    'hybrid': ('knowledge_base', 'lexical_index', 'index', 'embedding_model'),
+}
+DEFAULT_RETRIEVAL_CONFIG = {
+    "mode": "vector",
+    "top_k": 5,
+    "rrf_k": 60,
+    "lexical_skip": {"enabled": False, "min_score": 5.0, "margin": 2.0},
+}
 
 class RAGPipeline:
     """
@@ -12,47 +37,266 @@ class RAGPipeline:
     This class is responsible for loading a vector store of grammar rules and a
     database of user profiles. It retrieves relevant context based on a user's
     input sentence and their learning history to augment the LLM's prompt.
+    
+    The knowledge base, FAISS index and embedding model are loaded according to `startup`:
+    all at construction ('eager'), in a warm-up thread ('background'), or on first use
+    ('lazy'). `readiness()` reports which of them are loaded.
+    
+    Grammar rules are retrieved by dense vector search, by the BM25 lexical index built next
+    to it, or by both with their rankings fused ('hybrid'). In hybrid mode, a decisive lexical
+    hit can skip embedding and vector search for that sentence altogether.
     """
-    def __init__(self, vector_db_path: str, user_profile_db_path: str, knowledge_base_path: str, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, vector_db_path: str, user_profile_db_path: str, knowledge_base_path: str, model_name='all-MiniLM-L6-v2',
+                 embedding_model=None, encode_batch_size: int = 64, embedding_cache: Optional[EmbeddingCache] = None,
+                 profile_store: Optional[ProfileStore] = None, index_config: Optional[dict] = None,
+                 startup: str = 'eager', mmap_index: bool = True, metrics: Optional[Metrics] = None,
+                 retrieval_config: Optional[dict] = None, embedding_config: Optional[dict] = None):
         """
-        Initializes the RAG pipeline by loading all necessary components.
+        Initializes the RAG pipeline and loads (or schedules loading of) all necessary components.
         
         Args:
-            vector_db_path (str): Path to the directory containing the FAISS index and corpus.
-            user_profile_db_path (str): Path to the JSON file containing user profiles.
-            model_name (str): The name of the sentence transformer model to use for embeddings.
+            vector_db_path (str): Path to the directory containing the FAISS index and docstore.
+            user_profile_db_path (str): Path to the user profile database. A legacy JSON file is
+                migrated once into a sibling SQLite store (see `ProfileStore.open`).
+            knowledge_base_path (str): Path to the grammar knowledge-base JSON file. Only read for
+                vector stores built without a docstore.
+            model_name (str): The name of the sentence-transformers model to use for embeddings.
+            embedding_model: An already-loaded encoder exposing `encode(list_of_str)`. When given,
+                `model_name` is not loaded (useful for sharing one model or testing offline).
+            encode_batch_size (int): Maximum number of sentences sent to the encoder in one forward pass.
+            embedding_cache (EmbeddingCache, optional): Cache of query embeddings consulted before encoding.
+            profile_store (ProfileStore, optional): An already-open profile store to use instead of
+                opening `user_profile_db_path`.
+            index_config (dict, optional): The `vector_index` config section. Its query-time parameters
+                (`nprobe`, `ef_search`) override those saved with the index.
+            startup (str): 'eager', 'background' or 'lazy' (see the class docstring).
+            mmap_index (bool): Memory-map the FAISS index instead of copying it into RAM, when the
+                index type supports it.
+            metrics (Metrics, optional): Receives per-stage timings (embed, search, profile_read)
+                and embedding cache counters. Defaults to a disabled instance.
+            retrieval_config (dict, optional): The `retrieval` config section: `mode` ('vector',
+                'lexical' or 'hybrid'), `top_k` candidates taken from each ranking before fusion,
+                `rrf_k` and `lexical_skip` ({enabled, min_score, margin}). Defaults to vector search.
+            embedding_config (dict, optional): The `embedding` config section choosing the backend
+                `model_name` is loaded with (see `src/embeddings.py`). Defaults to fp32 sentence-transformers.
         """
+        if startup not in STARTUP_MODES:
+            raise ValueError(f"Unknown startup mode '{startup}'. Expected one of: {', '.join(STARTUP_MODES)}.")
+        self.embedding_config = embedding_config
+        self.retrieval_config = {**DEFAULT_RETRIEVAL_CONFIG, **(retrieval_config or {})}
+        self.retrieval_config['lexical_skip'] = {**DEFAULT_RETRIEVAL_CONFIG['lexical_skip'],
+                                                 **(self.retrieval_config.get('lexical_skip') or {})}
+        self.retrieval_mode = self.retrieval_config['mode']
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{self.retrieval_mode}'. Expected one of: {', '.join(RETRIEVAL_MODES)}.")
+        self.component_names = MODE_COMPONENTS[self.retrieval_mode]
         print("Initializing RAG pipeline...")
         self.vector_db_path = vector_db_path
         self.user_profile_db_path = user_profile_db_path
+        self.knowledge_base_path = knowledge_base_path
+        self.model_name = model_name
+        self.encode_batch_size = encode_batch_size
+        self.embedding_cache = embedding_cache
+        self.index_config = index_config
+        self.mmap_index = mmap_index
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.profile_store = profile_store if profile_store is not None else ProfileStore.open(user_profile_db_path)
+
+        self._loaders = {
+            'knowledge_base': self._load_knowledge_base,
+            'index': self._load_index,
+            'embedding_model': self._load_embedding_model,
+            'lexical_index': self._load_lexical_index,
+        }
+        self._components = {}
+        self._load_locks = {name: threading.Lock() for name in self._loaders}
+        self.load_errors: Dict[str, str] = {}
+        self.load_seconds: Dict[str, float] = {}
+        self._corpus = None
+        self._warmup_thread = None
+        if embedding_model is not None:
+            self._components['embedding_model'] = embedding_model
+            self.load_seconds['embedding_model'] = 0.0
+
+        if startup == 'eager':
+            self.warm_up()
+            print("RAG pipeline is ready.")
+        elif startup == 'background':
+            self._warmup_thread = threading.Thread(target=self.warm_up, kwargs={'raise_errors': False},
+                                                   name="rag-warm-up", daemon=True)
+            self._warmup_thread.start()
+            print("RAG pipeline is warming up in the background.")
+        else:
+            print("RAG pipeline will load its components on first use.")
+
+    # --- Component loading ---
+
+    def warm_up(self, raise_errors: bool = True):
+        """
+        Loads every component that is not loaded yet, cheapest first.
         
-        # Load the full knowledge base to get topic information
-        with open(knowledge_base_path, 'r', encoding='utf-8') as f:
-            self.knowledge_base = json.load(f)
-        
+        Args:
+            raise_errors (bool): Re-raise loading errors. When False they are only recorded in
+                `load_errors` (and raised again on first use).
+        """
+        for name in self.component_names:
+            try:
+                self._component(name)
+            except Exception:
+                if raise_errors:
+                    raise
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until a background warm-up has finished; returns whether all components are loaded."""
+        if self._warmup_thread is not None:
+            self._warmup_thread.join(timeout)
+        return self.is_ready
+
+    def readiness(self) -> dict:
+        """
+        Readiness probe: which components are loaded, how long each took and any loading errors.
+        """
+        components = {name: name in self._components for name in self.component_names}
+        return {
+            "ready": all(components.values()),
+            "components": components,
+            "load_seconds": dict(self.load_seconds),
+            "errors": dict(self.load_errors),
+        }
+
+    @property
+    def is_ready(self) -> bool:
+        return all(name in self._components for name in self.component_names)
+
+    @property
+    def knowledge_base(self) -> Union[DocStore, List[dict]]:
+        return self._component('knowledge_base')['documents']
+
+    @property
+    def documents_by_id(self) -> Union[DocStore, Dict[int, dict]]:
+        """Maps index ids to documents with `.get(id)`: the memory-mapped docstore, or a dict for older stores."""
+        return self._component('knowledge_base')['documents_by_id']
+
+    def documents_for_rules(self, rule_ids: List[str]) -> Dict[str, dict]:
+        """
+        Looks knowledge-base entries up by `rule_id` through the manifest and `documents_by_id`,
+        so a store with a docstore answers without parsing the knowledge base JSON.
+        Rules that are not indexed are left out.
+        """
+        from .vector_store import load_manifest
+
+        manifest = load_manifest(self.vector_db_path)
+        if manifest is None:
+            # Stores without a manifest index list positions; their knowledge base is loaded anyway
+            wanted = set(rule_ids)
+            return {doc['rule_id']: doc for doc in self.knowledge_base if doc.get('rule_id') in wanted}
+        found = {}
+        for rule_id in rule_ids:
+            entry = manifest['documents'].get(rule_id)
+            doc = self.documents_by_id.get(entry['id']) if entry is not None else None
+            if doc is not None:
+                found[rule_id] = doc
+        return found
+
+    @property
+    def index(self):
+        return self._component('index')
+
+    @property
+    def embedding_model(self):
+        return self._component('embedding_model')
+
+    @property
+    def lexical_index(self):
+        """The BM25 index, or None when the store was built without one (hybrid mode then falls back to vector search)."""
+        return self._component('lexical_index')
+
+    @property
+    def corpus(self) -> List[str]:
+        """The content of every document. Not needed for retrieval, so only decoded on demand."""
+        if self._corpus is None:
+            if isinstance(self.knowledge_base, DocStore):
+                self._corpus = self.knowledge_base.contents()
+            else:
+                # Stores built before the docstore keep the contents in corpus.json
+                with open(os.path.join(self.vector_db_path, 'corpus.json'), 'r', encoding='utf-8') as f:
+                    self._corpus = json.load(f)
+        return self._corpus
+
+    def _component(self, name: str):
+        if name in self._components:
+            return self._components[name]
+        with self._load_locks[name]:
+            if name not in self._components:
+                start = time.perf_counter()
+                try:
+                    self._components[name] = self._loaders[name]()
+                except Exception as e:
+                    self.load_errors[name] = f"{type(e).__name__}: {e}"
+                    if isinstance(e, FileNotFoundError):
+                        print(f"Error initializing RAG pipeline: {e}")
+                        print("Please ensure you have run 'scripts/03_build_vector_store.py' to generate the necessary files.")
+                    raise
+                self.load_errors.pop(name, None)
+                self.load_seconds[name] = time.perf_counter() - start
+        return self._components[name]
+
+    def _load_knowledge_base(self) -> dict:
+        from .vector_store import load_manifest, map_ids_to_documents
+
+        # Map the docstore written with the index: documents are decoded only when retrieved
+        docstore = DocStore.open(self.vector_db_path)
+        if docstore is not None:
+            print(f"Docstore with {len(docstore)} documents mapped from '{docstore.path}'.")
+            return {"documents": docstore, "documents_by_id": docstore}
+
+        # Older stores: load the full knowledge base to get topic information
+        print(f"Warning: no docstore in '{self.vector_db_path}'; loading the knowledge base JSON. "
+              "Re-run 'scripts/03_build_vector_store.py' to build it.")
+        with open(self.knowledge_base_path, 'r', encoding='utf-8') as f:
+            documents = json.load(f)
+
+        # Map index ids back to knowledge-base entries. Stores built with a manifest use
+        # stable ids keyed by rule_id; older stores fall back to list positions.
+        manifest = load_manifest(self.vector_db_path)
+        if manifest is not None:
+            documents_by_id = map_ids_to_documents(manifest, documents)
+        else:
+            documents_by_id = dict(enumerate(documents))
+        print(f"Knowledge base with {len(documents)} documents loaded from '{self.knowledge_base_path}'.")
+        return {"documents": documents, "documents_by_id": documents_by_id}
+
+    def _load_index(self):
+        from .vector_store import apply_search_params, load_manifest, read_index
+
+        # Load the FAISS index from disk
+        index_path = os.path.join(self.vector_db_path, 'faiss_index.bin')
+        manifest = load_manifest(self.vector_db_path) or {}
+        index = read_index(index_path, mmap=self.mmap_index, index_type=manifest.get('index', {}).get('type', 'flat'))
+        if self.index_config is not None:
+            apply_search_params(index, self.index_config)
+        print(f"FAISS index loaded successfully from '{index_path}'.")
+        return index
+
+    def _load_lexical_index(self):
+        from .lexical_index import LexicalIndex
+
         try:
-            # Load the sentence transformer model for encoding queries
-            print(f"Loading sentence transformer model: '{model_name}'...")
-            self.embedding_model = SentenceTransformer(model_name)
-            
-            # Load the FAISS index from disk
-            index_path = os.path.join(self.vector_db_path, 'faiss_index.bin')
-            self.index = faiss.read_index(index_path)
-            print(f"FAISS index loaded successfully from '{index_path}'.")
-
-            # Load the corpus that maps index positions to text
-            corpus_path = os.path.join(self.vector_db_path, 'corpus.json')
-            with open(corpus_path, 'r', encoding='utf-8') as f:
-                self.corpus = json.load(f)
-            print(f"Corpus with {len(self.corpus)} documents loaded from '{corpus_path}'.")
-
-        except FileNotFoundError as e:
-            print(f"Error initializing RAG pipeline: {e}")
-            print("Please ensure you have run 'scripts/03_build_vector_store.py' to generate the necessary files.")
-            raise
-            
-        self.is_ready = True
-        print("RAG pipeline is ready.")
+            lexical_index = LexicalIndex.load(self.vector_db_path)
+        except FileNotFoundError:
+            if self.retrieval_mode == 'lexical':
+                raise
+            print(f"Warning: no lexical index in '{self.vector_db_path}'; using vector search only. "
+                  "Re-run 'scripts/03_build_vector_store.py' to build it.")
+            return None
+        print(f"Lexical index with {len(lexical_index.vocabulary)} terms loaded from '{self.vector_db_path}'.")
+        return lexical_index
+
+    def _load_embedding_model(self):
+        # Load the embedding backend for encoding queries
+        return load_embedding_backend(self.model_name, self.embedding_config)
+
+    # --- Retrieval ---
 
     def get_context(self, sentence: str, user_id: str) -> str:
         """
@@ -65,15 +309,100 @@ class RAGPipeline:
         Returns:
             str: A combined string of retrieved context to be injected into the LLM prompt.
         """
-        # 1. Retrieve the most relevant grammar rule from the vector store
-        grammar_context = self._query_grammar_db(sentence)
+        return self.get_context_with_topic(sentence, user_id)["content"]
+
+    def get_context_with_topic(self, sentence: str, user_id: str) -> dict:
+        """
+        Same as `get_context`, but also returns the topic of the retrieved grammar rule.
         
-        # 2. Retrieve personalized context from the user's learning history
-        user_context = self._query_user_profile(user_id)
+        Args:
+            sentence (str): The user's input sentence.
+            user_id (str): The unique identifier for the user.
+            
+        Returns:
+            dict: {"content": combined context string, "topic": topic of the retrieved rule,
+                "rule_id": rule_id of the retrieved rule, or None}.
+        """
+        return self.get_context_batch([sentence], [user_id])[0]
+
+    def get_context_batch(self, sentences: List[str], user_ids: Union[str, List[str]], batch_size: Optional[int] = None,
+                          query_embeddings: Optional[np.ndarray] = None, return_embeddings: bool = False):
+        """
+        Retrieves context for many sentences at once.
+        
+        All sentences are encoded in chunks of `batch_size` and searched with a single
+        matrix query against the FAISS index. The profile database is read once per batch,
+        and each distinct user profile is summarised only once.
+        
+        Args:
+            sentences (list[str]): The user's input sentences.
+            user_ids (str | list[str]): One user id for the whole batch, or one id per sentence.
+            batch_size (int, optional): Encoder chunk size. Defaults to `encode_batch_size`.
+            query_embeddings (np.ndarray, optional): Embeddings of `sentences` from `encode`, when
+                the caller already has them.
+            return_embeddings (bool): Also return the embedding of each sentence, or None for
+                the sentences retrieval did not embed (decisive lexical hits, lexical mode).
+            
+        Returns:
+            list[dict]: One {"content", "topic", "rule_id"} dict per sentence, in input order;
+                with `return_embeddings`, a (contexts, embeddings) tuple.
+        """
+        if isinstance(user_ids, str):
+            user_ids = [user_ids] * len(sentences)
+        if len(user_ids) != len(sentences):
+            raise ValueError(f"Got {len(sentences)} sentences but {len(user_ids)} user ids.")
+        
+        # 1. Retrieve the most relevant grammar rule for every sentence in one search
+        grammar_hits, embeddings = self._search_grammar_db(sentences, batch_size=batch_size, query_embeddings=query_embeddings)
         
-        return f"{grammar_context}\n{user_context}"
+        # 2. Retrieve personalized context, once per distinct user
+        with self.metrics.span("profile_read"):
+            user_contexts = self._query_user_profiles(user_ids)
+        
+        contexts = [
+            {"content": f"{hit['content']}\n{user_contexts[user_id]}", "topic": hit["topic"], "rule_id": hit["rule_id"]}
+            for hit, user_id in zip(grammar_hits, user_ids)
+        ]
+        return (contexts, embeddings) if return_embeddings else contexts
 
-    def _query_grammar_db(self, query_sentence: str, k: int = 1) -> str:
+    def encode(self, sentences: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Embeds query sentences the way retrieval does (through the embedding cache, if any).
+        
+        Returns:
+            np.ndarray: A float32 matrix with one row per sentence.
+        """
+        return self._encode(sentences, batch_size=batch_size)
+
+    def _encode(self, sentences: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Encodes sentences into a float32 matrix, at most `batch_size` sentences per forward pass.
+        When an embedding cache is configured, only the distinct sentences it misses are encoded.
+        """
+        with self.metrics.span("embed"):
+            if self.embedding_cache is None:
+                return self._encode_uncached(sentences, batch_size)
+
+            cached = self.embedding_cache.get_many(sentences)
+            missing = list(dict.fromkeys(s for s, embedding in zip(sentences, cached) if embedding is None))
+            self.metrics.increment("embedding_cache_hits", sum(embedding is not None for embedding in cached))
+            self.metrics.increment("embedding_cache_misses", sum(embedding is None for embedding in cached))
+            if missing:
+                fresh = self._encode_uncached(missing, batch_size)
+                self.embedding_cache.put_many(missing, fresh)
+                fresh_by_sentence = dict(zip(missing, fresh))
+                cached = [fresh_by_sentence[s] if embedding is None else embedding for s, embedding in zip(sentences, cached)]
+            return np.ascontiguousarray(np.vstack(cached), dtype='float32')
+
+    def _encode_uncached(self, sentences: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        batch_size = batch_size or self.encode_batch_size
+        chunks = [
+            np.asarray(self.embedding_model.encode(sentences[start:start + batch_size], convert_to_tensor=False), dtype='float32')
+            for start in range(0, len(sentences), batch_size)
+        ]
+        return np.ascontiguousarray(np.vstack(chunks), dtype='float32')
+
+    def _query_grammar_db(self, query_sentence: str, k: int = 1) -> dict:
         """
         Encodes the query sentence and performs a vector search on the FAISS index.
         
@@ -82,28 +411,90 @@ class RAGPipeline:
             k (int): The number of top results to retrieve.
             
         Returns:
-            str: The content of the most relevant grammar rule document.
+            dict: The content, topic and rule_id of the most relevant grammar rule document.
         """
-        query_embedding = self.embedding_model.encode([query_sentence], convert_to_tensor=False)
-        query_embedding = np.array(query_embedding).astype('float32')
+        return self._query_grammar_db_batch([query_sentence], k=k)[0]
+
+    def _query_grammar_db_batch(self, query_sentences: List[str], k: int = 1, batch_size: Optional[int] = None,
+                                query_embeddings: Optional[np.ndarray] = None) -> List[dict]:
+        """
+        Batched version of `_query_grammar_db`: one encoder pass per chunk (skipped when
+        `query_embeddings` are given) and a single `index.search` over the whole query matrix.
+        
+        In 'lexical' and 'hybrid' mode every sentence is also scored against the BM25 index;
+        hybrid mode fuses the `top_k` lexical and vector candidates by reciprocal rank, and only
+        sentences without a decisive lexical hit (when `lexical_skip` is enabled) are embedded.
         
-        # Search the FAISS index for the most similar vector
-        distances, indices = self.index.search(query_embedding, k)
+        Returns:
+            list[dict]: The top-1 rule {"content", "topic", "rule_id"} for each sentence, in input order.
+        """
+        return self._search_grammar_db(query_sentences, k, batch_size=batch_size, query_embeddings=query_embeddings)[0]
+
+    def _search_grammar_db(self, query_sentences: List[str], k: int = 1, batch_size: Optional[int] = None,
+                           query_embeddings: Optional[np.ndarray] = None) -> Tuple[List[dict], List[Optional[np.ndarray]]]:
+        """`_query_grammar_db_batch`, also returning each sentence's embedding, or None when it was not embedded."""
+        if not query_sentences:
+            return [], []
+        lexical_index = self.lexical_index if self.retrieval_mode != 'vector' else None
+        if lexical_index is None:
+            indices, query_embeddings = self._vector_search(query_sentences, k, batch_size=batch_size,
+                                                            query_embeddings=query_embeddings)
+            return [self._format_hit(row) for row in indices], list(query_embeddings)
+
+        top_k = max(k, self.retrieval_config['top_k'])
+        with self.metrics.span("lexical"):
+            lexical_hits = [lexical_index.search(sentence, top_k) for sentence in query_sentences]
+        rankings = [[[doc_id for doc_id, _ in hits]] for hits in lexical_hits]
+        embeddings: List[Optional[np.ndarray]] = [None] * len(query_sentences)
+
+        if self.retrieval_mode == 'hybrid':
+            skip = self.retrieval_config['lexical_skip']
+            needs_vector = [i for i, hits in enumerate(lexical_hits)
+                            if not (skip['enabled'] and is_decisive(hits, skip['min_score'], skip['margin']))]
+            self.metrics.increment("lexical_skips", len(query_sentences) - len(needs_vector))
+            if needs_vector:
+                given = query_embeddings[needs_vector] if query_embeddings is not None else None
+                indices, searched = self._vector_search([query_sentences[i] for i in needs_vector], top_k,
+                                                        batch_size=batch_size, query_embeddings=given)
+                for i, row, embedding in zip(needs_vector, indices, searched):
+                    rankings[i].append([int(doc_id) for doc_id in row if doc_id >= 0])
+                    embeddings[i] = embedding
+
+        rrf_k = self.retrieval_config['rrf_k']
+        return [self._format_hit(reciprocal_rank_fusion(ranking, rrf_k)[:k]) for ranking in rankings], embeddings
+
+    def _vector_search(self, query_sentences: List[str], k: int, batch_size: Optional[int] = None,
+                       query_embeddings: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Embeds the sentences (unless `query_embeddings` are given) and returns the ids of their
+        k nearest rules, with the query embeddings.
+        """
+        if query_embeddings is None:
+            query_embeddings = self._encode(query_sentences, batch_size=batch_size)
         
-        if len(indices) > 0 and len(indices[0]) > 0:
-            retrieved_doc_index = indices[0][0]
+        # Search the FAISS index for the most similar vector of every query at once
+        with self.metrics.span("search"):
+            distances, indices = self.index.search(query_embeddings, k)
+        return indices, query_embeddings
+
+    def _format_hit(self, row_indices) -> dict:
+        """
+        Turns one row of FAISS result indices into a retrieved-rule dict.
+        """
+        retrieved_doc = self.documents_by_id.get(int(row_indices[0])) if len(row_indices) > 0 else None
+        if retrieved_doc is not None:
             # Retrieve the full document, not just the content
-            retrieved_doc = self.knowledge_base[retrieved_doc_index]
             return {
                 "content": f"Retrieved Grammar Rule: {retrieved_doc['content']}",
-                "topic": retrieved_doc.get('topic', 'General')
+                "topic": retrieved_doc.get('topic', 'General'),
+                "rule_id": retrieved_doc.get('rule_id')
             }
         
-        return {"content": "Retrieved Grammar Rule: None found.", "topic": "General"}
+        return {"content": "Retrieved Grammar Rule: None found.", "topic": "General", "rule_id": None}
 
     def _query_user_profile(self, user_id: str) -> str:
         """
-        Loads the user profile database and finds the user's most common error.
+        Looks up the user's profile and finds their most common error.
         
         Args:
             user_id (str): The unique identifier for the user.
@@ -111,20 +502,27 @@ class RAGPipeline:
         Returns:
             str: A string summarizing the user's learning history or a neutral message.
         """
-        try:
-            with open(self.user_profile_db_path, 'r', encoding='utf-8') as f:
-                profiles = json.load(f)
-            
-            user_profile = profiles.get(user_id)
-            
-            if user_profile and "error_counts" in user_profile:
-                # Find the error topic with the highest count
-                most_common_error = max(user_profile["error_counts"], key=user_profile["error_counts"].get)
-                error_count = user_profile["error_counts"][most_common_error]
-                return f"Retrieved User Profile: User frequently struggles with '{most_common_error}' (logged {error_count} times). Provide extra clarity on this topic."
-                
-        except (FileNotFoundError, json.JSONDecodeError):
-            # If the file doesn't exist or is empty, return a neutral message
-            return "Retrieved User Profile: No user profile database found."
+        return self._query_user_profiles([user_id])[user_id]
+
+    def _query_user_profiles(self, user_ids: List[str]) -> Dict[str, str]:
+        """
+        Fetches each distinct user in `user_ids` from the profile store in one query and summarises it.
+        
+        Returns:
+            dict: Maps each user id to its profile summary string.
+        """
+        profiles = self.profile_store.get_many(user_ids)
+        return {user_id: self._summarize_profile(profiles.get(user_id)) for user_id in set(user_ids)}
+
+    @staticmethod
+    def _summarize_profile(user_profile: Optional[dict]) -> str:
+        """
+        Formats a single user profile into the context string injected into the prompt.
+        """
+        if user_profile and user_profile.get("error_counts"):
+            # Find the error topic with the highest count
+            most_common_error = max(user_profile["error_counts"], key=user_profile["error_counts"].get)
+            error_count = user_profile["error_counts"][most_common_error]
+            return f"Retrieved User Profile: User frequently struggles with '{most_common_error}' (logged {error_count} times). Provide extra clarity on this topic."
             
-        return "Retrieved User Profile: No specific weaknesses logged for this user."
\ No newline at end of file
+        return "Retrieved User Profile: No specific weaknesses logged for this user."
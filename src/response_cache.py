@@ -0,0 +1,153 @@
+# src/response_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def normalize_sentence(sentence: str) -> str:
+    """The text a cached response is keyed on: the sentence with runs of whitespace collapsed."""
+    return " ".join(sentence.split())
+
+
+class ResponseCache:
+    """
+    Cache of tutor responses, consulted before the LLM call.
+
+    A correction rewrites its own sentence, so a cached one is only reused for the same
+    sentence text (see `normalize_sentence`) that retrieved the same grammar rule. Embeddings
+    find the candidates: entries are grouped by rule, and one matrix-vector product selects
+    those with a cosine similarity of at least `similarity_threshold`, whose text must then
+    match. A similar sentence with another noun never gets this one's correction.
+
+    The cache holds at most `max_entries` responses (least recently used are evicted first)
+    and drops entries older than `ttl_seconds`. Users in `bypass_users` neither read from nor
+    write to the cache, e.g. learners being evaluated on fresh LLM output.
+    """
+    def __init__(self, max_entries: int = 5000, similarity_threshold: float = 0.95, ttl_seconds: Optional[float] = 86400,
+                 bypass_users: Optional[List[str]] = None):
+        """
+        Args:
+            max_entries (int): Maximum number of cached responses.
+            similarity_threshold (float): Minimum cosine similarity for a hit, in [-1, 1].
+            ttl_seconds (float, optional): Lifetime of an entry. None keeps entries until evicted.
+            bypass_users (list[str], optional): User ids that always skip the cache.
+        """
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.bypass_users = set(bypass_users or [])
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # entry id -> (rule, unit vector, normalized sentence, response, created); order is least to most recently used
+        self._entries = OrderedDict()
+        # rule -> {"ids": [...], "matrix": stacked vectors or None when stale}
+        self._by_rule: Dict[str, dict] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cache_config: dict) -> Optional['ResponseCache']:
+        """
+        Builds a cache from the `response_cache` section of config.yaml, or returns None if it is disabled.
+        """
+        if not cache_config or not cache_config.get('enabled', False):
+            return None
+        return cls(
+            max_entries=cache_config.get('max_entries', 5000),
+            similarity_threshold=cache_config.get('similarity_threshold', 0.95),
+            ttl_seconds=cache_config.get('ttl_seconds', 86400),
+            bypass_users=cache_config.get('bypass_users')
+        )
+
+    def bypasses(self, user_id: str) -> bool:
+        return user_id in self.bypass_users
+
+    def get(self, embedding: np.ndarray, rule: Optional[str], sentence: str) -> Optional[dict]:
+        """
+        Returns the cached response for `sentence` among the entries for `rule` similar
+        enough to `embedding`, otherwise None.
+        """
+        if rule is None:
+            return None
+        vector = self._unit(embedding)
+        with self._lock:
+            group = self._by_rule.get(rule)
+            if group is None:
+                self.misses += 1
+                return None
+            self._expire(group)
+            if not group["ids"]:
+                self.misses += 1
+                return None
+            if group["matrix"] is None:
+                group["matrix"] = np.vstack([self._entries[entry_id][1] for entry_id in group["ids"]])
+            similarities = group["matrix"] @ vector
+            candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+            text = normalize_sentence(sentence)
+            for position in candidates[np.argsort(-similarities[candidates], kind='stable')]:
+                entry_id = group["ids"][position]
+                if self._entries[entry_id][2] == text:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return dict(self._entries[entry_id][3])
+            self.misses += 1
+            return None
+
+    def put(self, embedding: np.ndarray, rule: Optional[str], sentence: str, response: dict):
+        """Caches `response` for `sentence`, which has this embedding and retrieved `rule`."""
+        if rule is None:
+            return
+        vector = self._unit(embedding)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (rule, vector, normalize_sentence(sentence), dict(response), time.monotonic())
+            group = self._by_rule.setdefault(rule, {"ids": [], "matrix": None})
+            group["ids"].append(entry_id)
+            group["matrix"] = None
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_rule.clear()
+
+    def _expire(self, group: dict):
+        if self.ttl_seconds is None:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        for entry_id in [entry_id for entry_id in group["ids"] if self._entries[entry_id][4] < cutoff]:
+            self._remove(entry_id)
+            self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        rule = self._entries.pop(entry_id)[0]
+        group = self._by_rule[rule]
+        group["ids"].remove(entry_id)
+        group["matrix"] = None
+        if not group["ids"]:
+            del self._by_rule[rule]
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype='float32').ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
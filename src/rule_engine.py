@@ -0,0 +1,189 @@
+# src/rule_engine.py
+import json
+import re
+import threading
+from typing import List, Optional
+
+# A following word that makes "à le", "de les", ... ambiguous: none at all, a vowel or mute 'h'
+# (elision, not contraction), another object pronoun ("à le lui donner") or an
+# infinitive-looking word, where 'le'/'les' is likely an object pronoun ("Il commence à le
+# faire") rather than an article
+_OBJECT_PRONOUN = r"(?:lui|leur|y|en)\b"
+_AMBIGUOUS_AFTER_ARTICLE = rf"(?!\s+[^\W\d_])|\s+(?:{_OBJECT_PRONOUN}|[aeiouyhâàäéèêëîïôöûùü]|\w+(?:er|ir|re|oir)\b)"
+_AMBIGUOUS_AFTER_PLURAL_ARTICLE = rf"(?!\s+[^\W\d_])|\s+(?:{_OBJECT_PRONOUN}|\w+(?:er|ir|re|oir)\b)"
+
+FEMININE_NOUNS = [
+    'pomme', 'maison', 'table', 'voiture', 'chaise', 'fleur', 'porte', 'fenêtre', 'ville', 'rue',
+    'chambre', 'cuisine', 'école', 'église', 'plage', 'montagne', 'forêt', 'lettre', 'chanson', 'semaine',
+    'soirée', 'journée', 'année', 'heure', 'minute', 'question', 'réponse', 'idée', 'histoire', 'photo',
+    'robe', 'chemise', 'jupe', 'veste', 'cravate', 'bouteille', 'tasse', 'assiette', 'fourchette', 'cuillère',
+    'banane', 'orange', 'poire', 'fraise', 'cerise', 'tomate', 'carotte', 'salade', 'soupe', 'baguette',
+    'pizza', 'tarte', 'glace', 'boisson', 'bière', 'famille', 'fille', 'femme', 'mère', 'sœur',
+    'tante', 'amie', 'voisine', 'chanteuse', 'actrice', 'classe', 'leçon', 'langue', 'phrase', 'page',
+]
+
+# Built-in mechanical rules. Each one links a pattern to a knowledge-base rule_id, whose
+# content becomes the explanation; `topic` and `explanation` are only used when the knowledge
+# base has no entry for that rule_id. A match followed by `ambiguous_after` is left to the LLM.
+DEFAULT_PATTERN_RULES = [
+    {
+        "rule_id": "contraction_a_le",
+        "pattern": r"\bà\s+le\b",
+        "replacement": "au",
+        "ambiguous_after": _AMBIGUOUS_AFTER_ARTICLE,
+        "topic": "Contractions",
+        "explanation": "The preposition 'à' contracts with the article 'le' to form 'au'.",
+    },
+    {
+        "rule_id": "contraction_a_les",
+        "pattern": r"\bà\s+les\b",
+        "replacement": "aux",
+        "ambiguous_after": _AMBIGUOUS_AFTER_PLURAL_ARTICLE,
+        "topic": "Contractions",
+        "explanation": "The preposition 'à' contracts with the article 'les' to form 'aux'.",
+    },
+    {
+        "rule_id": "contraction_de_le",
+        "pattern": r"\bde\s+le\b",
+        "replacement": "du",
+        "ambiguous_after": _AMBIGUOUS_AFTER_ARTICLE,
+        "topic": "Contractions",
+        "explanation": "The preposition 'de' contracts with the article 'le' to form 'du'.",
+    },
+    {
+        "rule_id": "contraction_de_les",
+        "pattern": r"\bde\s+les\b",
+        "replacement": "des",
+        "ambiguous_after": _AMBIGUOUS_AFTER_PLURAL_ARTICLE,
+        "topic": "Contractions",
+        "explanation": "The preposition 'de' contracts with the article 'les' to form 'des'.",
+    },
+    {
+        "rule_id": "gender_agreement_articles",
+        "pattern": rf"\bun(?=\s+(?:{'|'.join(FEMININE_NOUNS)})\b)",
+        "replacement": "une",
+        "topic": "Articles and Gender",
+        "explanation": "Feminine nouns take the indefinite article 'une', not 'un'.",
+    },
+]
+
+
+class RuleEngine:
+    """
+    Deterministic fast path for mechanical errors, consulted before retrieval and the LLM.
+
+    Every pattern rule is compiled into one alternation of named groups, so a sentence is
+    scanned once however many rules there are. A sentence is corrected here only when all its
+    matches belong to one rule and none is ambiguous; otherwise it falls through to the LLM.
+    """
+    def __init__(self, rules: List[dict], knowledge_base: Optional[List[dict]] = None):
+        """
+        Args:
+            rules (list[dict]): Pattern rules {rule_id, pattern, replacement, ambiguous_after?,
+                topic?, explanation?} (see DEFAULT_PATTERN_RULES). Patterns must not contain
+                capturing groups.
+            knowledge_base (list[dict], optional): Knowledge-base entries supplying each rule's
+                topic and explanation. Rules found in neither are skipped.
+        """
+        entries = {entry['rule_id']: entry for entry in knowledge_base or [] if 'rule_id' in entry}
+        self.rules = []
+        patterns = []
+        for rule in rules:
+            if re.compile(rule['pattern']).groups:
+                raise ValueError(f"Pattern of rule '{rule['rule_id']}' must not contain capturing groups.")
+            entry = entries.get(rule['rule_id'], {})
+            topic = entry.get('topic', rule.get('topic'))
+            explanation = entry.get('content', rule.get('explanation'))
+            if topic is None or explanation is None:
+                print(f"Warning: rule '{rule['rule_id']}' is not in the knowledge base and has no fallback; skipping it.")
+                continue
+            ambiguous_after = rule.get('ambiguous_after')
+            self.rules.append({
+                "rule_id": rule['rule_id'],
+                "replacement": rule['replacement'],
+                "ambiguous_after": re.compile(ambiguous_after, re.IGNORECASE) if ambiguous_after else None,
+                "topic": topic,
+                "explanation": explanation,
+            })
+            patterns.append(rule['pattern'])
+        # One pass over the sentence for all rules: the name of the matching group is its rule's position
+        alternation = "|".join(f"(?P<r{i}>{pattern})" for i, pattern in enumerate(patterns))
+        self._matcher = re.compile(alternation, re.IGNORECASE) if patterns else None
+
+        self.served = 0
+        self.ambiguous = 0
+        self.unmatched = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, rule_config: dict, rag_pipeline) -> Optional['RuleEngine']:
+        """
+        Builds the engine from the `rule_engine` section of config.yaml, or returns None if it is disabled.
+        `rules_path` may point to a JSON list of pattern rules replacing the built-in ones. Topics and
+        explanations are looked up in the pipeline's docstore (see `RAGPipeline.documents_for_rules`).
+        """
+        if not rule_config or not rule_config.get('enabled', False):
+            return None
+        rules = DEFAULT_PATTERN_RULES
+        if rule_config.get('rules_path'):
+            with open(rule_config['rules_path'], 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+        try:
+            knowledge_base = list(rag_pipeline.documents_for_rules([rule['rule_id'] for rule in rules]).values())
+        except FileNotFoundError:
+            print("Warning: knowledge base not found; using the rules' own explanations.")
+            knowledge_base = []
+        return cls(rules, knowledge_base)
+
+    def match(self, sentence: str) -> Optional[dict]:
+        """
+        Scans the sentence for mechanical errors.
+
+        Returns:
+            dict: None when no rule matched. Otherwise {"rule_id", "topic", "correction",
+                "explanation", "confident"}; `confident` is False when a match is ambiguous
+                or several rules matched, and the sentence should go to the LLM.
+        """
+        matches = list(self._matcher.finditer(sentence)) if self._matcher is not None else []
+        if not matches:
+            with self._lock:
+                self.unmatched += 1
+            return None
+
+        rules = [self.rules[int(match.lastgroup[1:])] for match in matches]
+        confident = len({rule['rule_id'] for rule in rules}) == 1 and not any(
+            rule['ambiguous_after'] is not None and rule['ambiguous_after'].match(sentence, match.end())
+            for rule, match in zip(rules, matches))
+
+        parts, position = [], 0
+        for rule, match in zip(rules, matches):
+            replacement = rule['replacement']
+            if match.group()[0].isupper():
+                replacement = replacement[0].upper() + replacement[1:]
+            parts += [sentence[position:match.start()], replacement]
+            position = match.end()
+        parts.append(sentence[position:])
+
+        with self._lock:
+            if confident:
+                self.served += 1
+            else:
+                self.ambiguous += 1
+        return {
+            "rule_id": rules[0]['rule_id'],
+            "topic": rules[0]['topic'],
+            "correction": "".join(parts),
+            "explanation": rules[0]['explanation'],
+            "confident": confident,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.served + self.ambiguous + self.unmatched
+            return {
+                "rules": len(self.rules),
+                "served": self.served,
+                "ambiguous": self.ambiguous,
+                "unmatched": self.unmatched,
+                "fast_path_share": self.served / total if total else 0.0,
+            }
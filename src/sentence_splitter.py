@@ -0,0 +1,97 @@
+# src/sentence_splitter.py
+"""
+Sentence splitter for French learner text, used by the tutor's paragraph mode.
+
+A sentence ends at '.', '!', '?', '...' or '…' (optionally followed by closing quotes or
+brackets, with or without the space French typography puts before '!', '?' and '»') when the
+next sentence visibly starts: with a capital letter, a digit, an opening quote or a dialogue
+dash. Learners often do not capitalise, so after '.', '!' or '?' a lowercase word starts a
+sentence too ("je suis fatigué. je vais dormir."). That keeps together:
+- titles and common abbreviations: "M. Dupont", "Mme Martin", "p. ex. le", "c.-à-d. que";
+- abbreviations that may also end a sentence ("5 min.", "etc."), unless a capital follows;
+- initials: "J. K. Rowling";
+- quoted questions continuing the sentence: "« Tu viens ? » demanda-t-il.";
+- hesitations: "Il est… enfin, fatigué.";
+- decimals and times, since they have no space after the point: "3.5", "10.30".
+Blank lines always end a sentence.
+"""
+import re
+from typing import List, Tuple
+
+# Abbreviations (lowercase, without the final point) that never end a sentence
+ABBREVIATIONS = frozenset({
+    "m", "mm", "mme", "mmes", "mlle", "mlles", "dr", "drs", "pr", "me", "mgr", "st", "ste",
+    "av", "apr", "bd", "cf", "chap", "env", "ex", "fig", "hab", "no", "nº",
+    "p", "pp", "réf", "sq", "tél", "vol", "vs", "éd", "ibid", "op", "cit", "c.-à-d", "c-à-d",
+})
+# Abbreviations that often end a sentence too: they do when a capital follows
+FINAL_ABBREVIATIONS = frozenset({"etc", "min", "max", "sec", "km", "kg", "cm"})
+
+_BLOCKS = re.compile(r'\S(?:.*?\S)?(?=\s*\n\s*\n|\s*$)', re.S)
+_TERMINATOR = re.compile(r'(\.\.\.|…|[.!?]+)(?:\s*[»"”’)\]])*(?=\s|$)')
+_PRECEDING_WORD = re.compile(r'[«"“(\[]*([^\s«"“(\[]+)$')
+
+
+def _starts_sentence(text: str) -> bool:
+    first = text[:1]
+    return first.isupper() or first.isdigit() or first in '«"“—–-('
+
+
+def _preceding_word(block: str, match: re.Match) -> str:
+    word = _PRECEDING_WORD.search(block, 0, match.start())
+    return word.group(1) if word else ''
+
+
+def _ends_sentence(block: str, match: re.Match) -> bool:
+    rest = block[match.end():].lstrip()
+    if not rest:
+        return True
+    terminator = match.group(1)
+    if rest[:1].islower():
+        # Uncapitalised learner text, except after a hesitation or a closing quote
+        # ("« Tu viens ? » demanda-t-il") and, for a point, after an abbreviation
+        if terminator in ('...', '…') or match.group() != terminator:
+            return False
+        word = _preceding_word(block, match).lower()
+        return terminator != '.' or word not in ABBREVIATIONS | FINAL_ABBREVIATIONS
+    if not _starts_sentence(rest):
+        return False
+    if terminator != '.':
+        return True
+    word = _preceding_word(block, match)
+    if word.lower() in ABBREVIATIONS:
+        return False
+    # An initial ("J. K. Rowling")
+    if len(word) == 1 and word.isalpha() and word.isupper():
+        return False
+    return True
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """
+    Returns the (start, end) character offsets of each sentence in `text`, without the
+    surrounding whitespace.
+    """
+    spans = []
+    for block in _BLOCKS.finditer(text):
+        start = block.start()
+        body = block.group()
+        for match in _TERMINATOR.finditer(body):
+            if _ends_sentence(body, match):
+                end = block.start() + match.end()
+                spans.append((start, end))
+                start = end
+                # Skip the whitespace before the next sentence
+                while start < block.end() and text[start].isspace():
+                    start += 1
+        if start < block.end():
+            spans.append((start, block.end()))
+    return spans
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits French text into sentences; whitespace inside a sentence (line breaks from pasted
+    text included) is collapsed to single spaces.
+    """
+    return [' '.join(text[start:end].split()) for start, end in sentence_spans(text)]
@@ -0,0 +1,441 @@
+# src/sequence_packing.py
+"""
+Offline tokenization and sequence packing for LoRA fine-tuning.
+
+The instruction dataset is tokenized once, with the ChatML template used for training, and
+the short correction examples are packed into sequences of up to `max_seq_length` tokens.
+Each packed sequence keeps its examples apart: position ids restart at every example (what
+padding-free attention kernels such as flash_attention_2 use to find boundaries), and
+`block_diagonal_attention_mask` turns them into the 4D mask `collate_packed` sends to eager
+and SDPA attention. Prompt tokens are excluded from the loss.
+
+The packed sequences are written as memory-mapped .npy shards under
+`<cache_dir>/<key>/`, where the key hashes the tokenizer, the template, the dataset file and
+`max_seq_length`. A later run with the same inputs finds the shards and skips tokenization;
+the per-batch padding statistics are recomputed when the training batch size changed.
+
+Build the cache ahead of training with:
+    python -m src.sequence_packing --dataset data/final_dataset.jsonl --tokenizer Qwen/Qwen3-8B-Instruct
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import shutil
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+PROMPT_TEMPLATE = "<|im_start|>system\n{instruction}<|im_end|>\n<|im_start|>user\n{input}<|im_end|>\n<|im_start|>assistant\n"
+COMPLETION_TEMPLATE = "{output}<|im_end|>"
+IGNORE_INDEX = -100
+MANIFEST_FILE = 'manifest.json'
+# Bump when the shard layout changes, so old caches are not reused
+FORMAT_VERSION = 2
+EXAMPLE_LENGTHS_FILE = 'example_lengths.npy'
+
+
+def format_example(example: dict) -> Tuple[str, str]:
+    """
+    Renders one instruction record with the ChatML template.
+
+    Returns:
+        tuple: (prompt, completion). Only the completion is trained on.
+    """
+    output = example['output']
+    if not isinstance(output, str):
+        output = json.dumps(output, ensure_ascii=False)
+    return PROMPT_TEMPLATE.format(instruction=example['instruction'], input=example['input']), \
+        COMPLETION_TEMPLATE.format(output=output)
+
+
+def iter_examples(dataset_path: str) -> Iterator[dict]:
+    """Yields the records of a JSONL file line by line, or of a JSON array file."""
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        if dataset_path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """
+    A hash identifying the tokenizer's behaviour: its full serialized state for fast Hugging Face
+    tokenizers, otherwise its vocabulary, plus its class, name and special tokens.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{type(tokenizer).__name__}\0{getattr(tokenizer, 'name_or_path', '')}\0"
+                  f"{getattr(tokenizer, 'eos_token_id', None)}\0{getattr(tokenizer, 'pad_token_id', None)}".encode('utf-8'))
+    backend = getattr(tokenizer, 'backend_tokenizer', None)
+    if backend is not None:
+        digest.update(backend.to_str().encode('utf-8'))
+    elif hasattr(tokenizer, 'get_vocab'):
+        digest.update(json.dumps(sorted(tokenizer.get_vocab().items()), ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(tokenizer, dataset_path: str, max_seq_length: int) -> str:
+    """Key of the packed cache for this tokenizer, template, dataset and sequence length."""
+    parts = [str(FORMAT_VERSION), tokenizer_fingerprint(tokenizer), PROMPT_TEMPLATE, COMPLETION_TEMPLATE,
+             file_hash(dataset_path), str(max_seq_length)]
+    return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def pack_lengths(lengths: List[int], max_seq_length: int) -> List[List[int]]:
+    """
+    Best-fit-decreasing bin packing: examples are taken longest first and each goes into the
+    open sequence with the least room that still fits it.
+
+    Args:
+        lengths (list[int]): Token count of every example (each at most `max_seq_length`).
+        max_seq_length (int): Capacity of a packed sequence.
+
+    Returns:
+        list[list[int]]: Example indices of every packed sequence.
+    """
+    bins: List[List[int]] = []
+    # Sorted (remaining capacity, bin index) pairs of sequences that still have room
+    open_bins: List[Tuple[int, int]] = []
+    for index in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+        length = lengths[index]
+        position = bisect.bisect_left(open_bins, (length, -1))
+        if position < len(open_bins):
+            remaining, bin_index = open_bins.pop(position)
+        else:
+            remaining, bin_index = max_seq_length, len(bins)
+            bins.append([])
+        bins[bin_index].append(index)
+        if remaining - length > 0:
+            bisect.insort(open_bins, (remaining - length, bin_index))
+    return bins
+
+
+def padding_ratio(lengths: np.ndarray, widths: np.ndarray) -> float:
+    """Share of padding tokens when sequences of `lengths` are padded to `widths`."""
+    total = float(np.sum(widths))
+    return 1.0 - float(np.sum(lengths)) / total if total else 0.0
+
+
+def _batch_widths(lengths: np.ndarray, batch_size: int) -> np.ndarray:
+    """Per-sequence width when consecutive batches are padded to their longest sequence."""
+    widths = np.empty_like(lengths)
+    for start in range(0, len(lengths), batch_size):
+        widths[start:start + batch_size] = lengths[start:start + batch_size].max()
+    return widths
+
+
+def _per_batch_padding(example_lengths: np.ndarray, packed_lengths: np.ndarray, batch_size: int) -> dict:
+    """The padding statistics that depend on the training batch size."""
+    example_lengths, packed_lengths = np.asarray(example_lengths, dtype=np.int64), np.asarray(packed_lengths, dtype=np.int64)
+    return {
+        "batch_size": batch_size,
+        "padding_ratio_unpacked_per_batch": padding_ratio(example_lengths, _batch_widths(example_lengths, batch_size)) if len(example_lengths) else 0.0,
+        "padding_ratio_packed_per_batch": padding_ratio(packed_lengths, _batch_widths(packed_lengths, batch_size)) if len(packed_lengths) else 0.0,
+    }
+
+
+def build_packed_dataset(dataset_path: str, tokenizer, cache_dir: str, max_seq_length: int = 1024,
+                         shard_size: int = 8192, batch_size: int = 4, tokenize_batch_size: int = 1024) -> dict:
+    """
+    Tokenizes and packs the dataset into memory-mapped shards, unless a cache for the same
+    tokenizer, template, dataset and length already exists.
+
+    Args:
+        dataset_path (str): Instruction dataset (.json array or .jsonl) from scripts/01_prepare_dataset.py.
+        tokenizer: Hugging Face-style tokenizer: `tokenizer(list_of_str, add_special_tokens=False)["input_ids"]`.
+        cache_dir (str): Root directory of the packed caches.
+        max_seq_length (int): Length of a packed sequence. Longer examples are truncated.
+        shard_size (int): Packed sequences per shard file.
+        batch_size (int): Training batch size, used to report per-batch padding.
+        tokenize_batch_size (int): Examples tokenized per tokenizer call.
+
+    Returns:
+        dict: The cache manifest, including `path` and the padding statistics in `stats`.
+    """
+    key = cache_key(tokenizer, dataset_path, max_seq_length)
+    output_dir = os.path.join(cache_dir, key)
+    existing = load_manifest(output_dir)
+    if existing is not None:
+        print(f"Using packed dataset cache '{output_dir}'.")
+        if existing["stats"].get("batch_size") != batch_size:
+            # The shards do not depend on the batch size; only the per-batch padding figures do
+            existing["stats"].update(_per_batch_padding(np.load(os.path.join(output_dir, EXAMPLE_LENGTHS_FILE)),
+                                                        PackedDataset(output_dir).lengths, batch_size))
+        return existing
+
+    tmp_dir = f"{output_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+    # 1. Tokenize once, in batches, appending every example's tokens to one flat scratch file
+    tokens_path = os.path.join(tmp_dir, 'tokens.bin')
+    prompt_lengths, lengths = [], []
+    truncated = 0
+
+    def tokenize(batch: List[dict], out):
+        nonlocal truncated
+        pairs = [format_example(example) for example in batch]
+        prompt_ids = tokenizer([prompt for prompt, _ in pairs], add_special_tokens=False)["input_ids"]
+        completion_ids = tokenizer([completion for _, completion in pairs], add_special_tokens=False)["input_ids"]
+        for prompt, completion in zip(prompt_ids, completion_ids):
+            ids = (list(prompt) + list(completion))[:max_seq_length]
+            truncated += len(prompt) + len(completion) > max_seq_length
+            out.write(np.asarray(ids, dtype=np.int32).tobytes())
+            prompt_lengths.append(min(len(prompt), max_seq_length))
+            lengths.append(len(ids))
+
+    with open(tokens_path, 'wb') as out:
+        batch = []
+        for example in iter_examples(dataset_path):
+            batch.append(example)
+            if len(batch) == tokenize_batch_size:
+                tokenize(batch, out)
+                batch = []
+        if batch:
+            tokenize(batch, out)
+
+    lengths_array = np.asarray(lengths, dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths_array)])
+    tokens = np.memmap(tokens_path, dtype=np.int32, mode='r') if offsets[-1] else np.zeros(0, dtype=np.int32)
+
+    # 2. Pack, then order sequences by length so consecutive batches have similar widths
+    bins = pack_lengths(lengths, max_seq_length)
+    bin_lengths = np.asarray([sum(lengths[i] for i in b) for b in bins], dtype=np.int64)
+    order = np.argsort(-bin_lengths, kind='stable')
+
+    # 3. Write the shards
+    shards = []
+    for shard_index, start in enumerate(range(0, len(order), shard_size)):
+        shard_bins = [bins[i] for i in order[start:start + shard_size]]
+        shape = (len(shard_bins), max_seq_length)
+        files = {name: f"{name}_{shard_index:05d}.npy" for name in ('input_ids', 'labels', 'position_ids', 'lengths')}
+        input_ids = np.lib.format.open_memmap(os.path.join(tmp_dir, files['input_ids']), mode='w+', dtype=np.int32, shape=shape)
+        labels = np.lib.format.open_memmap(os.path.join(tmp_dir, files['labels']), mode='w+', dtype=np.int32, shape=shape)
+        position_ids = np.lib.format.open_memmap(os.path.join(tmp_dir, files['position_ids']), mode='w+', dtype=np.int32, shape=shape)
+        input_ids[:] = pad_token_id
+        labels[:] = IGNORE_INDEX
+        position_ids[:] = 0
+        shard_lengths = np.zeros(len(shard_bins), dtype=np.int32)
+        for row, example_indices in enumerate(shard_bins):
+            cursor = 0
+            for i in example_indices:
+                length, prompt_length = lengths[i], prompt_lengths[i]
+                ids = tokens[offsets[i]:offsets[i + 1]]
+                input_ids[row, cursor:cursor + length] = ids
+                labels[row, cursor + prompt_length:cursor + length] = ids[prompt_length:]
+                position_ids[row, cursor:cursor + length] = np.arange(length)
+                cursor += length
+            shard_lengths[row] = cursor
+        np.save(os.path.join(tmp_dir, files['lengths']), shard_lengths)
+        for array in (input_ids, labels, position_ids):
+            array.flush()
+        del input_ids, labels, position_ids
+        shards.append({"num_sequences": len(shard_bins), "files": files})
+
+    del tokens
+    os.remove(tokens_path)
+
+    np.save(os.path.join(tmp_dir, EXAMPLE_LENGTHS_FILE), lengths_array.astype(np.int32))
+    packed_lengths = bin_lengths[order]
+    stats = {
+        "num_examples": len(lengths),
+        "num_sequences": len(bins),
+        "num_tokens": int(lengths_array.sum()),
+        "truncated_examples": truncated,
+        # Before: every example in its own row, padded to max_seq_length or to its batch's longest
+        "padding_ratio_unpacked_max_length": padding_ratio(lengths_array, np.full_like(lengths_array, max_seq_length)),
+        # After: packed sequences, padded to max_seq_length or to their batch's longest
+        "padding_ratio_packed_max_length": padding_ratio(packed_lengths, np.full_like(packed_lengths, max_seq_length)),
+        **_per_batch_padding(lengths_array, packed_lengths, batch_size),
+    }
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "key": key,
+        "dataset_path": dataset_path,
+        "tokenizer": getattr(tokenizer, 'name_or_path', type(tokenizer).__name__),
+        "max_seq_length": max_seq_length,
+        "pad_token_id": pad_token_id,
+        "shards": shards,
+        "stats": stats,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    # The directory only appears under its key once it is complete
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    manifest["path"] = output_dir
+    print(f"Packed {stats['num_examples']} examples into {stats['num_sequences']} sequences at '{output_dir}'.")
+    return manifest
+
+
+def load_manifest(output_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    manifest["path"] = output_dir
+    return manifest
+
+
+def format_padding_report(stats: dict) -> str:
+    return (f"{stats['num_examples']} examples -> {stats['num_sequences']} packed sequences "
+            f"({stats['truncated_examples']} truncated). Padding before packing: "
+            f"{stats['padding_ratio_unpacked_max_length']:.1%} at max length, "
+            f"{stats['padding_ratio_unpacked_per_batch']:.1%} per batch; after packing: "
+            f"{stats['padding_ratio_packed_max_length']:.1%} at max length, "
+            f"{stats['padding_ratio_packed_per_batch']:.1%} per batch.")
+
+
+class PackedDataset:
+    """
+    Read-only view of a packed cache. Shards are memory-mapped, so opening it costs no
+    tokenization and little memory. Items are trimmed to their used length:
+    {"input_ids", "labels", "position_ids"} as int32 arrays.
+    """
+    def __init__(self, path: str):
+        manifest = load_manifest(path)
+        if manifest is None:
+            raise FileNotFoundError(f"No packed dataset at '{path}'. Build it with build_packed_dataset first.")
+        self.manifest = manifest
+        self.pad_token_id = manifest["pad_token_id"]
+        self.max_seq_length = manifest["max_seq_length"]
+        self._shards = []
+        for shard in manifest["shards"]:
+            self._shards.append({name: np.load(os.path.join(path, file_name), mmap_mode='r')
+                                 for name, file_name in shard["files"].items()})
+        self._starts = np.cumsum([0] + [shard["num_sequences"] for shard in manifest["shards"]])
+
+    def __len__(self) -> int:
+        return int(self._starts[-1])
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.concatenate([shard["lengths"] for shard in self._shards]) if self._shards else np.zeros(0, dtype=np.int32)
+
+    def __getitem__(self, index: int) -> Dict[str, np.ndarray]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        shard_index = int(np.searchsorted(self._starts, index, side='right')) - 1
+        shard, row = self._shards[shard_index], index - int(self._starts[shard_index])
+        length = int(shard["lengths"][row])
+        return {name: np.asarray(shard[name][row, :length]) for name in ('input_ids', 'labels', 'position_ids')}
+
+
+def collate_packed(features: List[Dict[str, np.ndarray]], pad_token_id: int, block_diagonal: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Pads a batch of packed sequences to its longest one.
+
+    Args:
+        features (list[dict]): Items of a PackedDataset.
+        pad_token_id (int): Id written into the padding.
+        block_diagonal (bool): Add the (batch, 1, width, width) boolean attention_mask of
+            `block_diagonal_attention_mask`, for eager and SDPA attention. Without it the batch
+            has no attention_mask, as padding-free kernels (flash_attention_2) expect: they find
+            example boundaries in position_ids, and a 2D padding mask would turn that off.
+
+    Returns:
+        dict: int64 input_ids, labels and position_ids, plus attention_mask if `block_diagonal`.
+    """
+    width = max(len(feature["input_ids"]) for feature in features)
+    batch = {
+        "input_ids": np.full((len(features), width), pad_token_id, dtype=np.int64),
+        "labels": np.full((len(features), width), IGNORE_INDEX, dtype=np.int64),
+        "position_ids": np.zeros((len(features), width), dtype=np.int64),
+    }
+    real_tokens = np.zeros((len(features), width), dtype=np.int64)
+    for row, feature in enumerate(features):
+        length = len(feature["input_ids"])
+        for name in ("input_ids", "labels", "position_ids"):
+            batch[name][row, :length] = feature[name]
+        real_tokens[row, :length] = 1
+    if block_diagonal:
+        mask = block_diagonal_attention_mask(batch["position_ids"], real_tokens)
+        # Padding attends to itself only, so no row of the mask is empty
+        mask[:, 0] |= np.eye(width, dtype=bool) & (real_tokens == 0)[:, :, None]
+        batch["attention_mask"] = mask
+    return batch
+
+
+def torch_collator(pad_token_id: int, block_diagonal: bool = True, dtype=None) -> Callable:
+    """
+    `collate_packed` for a PyTorch Trainer: returns tensors, with the boolean block-diagonal
+    mask turned into the additive float mask (0 or the dtype's minimum) that transformers
+    passes unchanged to eager and SDPA attention when given a 4D attention_mask.
+
+    Args:
+        pad_token_id (int): Id written into the padding.
+        block_diagonal (bool): See `collate_packed`; False for flash_attention_2.
+        dtype (torch.dtype, optional): Dtype of the mask, the model's compute dtype (float32 by default).
+    """
+    import torch
+
+    dtype = dtype or torch.float32
+
+    def collate(features):
+        batch = {name: torch.from_numpy(array) for name, array in collate_packed(features, pad_token_id, block_diagonal).items()}
+        if "attention_mask" in batch:
+            allowed = batch["attention_mask"]
+            batch["attention_mask"] = torch.zeros(allowed.shape, dtype=dtype).masked_fill(~allowed, torch.finfo(dtype).min)
+        return batch
+    return collate
+
+
+def block_diagonal_attention_mask(position_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """
+    Causal attention mask that keeps packed examples apart, for attention implementations
+    that do not read example boundaries from `position_ids`.
+
+    Returns:
+        np.ndarray: Boolean (batch, 1, length, length) mask; True where a query may attend a key.
+    """
+    # Each example starts where its position id restarts at 0
+    segment_ids = np.cumsum(position_ids == 0, axis=1) * attention_mask
+    same_segment = segment_ids[:, :, None] == segment_ids[:, None, :]
+    causal = np.tril(np.ones((position_ids.shape[1], position_ids.shape[1]), dtype=bool))
+    return (same_segment & causal & (segment_ids[:, :, None] > 0))[:, None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenize and pack the fine-tuning dataset into memory-mapped shards.")
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--dataset', help="Instruction dataset (defaults to finetune.dataset_path).")
+    parser.add_argument('--tokenizer', help="Tokenizer name or path (defaults to model.base_model_name).")
+    args = parser.parse_args()
+
+    import yaml
+    from transformers import AutoTokenizer
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    finetune_config = config.get('finetune', {})
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer or config['model']['base_model_name'], trust_remote_code=True)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    manifest = build_packed_dataset(
+        args.dataset or finetune_config['dataset_path'],
+        tokenizer,
+        finetune_config.get('packed_cache_dir', 'data/packed'),
+        max_seq_length=finetune_config.get('max_seq_length', 1024),
+        shard_size=finetune_config.get('shard_size', 8192),
+        batch_size=finetune_config.get('per_device_train_batch_size', 4)
+    )
+    print(format_padding_report(manifest["stats"]))
+
+
+if __name__ == "__main__":
+    main()
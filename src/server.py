@@ -0,0 +1,480 @@
+# src/server.py
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+import yaml
+
+from .llm_backends import parse_response
+from .metrics import process_memory
+
+
+class ServerBusyError(RuntimeError):
+    """Raised when a request arrives while the queue is full (backpressure)."""
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching scheduler.
+
+    Requests submitted from many coroutines are queued; a batch runner takes the oldest request,
+    then keeps collecting until either `max_batch_size` requests are gathered or `max_wait_ms`
+    has passed since it started waiting. The batch is processed in a worker thread (so the event
+    loop keeps accepting requests) and each result is delivered to its caller's future. While
+    a batch runs, new requests pile up, so batches grow with load and shrink to one when idle.
+    When `max_queue_size` requests are already waiting, `submit` fails fast with ServerBusyError.
+    """
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, max_queue_size: int = 1024):
+        """
+        Args:
+            process_batch: Synchronous function turning a list of items into a list of results, in order.
+            max_batch_size (int): Largest batch handed to `process_batch`.
+            max_wait_ms (float): Longest time the first request of a batch waits for company.
+            max_queue_size (int): Number of queued requests beyond which new ones are rejected.
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.batch_size_counts = {}
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batch")
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Processes everything already queued, then stops the batch runner."""
+        if self._runner is None:
+            return
+        await self._queue.join()
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, item: Any) -> Any:
+        """Queues one item and waits for its result."""
+        if self._queue is None:
+            raise RuntimeError("MicroBatcher.start() must be awaited before submitting requests.")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ServerBusyError(f"Request queue is full ({self.max_queue_size} waiting); retry later.")
+        return await future
+
+    async def run(self, function: Callable, *args) -> Any:
+        """Runs `function(*args)` on the batch thread, between two batches."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "rejected": self.rejected,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+        }
+
+    async def _collect_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already waiting without yielding
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.process_batch, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self.batches += 1
+                self.items += len(batch)
+                self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+                for _ in batch:
+                    self._queue.task_done()
+
+
+class TutorService:
+    """
+    Asyncio front-end around a Tutor: concurrent correction requests are micro-batched so that
+    each batch goes through encoding, FAISS search and the LLM stage together
+    (see `Tutor.correct_batch`).
+
+    `serve` exposes it over TCP with a newline-delimited JSON protocol. Each request line is
+    {"sentence": ..., "user_id": ..., "id": optional} and each reply line echoes "id" with
+    either the tutor's response fields or {"error": ...}. An error of "busy" means the queue was full.
+    A {"metrics": "json"} or {"metrics": "prometheus"} line is answered with {"metrics": ...}
+    holding the tutor's metrics (see `src/metrics.py`) plus the batcher's queue statistics.
+    A {"paragraph": ..., "user_id": ..., "id": optional} line is split into sentences and
+    answered with one line per sentence as soon as it is corrected, holding "index" (its position
+    in the paragraph) and "sentence" besides the response fields, then a last line with
+    "done": true, "corrected_text" and "rules" (see `Tutor.correct_paragraph`). A sentence
+    request with "stream": true is answered with {"delta": ...} lines carrying the response text
+    as the LLM generates it, then the response fields with "done": true.
+    With profile analytics attached, a {"analytics": "top_topics", "params": {...}} line is
+    answered with {"analytics": result} (see `src/profile_analytics.py` for the queries).
+    """
+    def __init__(self, tutor, max_batch_size: int = 32, max_wait_ms: float = 5.0, max_queue_size: int = 1024,
+                 analytics=None, worker_id: Optional[int] = None):
+        """
+        Args:
+            tutor (Tutor): The tutor answering the requests.
+            max_batch_size, max_wait_ms, max_queue_size: Micro-batching settings (see MicroBatcher).
+            analytics (ProfileAnalytics, optional): Answers analytics request lines.
+            worker_id (int, optional): Set in pre-forked workers (see `src/prefork.py`); the metrics
+                report then includes the worker's id, pid, request count and memory.
+        """
+        self.tutor = tutor
+        self.analytics = analytics
+        self.worker_id = worker_id
+        self.batcher = MicroBatcher(self._process_batch, max_batch_size=max_batch_size,
+                                    max_wait_ms=max_wait_ms, max_queue_size=max_queue_size)
+        # Analytics queries take up to hundreds of ms on large cohorts: off the event loop,
+        # and off the batch thread so they do not delay corrections either
+        self._analytics_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics")
+        self.requests = 0
+        self.max_requests = 0
+        self._shutdown: Optional[asyncio.Event] = None
+        self._replies = set()
+        self._writers = set()
+
+    def _process_batch(self, items: List[tuple]) -> List[dict]:
+        return self.tutor.correct_batch([sentence for sentence, _ in items], [user_id for _, user_id in items])
+
+    async def start(self):
+        await self.batcher.start()
+
+    async def stop(self):
+        await self.batcher.stop()
+        self._analytics_executor.shutdown(wait=True)
+
+    def metrics_report(self, export_format: str = 'json'):
+        """The tutor's metrics and the batcher's statistics, as a dict ('json') or Prometheus text."""
+        metrics = self.tutor.metrics
+        batcher_stats = self.batcher.stats()
+        if export_format == 'prometheus':
+            prefix = f"{metrics.namespace}_server"
+            return metrics.to_prometheus() + "".join(
+                f"# TYPE {prefix}_{key} gauge\n{prefix}_{key} {batcher_stats[key]:g}\n"
+                for key in ('queue_depth', 'rejected', 'mean_batch_size'))
+        report = metrics.to_dict()
+        report["server"] = batcher_stats
+        if self.tutor.response_cache is not None:
+            report["response_cache"] = self.tutor.response_cache.stats()
+        if self.tutor.rule_engine is not None:
+            report["rule_engine"] = self.tutor.rule_engine.stats()
+        if getattr(self.tutor, 'llm', None) is not None:
+            report["llm"] = self.tutor.llm.stats()
+        if self.analytics is not None:
+            report["profile_analytics"] = self.analytics.stats()
+        if self.worker_id is not None:
+            report["worker"] = {"id": self.worker_id, "pid": os.getpid(), "requests": self.requests, **process_memory()}
+        return report
+
+    def analytics_report(self, request: dict) -> dict:
+        """Answers an analytics request line with the query result or an error."""
+        if self.analytics is None:
+            return {"error": "profile analytics are disabled"}
+        try:
+            return {"analytics": self.analytics.query(request['analytics'], request.get('params'))}
+        except (ValueError, TypeError) as e:
+            return {"error": str(e)}
+
+    async def query_analytics(self, request: dict) -> dict:
+        """`analytics_report` on the analytics thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._analytics_executor, self.analytics_report, request)
+
+    async def correct(self, sentence: str, user_id: str) -> dict:
+        """Corrects one sentence; raises ServerBusyError when the service is saturated."""
+        return await self.batcher.submit((sentence, user_id))
+
+    def correct_paragraph(self, text: str, user_id: str) -> AsyncIterator[dict]:
+        """Async iterator over `Tutor.correct_paragraph_stream` (see `_iterate`)."""
+        return self._iterate(self.tutor.correct_paragraph_stream(text, user_id))
+
+    def correct_stream(self, sentence: str, user_id: str) -> AsyncIterator[str]:
+        """Async iterator over the response chunks of `Tutor.correct_stream` (see `_iterate`)."""
+        return self._iterate(self.tutor.correct_stream(sentence, user_id))
+
+    async def _iterate(self, stream: Iterator) -> AsyncIterator:
+        """
+        Steps one of the tutor's generators on the batch thread, so its LLM calls interleave
+        with the micro-batches instead of competing with them.
+        """
+        done = object()
+        try:
+            while True:
+                result = await self.batcher.run(next, stream, done)
+                if result is done:
+                    break
+                yield result
+        finally:
+            # Lets the generator write its profile updates, also when the client went away early
+            await self.batcher.run(stream.close)
+
+    def shutdown(self):
+        """Makes `serve` stop accepting connections, finish the requests in flight and return."""
+        if self._shutdown is not None:
+            self._shutdown.set()
+
+    @property
+    def shutting_down(self) -> bool:
+        return self._shutdown is not None and self._shutdown.is_set()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        pending = set()
+        write_lock = asyncio.Lock()
+        self._writers.add(writer)
+
+        async def send(payload: dict, request: dict):
+            if 'id' in request:
+                payload['id'] = request['id']
+            async with write_lock:
+                writer.write((json.dumps(payload, ensure_ascii=False) + "\n").encode('utf-8'))
+                await writer.drain()
+
+        async def reply_paragraph(request: dict):
+            results = []
+            paragraph = self.correct_paragraph(request['paragraph'], request['user_id'])
+            try:
+                try:
+                    async for result in paragraph:
+                        results.append(result)
+                        await send(dict(result), request)
+                finally:
+                    await paragraph.aclose()
+                summary = self.tutor.paragraph_summary(results)
+                payload = {"done": True, "corrected_text": summary["corrected_text"], "rules": summary["rules"]}
+            except ConnectionError:
+                return
+            except Exception as e:
+                payload = {"done": True, "error": f"{type(e).__name__}: {e}"}
+            self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self.shutdown()
+            await send(payload, request)
+
+        async def reply_stream(request: dict):
+            chunks = []
+            stream = self.correct_stream(request['sentence'], request['user_id'])
+            try:
+                try:
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        await send({"delta": chunk}, request)
+                finally:
+                    await stream.aclose()
+                payload = {"done": True, **parse_response("".join(chunks))}
+            except ConnectionError:
+                return
+            except Exception as e:
+                payload = {"done": True, "error": f"{type(e).__name__}: {e}"}
+            self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self.shutdown()
+            await send(payload, request)
+
+        async def reply_analytics(request: dict):
+            await send(await self.query_analytics(request), request)
+
+        async def reply(request: dict):
+            try:
+                payload = dict(await self.correct(request['sentence'], request['user_id']))
+            except ServerBusyError:
+                payload = {"error": "busy"}
+            except Exception as e:
+                payload = {"error": f"{type(e).__name__}: {e}"}
+            self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self.shutdown()
+            await send(payload, request)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    request = None
+                if isinstance(request, dict) and 'metrics' in request:
+                    payload = {"metrics": self.metrics_report(request['metrics'])}
+                    async with write_lock:
+                        writer.write((json.dumps(payload) + "\n").encode('utf-8'))
+                        await writer.drain()
+                    continue
+                if isinstance(request, dict) and 'analytics' in request:
+                    task = asyncio.ensure_future(reply_analytics(request))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    continue
+                if not isinstance(request, dict) or 'user_id' not in request or \
+                        not ('sentence' in request or 'paragraph' in request):
+                    async with write_lock:
+                        writer.write(b'{"error": "expected a JSON object with sentence or paragraph, and user_id"}\n')
+                        await writer.drain()
+                    continue
+                if self.shutting_down:
+                    # Draining: the client should reconnect, which reaches another worker
+                    async with write_lock:
+                        writer.write(b'{"error": "shutting down"}\n')
+                        await writer.drain()
+                    break
+                # Requests on one connection are answered as they complete, not in order
+                if 'paragraph' in request:
+                    task = asyncio.ensure_future(reply_paragraph(request))
+                elif request.get('stream'):
+                    task = asyncio.ensure_future(reply_stream(request))
+                else:
+                    task = asyncio.ensure_future(reply(request))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                self._replies.add(task)
+                task.add_done_callback(self._replies.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, sock=None, max_requests: int = 0):
+        """
+        Serves until `shutdown` is called. Shutting down stops accepting connections, answers the
+        requests already received, then closes the open connections.
+
+        Args:
+            host, port: Address to listen on, unless `sock` is given.
+            sock (socket.socket, optional): An already-listening socket, e.g. one shared by
+                pre-forked workers that the kernel hands connections to in turn.
+            max_requests (int): Shut down after this many corrections (0: no limit), so that a
+                supervisor can replace the process.
+        """
+        self.max_requests = max_requests
+        self._shutdown = asyncio.Event()
+        await self.start()
+        if sock is not None:
+            server = await asyncio.start_server(self._handle_connection, sock=sock)
+            host, port = sock.getsockname()[:2]
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+        worker = f"Worker {self.worker_id} (pid {os.getpid()}) listening" if self.worker_id is not None else \
+            "Tutor service listening"
+        print(f"{worker} on {host}:{port} "
+              f"(max batch {self.batcher.max_batch_size}, max wait {self.batcher.max_wait * 1000:g} ms).", flush=True)
+        try:
+            await self._shutdown.wait()
+        finally:
+            server.close()
+            if self._replies:
+                await asyncio.gather(*self._replies, return_exceptions=True)
+            await self.stop()
+            for writer in list(self._writers):
+                writer.close()
+
+
+def main():
+    """
+    Service entry point: python -m src.server [--config config.yaml] [--stub-llm-ms 50] [--workers 4]
+    """
+    from src.main import build_tutor
+    from src.prefork import PreforkServer
+    from src.profile_analytics import ProfileAnalytics
+    from src.llm_backends import FakeLLM
+
+    parser = argparse.ArgumentParser(description="Serve the French tutor over TCP (newline-delimited JSON).")
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--stub-llm-ms', type=float,
+                        help="Use the fake LLM backend with this per-batch latency instead of the configured one.")
+    parser.add_argument('--workers', type=int, help="Worker processes, overriding server.workers (see src/prefork.py).")
+    parser.add_argument('--no-preload', action='store_true', help="Make every worker load its own copy of the tutor.")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    server_config = config.get('server', {})
+    host = args.host or server_config.get('host', '127.0.0.1')
+    port = args.port or server_config.get('port', 8765)
+
+    def make_tutor():
+        tutor = build_tutor(config)
+        if args.stub_llm_ms is not None:
+            tutor.llm = FakeLLM(batch_latency_ms=args.stub_llm_ms)
+        return tutor
+
+    workers = args.workers or server_config.get('workers', 1)
+    if workers > 1:
+        PreforkServer.from_config(config, make_tutor, workers=workers, preload=False if args.no_preload else None).serve(host, port)
+        return
+
+    tutor = make_tutor()
+    service = TutorService(
+        tutor,
+        max_batch_size=server_config.get('max_batch_size', 32),
+        max_wait_ms=server_config.get('max_wait_ms', 5.0),
+        max_queue_size=server_config.get('max_queue_size', 1024),
+        analytics=ProfileAnalytics.from_config(config.get('profile_analytics', {}), tutor.profile_store)
+    )
+    start = time.perf_counter()
+    tutor.rag_pipeline.wait_until_ready()
+    print(f"Tutor ready in {time.perf_counter() - start:.2f}s.")
+    async def run():
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, service.shutdown)
+        await service.serve(host, port)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tutor.profile_store.close()
+
+
+if __name__ == "__main__":
+    main()
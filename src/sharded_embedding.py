@@ -0,0 +1,117 @@
+# src/sharded_embedding.py
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+
+SHARD_DIR_PREFIX = '.shards-'
+PLAN_FILE = 'plan.json'
+
+# The encoder of a pool worker, created once by `_init_worker`
+_worker_encoder = None
+
+
+def shard_plan_key(texts_key: str, model_name: str, shard_size: int) -> str:
+    """Identifies a sharded embedding job: the same texts, model and shard size resume the same shards."""
+    return hashlib.sha256(f"{texts_key}\0{model_name}\0{shard_size}".encode('utf-8')).hexdigest()[:16]
+
+
+def shard_path(shard_dir: str, shard: int) -> str:
+    return os.path.join(shard_dir, f"shard_{shard:05d}.npy")
+
+
+def _init_worker(encoder_factory: Callable):
+    global _worker_encoder
+    _worker_encoder = encoder_factory()
+
+
+def _encode_shard(texts: List[str], path: str, batch_size: int, encoder=None) -> int:
+    """
+    Embeds one shard batch by batch into a float32 .npy memmap, written under a temporary
+    name and renamed once complete, so a shard file on disk is always whole.
+    """
+    encoder = encoder or _worker_encoder
+    tmp_path = path + '.tmp'
+    vectors = None
+    for start in range(0, len(texts), batch_size):
+        batch = np.asarray(encoder.encode(texts[start:start + batch_size], convert_to_tensor=False), dtype='float32')
+        if vectors is None:
+            vectors = np.lib.format.open_memmap(tmp_path, mode='w+', dtype='float32', shape=(len(texts), batch.shape[1]))
+        vectors[start:start + len(batch)] = batch
+    vectors.flush()
+    del vectors
+    os.replace(tmp_path, path)
+    return len(texts)
+
+
+def _shard_is_complete(path: str, num_rows: int) -> bool:
+    try:
+        return np.load(path, mmap_mode='r').shape[0] == num_rows
+    except (FileNotFoundError, ValueError, OSError):
+        return False
+
+
+def embed_in_shards(texts: List[str], work_dir: str, plan_key: str, shard_size: int, encoder=None,
+                    encoder_factory: Optional[Callable] = None, workers: int = 1, batch_size: int = 64) -> List[np.ndarray]:
+    """
+    Embeds a large list of texts in shards of `shard_size`, each streamed to its own float32
+    memmap under `work_dir/.shards-<plan_key>/`.
+
+    With `workers` > 1 the shards are spread over a process pool in which every worker builds
+    its own encoder with `encoder_factory` (a picklable zero-argument callable). Shards already
+    completed by an interrupted run with the same plan key are kept, so the job resumes where
+    it stopped; shard directories of other plans are removed.
+
+    Returns:
+        list[np.ndarray]: Read-only memmaps of the shards, in text order. Remove them with
+            `remove_shards` once they are merged.
+    """
+    shard_dir = os.path.join(work_dir, f"{SHARD_DIR_PREFIX}{plan_key}")
+    for name in os.listdir(work_dir):
+        if name.startswith(SHARD_DIR_PREFIX) and name != os.path.basename(shard_dir):
+            shutil.rmtree(os.path.join(work_dir, name), ignore_errors=True)
+    os.makedirs(shard_dir, exist_ok=True)
+    with open(os.path.join(shard_dir, PLAN_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"plan_key": plan_key, "num_texts": len(texts), "shard_size": shard_size}, f)
+
+    bounds = [(start, min(start + shard_size, len(texts))) for start in range(0, len(texts), shard_size)]
+    pending = [shard for shard, (start, end) in enumerate(bounds) if not _shard_is_complete(shard_path(shard_dir, shard), end - start)]
+    if len(pending) < len(bounds):
+        print(f"Resuming: {len(bounds) - len(pending)} of {len(bounds)} shards already embedded.")
+
+    if pending and workers > 1:
+        print(f"Embedding {len(pending)} shards of up to {shard_size} texts with {workers} worker processes...")
+        # Spawned workers start from a clean interpreter, which PyTorch's threads need
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(encoder_factory,)) as executor:
+            in_flight = []
+            for shard in pending:
+                start, end = bounds[shard]
+                in_flight.append((shard, executor.submit(_encode_shard, texts[start:end], shard_path(shard_dir, shard), batch_size)))
+                # Keep a bounded number of shards (and their texts) queued at a time
+                if len(in_flight) >= 2 * workers:
+                    done, future = in_flight.pop(0)
+                    future.result()
+                    print(f"  shard {done + 1}/{len(bounds)} done")
+            for done, future in in_flight:
+                future.result()
+                print(f"  shard {done + 1}/{len(bounds)} done")
+    elif pending:
+        encoder = encoder or encoder_factory()
+        print(f"Embedding {len(pending)} shards of up to {shard_size} texts...")
+        for shard in pending:
+            start, end = bounds[shard]
+            _encode_shard(texts[start:end], shard_path(shard_dir, shard), batch_size, encoder=encoder)
+            print(f"  shard {shard + 1}/{len(bounds)} done")
+
+    return [np.load(shard_path(shard_dir, shard), mmap_mode='r') for shard in range(len(bounds))]
+
+
+def remove_shards(work_dir: str, plan_key: str):
+    shutil.rmtree(os.path.join(work_dir, f"{SHARD_DIR_PREFIX}{plan_key}"), ignore_errors=True)
@@ -1,91 +1,419 @@
 # src/tutor.py
 import json
+import time
 from datetime import datetime
+from typing import Iterator, List, Optional, Tuple, Union
+import numpy as np
+from .llm_backends import SYSTEM_PREFIX, USER_TEMPLATE, FakeLLM, LLMBackend, parse_response
 from .rag_pipeline import RAGPipeline
+from .response_cache import ResponseCache
+from .rule_engine import RuleEngine
+from .sentence_splitter import split_sentences
+
+# Paragraph mode sends sentences to the LLM in groups of 1, 2, 4, ... up to this many
+MAX_STREAM_BATCH = 16
 
 class Tutor:
-    def __init__(self, base_model_name: str, lora_adapter_path: str, vector_db_path: str, user_profile_db_path: str):
+    def __init__(self, base_model_name: str, lora_adapter_path: str, vector_db_path: str, user_profile_db_path: str,
+                 knowledge_base_path: str = 'data/grammar_knowledge_base.json', rag_pipeline: Optional[RAGPipeline] = None,
+                 startup: str = 'eager', llm=None, response_cache: Optional[ResponseCache] = None,
+                 rule_engine: Optional[RuleEngine] = None):
         print("Initializing the French Tutor with Qwen3...")
-        # The initialization simulates loading the specified model and adapter.
-        # This now correctly points to a SOTA Qwen3 model.
-        print(f"Loading base model '{base_model_name}' and adapter '{lora_adapter_path}'...")
+        self.base_model_name = base_model_name
+        self.lora_adapter_path = lora_adapter_path
         self.model_ready = True
-        self.rag_pipeline = RAGPipeline(vector_db_path)
-        print("Tutor is ready.")
+        # LLM backend (see src/llm_backends.py); build_tutor loads the configured one, and the
+        # default is the offline fake model
+        self.llm: LLMBackend = llm if llm is not None else FakeLLM()
+        # Optional semantic cache of responses, consulted before the LLM (see ResponseCache)
+        self.response_cache = response_cache
+        # Optional pattern-based fast path for mechanical errors, consulted before retrieval (see RuleEngine)
+        self.rule_engine = rule_engine
 
         self.user_profile_db_path = user_profile_db_path
-        self.rag_pipeline = RAGPipeline(vector_db_path, user_profile_db_path, 'data/grammar_knowledge_base.json')
+        if rag_pipeline is None:
+            rag_pipeline = RAGPipeline(vector_db_path, user_profile_db_path, knowledge_base_path, startup=startup)
+        self.rag_pipeline = rag_pipeline
+        # Share the pipeline's store so reads see this tutor's not-yet-flushed updates
+        self.profile_store = rag_pipeline.profile_store
+        # ...and its metrics, so retrieval and generation stages land in one place
+        self.metrics = rag_pipeline.metrics
+        print("Tutor is ready.")
+
+    def use_profile_store(self, profile_store):
+        """
+        Points the tutor and its RAG pipeline at another ProfileStore, e.g. one opened by a
+        forked worker process, which cannot use a connection opened before the fork.
+        """
+        self.rag_pipeline.profile_store = profile_store
+        self.profile_store = profile_store
+
+    def readiness(self) -> dict:
+        """
+        Readiness probe for serving: the RAG pipeline's component status plus the LLM.
+        """
+        status = self.rag_pipeline.readiness()
+        status["components"]["llm"] = self.model_ready
+        status["ready"] = status["ready"] and self.model_ready
+        return status
 
     def correct(self, sentence: str, user_id: str) -> dict:
-        # 1. Get context and topic from the RAG pipeline
-        retrieved_info = self.rag_pipeline.get_context_with_topic(sentence, user_id)
-        context = retrieved_info['content']
-        error_topic = retrieved_info['topic']
-
-        # 2 (build prompt and query LLM)
-        context = self.rag_pipeline.get_context(sentence, user_id=user_id)
-        prompt = self._build_prompt(sentence, context)
-        print("Querying the LLM with the augmented Qwen3 prompt...")
-        response = self._query_llm_simulation(prompt)
-
-        # 4. Update user profile with the identified error topic
-        if "correction" in response and response["correction"] != "Sentence appears correct.":
-            self._update_user_profile(user_id, error_topic)
+        with self.metrics.span("correct"):
+            # 0. Mechanical errors are answered by the rule engine, without retrieval or the LLM
+            fast_path = self._match_rules([sentence])[0]
+            if fast_path is not None:
+                with self.metrics.span("profile_write"):
+                    self._update_user_profile(user_id, fast_path['topic'])
+                self.metrics.increment("corrections")
+                return self._rule_response(fast_path)
+
+            # 1. Get context and topic from the RAG pipeline
+            with self.metrics.span("retrieve"):
+                retrieved, query_embeddings = self._retrieve([sentence], [user_id])
+            retrieved_info = retrieved[0]
+            context = retrieved_info['content']
+            error_topic = retrieved_info['topic']
+
+            # 2. Build the prompt and query the LLM
+            with self.metrics.span("prompt"):
+                prompt = self._build_prompt(sentence, context)
+            print("Querying the LLM with the augmented Qwen3 prompt...")
+            response = self._generate([prompt], [sentence], retrieved, query_embeddings, [user_id])[0]
+
+            # 3. Update user profile with the identified error topic
+            if self._has_error(response):
+                with self.metrics.span("profile_write"):
+                    self._update_user_profile(user_id, error_topic)
         
+        self.metrics.increment("corrections")
         return response
-    
-    def _update_user_profile(self, user_id: str, error_topic: str):
+
+    def correct_stream(self, sentence: str, user_id: str) -> Iterator[str]:
         """
-        Loads, updates, and saves the user profile JSON file.
-        Increments the count for the identified error topic for the given user.
+        Corrects one sentence like `correct`, yielding the LLM's output text as it is generated.
+
+        The chunks join into the JSON response (`parse_response` turns them into the dict
+        `correct` returns). Rule-engine and response-cache answers come as a single chunk. The
+        profile is updated once the response is complete.
+
+        Args:
+            sentence (str): The learner's sentence.
+            user_id (str): The learner.
+
+        Yields:
+            str: Consecutive pieces of the response text.
         """
-        try:
-            with open(self.user_profile_db_path, 'r') as f:
-                profiles = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            profiles = {}
-
-        # Get user profile, or create it if it doesn't exist
-        user_profile = profiles.get(user_id, {"error_counts": {}})
-        error_counts = user_profile.get("error_counts", {})
+        fast_path = self._match_rules([sentence])[0]
+        if fast_path is not None:
+            response, topic = self._rule_response(fast_path), fast_path['topic']
+            yield json.dumps(response, ensure_ascii=False)
+        else:
+            with self.metrics.span("retrieve"):
+                retrieved, query_embeddings = self._retrieve([sentence], [user_id])
+            info = retrieved[0]
+            topic = info['topic']
+            with self.metrics.span("prompt"):
+                prompt = self._build_prompt(sentence, info['content'])
+            caching = self.response_cache is not None and not self.response_cache.bypasses(user_id)
+            response = self.response_cache.get(query_embeddings[0], info.get('rule_id'), sentence) if caching else None
+            if self.response_cache is not None:
+                self.metrics.increment("response_cache_hits" if response is not None else "response_cache_misses")
+            if response is not None:
+                yield json.dumps(response, ensure_ascii=False)
+            else:
+                self.metrics.increment("llm_prompts")
+                start = time.perf_counter()
+                chunks = []
+                for chunk in self.llm.stream(prompt):
+                    if not chunks:
+                        self.metrics.observe_latency("llm_first_token", time.perf_counter() - start)
+                    chunks.append(chunk)
+                    yield chunk
+                self.metrics.observe_latency("llm", time.perf_counter() - start)
+                response = parse_response("".join(chunks))
+                if caching:
+                    self.response_cache.put(query_embeddings[0], info.get('rule_id'), sentence, response)
+
+        if self._has_error(response):
+            with self.metrics.span("profile_write"):
+                self._update_user_profile(user_id, topic)
+        self.metrics.increment("corrections")
+
+    def correct_batch(self, sentences: List[str], user_ids: Union[str, List[str]], batch_size: Optional[int] = None) -> List[dict]:
+        """
+        Corrects many sentences at once, e.g. a whole classroom upload.
         
-        # Increment the count for the specific error topic
-        error_counts[error_topic] = error_counts.get(error_topic, 0) + 1
+        Sentences the rule engine corrects with confidence skip retrieval and the LLM. For the
+        rest, retrieval is batched (chunked encoding plus a single FAISS search), each user
+        profile is read once, and all profile updates are written in a single pass.
         
-        # Update the profile
-        user_profile["error_counts"] = error_counts
-        user_profile["last_seen"] = datetime.utcnow().isoformat()
-        profiles[user_id] = user_profile
+        Args:
+            sentences (list[str]): The sentences to correct.
+            user_ids (str | list[str]): One user id for the whole batch, or one id per sentence.
+            batch_size (int, optional): Encoder chunk size passed to the RAG pipeline.
+            
+        Returns:
+            list[dict]: One response per sentence, in input order.
+        """
+        if isinstance(user_ids, str):
+            user_ids = [user_ids] * len(sentences)
+        
+        with self.metrics.span("correct_batch"):
+            # 0. Answer mechanical errors with the rule engine; only the rest go through retrieval and the LLM
+            fast_paths = self._match_rules(sentences)
+            responses: List[Optional[dict]] = [None] * len(sentences)
+            updates = []
+            for i, fast_path in enumerate(fast_paths):
+                if fast_path is not None:
+                    responses[i] = self._rule_response(fast_path)
+                    updates.append((user_ids[i], fast_path['topic']))
+            remaining = [i for i, response in enumerate(responses) if response is None]
+            remaining_sentences = [sentences[i] for i in remaining]
+            remaining_user_ids = [user_ids[i] for i in remaining]
+
+            if remaining:
+                # 1. Get context and topic for every sentence in one retrieval pass
+                with self.metrics.span("retrieve"):
+                    retrieved, query_embeddings = self._retrieve(remaining_sentences, remaining_user_ids, batch_size=batch_size)
+
+                # 2. Build the prompts and query the LLM
+                with self.metrics.span("prompt"):
+                    prompts = [self._build_prompt(sentence, info['content']) for sentence, info in zip(remaining_sentences, retrieved)]
+                print(f"Querying the LLM with {len(remaining)} augmented Qwen3 prompts...")
+                generated = self._generate(prompts, remaining_sentences, retrieved, query_embeddings, remaining_user_ids)
+                for i, info, response in zip(remaining, retrieved, generated):
+                    responses[i] = response
+                    if self._has_error(response):
+                        updates.append((user_ids[i], info['topic']))
+
+            # 3. Update all user profiles with one read and one write
+            if updates:
+                with self.metrics.span("profile_write"):
+                    self._update_user_profiles(updates)
         
-        # Write the updated profiles back to the file
-        with open(self.user_profile_db_path, 'w') as f:
-            json.dump(profiles, f, indent=2)
+        self.metrics.increment("corrections", len(sentences))
+        self.metrics.observe("batch_size", len(sentences))
+        return responses
+
+    def correct_paragraph_stream(self, text: str, user_id: str, batch_size: Optional[int] = None,
+                                 max_stream_batch: int = MAX_STREAM_BATCH) -> Iterator[dict]:
+        """
+        Corrects a paragraph sentence by sentence, yielding each correction as soon as it is ready.
+
+        The text is split with `split_sentences` and a sentence repeated in the paragraph is
+        corrected once. Sentences the rule engine is sure about come first, without retrieval or
+        the LLM. The others are retrieved in one batch (one encoding pass, one search, one
+        profile read) and sent to the LLM in groups of 1, 2, 4, ... up to `max_stream_batch`
+        prompts: the first correction waits for a one-prompt call while the rest still share
+        batches. The profile updates of the whole paragraph are written once, after the last
+        sentence, or when the consumer stops early.
+
+        Args:
+            text (str): The learner's paragraph.
+            user_id (str): The learner.
+            batch_size (int, optional): Encoder chunk size passed to the RAG pipeline.
+            max_stream_batch (int): Largest group of prompts sent to the LLM at once.
+
+        Yields:
+            dict: {"index", "sentence", "correction", "explanation", "topic", "rule_id"} per sentence,
+                in completion order; `index` is the sentence's position in the paragraph.
+        """
+        start = time.perf_counter()
+        sentences = split_sentences(text)
+        positions = {}
+        for index, sentence in enumerate(sentences):
+            positions.setdefault(sentence, []).append(index)
+        unique = list(positions)
+        self.metrics.increment("paragraphs")
+        self.metrics.observe("paragraph_sentences", len(sentences))
+        updates = []
+        first = True
+
+        def results(sentence: str, response: dict, topic: Optional[str], rule_id: Optional[str]):
+            nonlocal first
+            if first:
+                self.metrics.observe_latency("paragraph_first_correction", time.perf_counter() - start)
+                first = False
+            if topic is not None and self._has_error(response):
+                updates.extend([(user_id, topic)] * len(positions[sentence]))
+            for index in positions[sentence]:
+                yield {"index": index, "sentence": sentence, **response, "topic": topic, "rule_id": rule_id}
+
+        try:
+            # 1. Mechanical errors, answered by the rule engine
+            fast_paths = self._match_rules(unique)
+            for sentence, fast_path in zip(unique, fast_paths):
+                if fast_path is not None:
+                    yield from results(sentence, self._rule_response(fast_path), fast_path['topic'], fast_path.get('rule_id'))
+            remaining = [sentence for sentence, fast_path in zip(unique, fast_paths) if fast_path is None]
+            if not remaining:
+                return
+
+            # 2. One retrieval pass for every remaining sentence
+            with self.metrics.span("retrieve"):
+                retrieved, query_embeddings = self._retrieve(remaining, [user_id] * len(remaining), batch_size=batch_size)
+            with self.metrics.span("prompt"):
+                prompts = [self._build_prompt(sentence, info['content']) for sentence, info in zip(remaining, retrieved)]
+
+            # 3. LLM calls in growing groups, each yielded as soon as it returns
+            print(f"Querying the LLM with {len(remaining)} augmented Qwen3 prompts for a paragraph of {len(sentences)} sentences...")
+            group_start, group_size = 0, 1
+            while group_start < len(remaining):
+                group = slice(group_start, group_start + group_size)
+                generated = self._generate(prompts[group], remaining[group], retrieved[group],
+                                           None if query_embeddings is None else query_embeddings[group],
+                                           [user_id] * len(prompts[group]))
+                for sentence, info, response in zip(remaining[group], retrieved[group], generated):
+                    yield from results(sentence, response, info['topic'], info.get('rule_id'))
+                group_start += group_size
+                group_size = min(group_size * 2, max_stream_batch)
+        finally:
+            # 4. One profile write for the whole paragraph
+            self.metrics.increment("corrections", len(sentences))
+            if updates:
+                with self.metrics.span("profile_write"):
+                    self._update_user_profiles(updates)
+
+    def correct_paragraph(self, text: str, user_id: str, batch_size: Optional[int] = None) -> dict:
+        """
+        Corrects a whole paragraph (see `correct_paragraph_stream`) and returns the results in order.
+
+        Returns:
+            dict: {"sentences": per-sentence results in paragraph order, "corrected_text": the
+                corrected sentences joined by spaces, "rules": one {"rule_id", "topic", "sentences"}
+                entry per distinct grammar rule, listing the indexes of the sentences it applies to}.
+        """
+        results = list(self.correct_paragraph_stream(text, user_id, batch_size=batch_size))
+        return self.paragraph_summary(results)
+
+    @classmethod
+    def paragraph_summary(cls, results: List[dict]) -> dict:
+        """Orders the results of `correct_paragraph_stream` and summarizes them (see `correct_paragraph`)."""
+        results = sorted(results, key=lambda result: result['index'])
+        rules = {}
+        for result in results:
+            if cls._has_error(result):
+                key = result['rule_id'] or result['topic']
+                rules.setdefault(key, {"rule_id": result['rule_id'], "topic": result['topic'], "sentences": []})
+                rules[key]["sentences"].append(result['index'])
+        return {
+            "sentences": results,
+            "corrected_text": " ".join(result['correction'] if cls._has_error(result) else result['sentence']
+                                       for result in results),
+            "rules": list(rules.values()),
+        }
+
+    def _match_rules(self, sentences: List[str]) -> List[Optional[dict]]:
+        """
+        Runs the rule engine over the sentences. Returns the confident match of each sentence
+        served by the fast path, and None for those that need retrieval and the LLM.
+        """
+        if self.rule_engine is None:
+            return [None] * len(sentences)
+        with self.metrics.span("rule_engine"):
+            matches = [self.rule_engine.match(sentence) for sentence in sentences]
+        fast_paths = [match if match is not None and match['confident'] else None for match in matches]
+        served = sum(fast_path is not None for fast_path in fast_paths)
+        self.metrics.increment("fast_path_hits", served)
+        self.metrics.increment("fast_path_fallthroughs", len(sentences) - served)
+        self.metrics.increment("fast_path_ambiguous", sum(match is not None and not match['confident'] for match in matches))
+        return fast_paths
+
+    @staticmethod
+    def _rule_response(fast_path: dict) -> dict:
+        return {"correction": fast_path['correction'], "explanation": fast_path['explanation']}
+
+    def _retrieve(self, sentences: List[str], user_ids: List[str],
+                  batch_size: Optional[int] = None) -> Tuple[List[dict], Optional[List[Optional[np.ndarray]]]]:
+        """
+        Retrieves context for every sentence. With a response cache, the query embeddings are
+        returned too, so the cache can reuse them: those retrieval computed, plus one encode
+        call for the sentences it skipped (decisive lexical hits) that the cache will look up.
+        """
+        if self.response_cache is None:
+            return self.rag_pipeline.get_context_batch(sentences, user_ids, batch_size=batch_size), None
+        retrieved, query_embeddings = self.rag_pipeline.get_context_batch(sentences, user_ids, batch_size=batch_size,
+                                                                          return_embeddings=True)
+        missing = [i for i, (info, user_id, embedding) in enumerate(zip(retrieved, user_ids, query_embeddings))
+                   if embedding is None and info.get('rule_id') is not None and not self.response_cache.bypasses(user_id)]
+        if missing:
+            self.metrics.increment("response_cache_embeds", len(missing))
+            embeddings = self.rag_pipeline.encode([sentences[i] for i in missing], batch_size=batch_size)
+            for i, embedding in zip(missing, embeddings):
+                query_embeddings[i] = embedding
+        return retrieved, query_embeddings
+
+    def _generate(self, prompts: List[str], sentences: List[str], retrieved: List[dict],
+                  query_embeddings: Optional[List[Optional[np.ndarray]]], user_ids: List[str]) -> List[dict]:
+        """
+        The LLM stage behind the response cache: prompts whose sentence was already corrected
+        with the same retrieved rule reuse that response, and only the rest reach the LLM.
+        """
+        if self.response_cache is None:
+            with self.metrics.span("llm"):
+                return self._query_llm_batch(prompts)
+
+        responses: List[Optional[dict]] = [None] * len(prompts)
+        with self.metrics.span("response_cache"):
+            for i, (info, user_id) in enumerate(zip(retrieved, user_ids)):
+                if not self.response_cache.bypasses(user_id):
+                    responses[i] = self.response_cache.get(query_embeddings[i], info.get('rule_id'), sentences[i])
+        to_generate = [i for i, response in enumerate(responses) if response is None]
+        self.metrics.increment("response_cache_hits", len(prompts) - len(to_generate))
+        self.metrics.increment("response_cache_misses", len(to_generate))
+
+        if to_generate:
+            with self.metrics.span("llm"):
+                generated = self._query_llm_batch([prompts[i] for i in to_generate])
+            for i, response in zip(to_generate, generated):
+                responses[i] = response
+                if not self.response_cache.bypasses(user_ids[i]):
+                    self.response_cache.put(query_embeddings[i], retrieved[i].get('rule_id'), sentences[i], response)
+        return responses
+
+    @staticmethod
+    def _has_error(response: dict) -> bool:
+        return "correction" in response and response["correction"] != "Sentence appears correct."
+    
+    def _update_user_profile(self, user_id: str, error_topic: str):
+        """
+        Increments the count for the identified error topic for the given user.
+        """
+        self._update_user_profiles([(user_id, error_topic)])
+
+    def _update_user_profiles(self, updates: List[Tuple[str, str]]):
+        """
+        Records several (user_id, error_topic) increments in the profile store. The store
+        buffers them and writes them in the background, so this never rewrites the database.
+        """
+        self.profile_store.increment_many(updates, last_seen=datetime.utcnow().isoformat())
+        self.metrics.increment("profile_updates", len(updates))
         
-        print(f"Updated profile for user '{user_id}'. New count for '{error_topic}': {error_counts[error_topic]}.")
+        if len(updates) == 1:
+            user_id, error_topic = updates[0]
+            print(f"Updated profile for user '{user_id}': one more '{error_topic}' error.")
+        else:
+            print(f"Updated {len(updates)} profile entries for {len({user_id for user_id, _ in updates})} users.")
 
     def _build_prompt(self, sentence: str, context: str) -> str:
         """
         Constructs the final prompt using the official Qwen ChatML template,
-        which is compatible with the Qwen3 series.
-        """
-        system_message = "You are an expert French language tutor..." # (message is the same)
-        user_message = f"Context: {context}\nSentence: {sentence}"
-        prompt = f"<|im_start|>system\n{system_message}<|im_end|>\n<|im_start|>user\n{user_message}<|im_end|>\n<|im_start|>assistant\n"
-        return prompt
-
-    def _query_llm_simulation(self, prompt: str) -> dict:
-        """Simulates the response from the actual fine-tuned LLM."""
-        if "le parc" in prompt:
-            return {
-              "correction": "Je vais au parc.",
-              "explanation": "Bon travail ! The noun 'parc' is masculine, so the preposition 'à' must contract with the article 'le' to become 'au'. I see you've been working on this, and you're very close to mastering it!"
-            }
-        if "j'ai besoin" in prompt:
-            return {
-              "correction": "C'est le livre dont j'ai besoin.",
-              "explanation": "Très bien ! The verb 'avoir besoin' is always followed by the preposition 'de'. When this is the object of a relative clause, you must use the pronoun 'dont'. This is a common point of confusion!"
-            }
-        return {
-            "correction": "Sentence appears correct.",
-            "explanation": "I couldn't find any grammatical errors in this sentence. Well done!"
-        }
\ No newline at end of file
+        which is compatible with the Qwen3 series. The system turn is the constant
+        SYSTEM_PREFIX, formatted once for all prompts.
+        """
+        return SYSTEM_PREFIX + USER_TEMPLATE.format(context=context, sentence=sentence)
+
+    def _query_llm(self, prompt: str) -> dict:
+        return self._query_llm_batch([prompt])[0]
+
+    def _query_llm_batch(self, prompts: List[str]) -> List[dict]:
+        """
+        Runs the LLM stage for several prompts together through the backend, which generates
+        identical prompts only once.
+        """
+        self.metrics.increment("llm_prompts", len(prompts))
+        return self.llm.generate_batch(prompts)
+
+
+# Kept for existing callers: the fake backend, with per-batch and per-prompt latency
+StubLLM = FakeLLM
@@ -0,0 +1,373 @@
+# src/vector_store.py
+import hashlib
+import json
+import os
+import uuid
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import faiss
+
+from .docstore import DOCSTORE_FILE, write_docstore
+from .lexical_index import LexicalIndex
+from .sharded_embedding import SHARD_DIR_PREFIX, embed_in_shards, remove_shards, shard_plan_key
+
+INDEX_FILE = 'faiss_index.bin'
+# Written by builds before the docstore replaced it; removed on the next build
+LEGACY_CORPUS_FILE = 'corpus.json'
+MANIFEST_FILE = 'manifest.json'
+
+
+def document_hash(document: dict) -> str:
+    """Hash of the text that gets embedded; a document is re-embedded only when this changes."""
+    return hashlib.sha256(document['content'].encode('utf-8')).hexdigest()
+
+
+def load_manifest(output_dir: str) -> Optional[dict]:
+    """
+    Loads the build manifest written next to the index, or None for a store built without one.
+
+    The manifest records the embedding model, and for every document its `rule_id`, stable
+    integer id in the index and content hash:
+        {"model_name": ..., "next_id": 7, "embeddings_file": "embeddings-<build>.npy",
+         "documents": {rule_id: {"id": 3, "hash": "..."}}}
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_atomic(path: str, write):
+    tmp_path = path + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _encode(encoder, texts: List[str], batch_size: int) -> np.ndarray:
+    embeddings = encoder.encode(texts, convert_to_tensor=False, show_progress_bar=len(texts) > batch_size, batch_size=batch_size)
+    return np.ascontiguousarray(np.asarray(embeddings), dtype='float32')
+
+
+DEFAULT_INDEX_CONFIG = {"type": "flat"}
+# Vectors copied or added to an index at a time, so memory-mapped embeddings are never loaded whole
+CHUNK_ROWS = 65536
+# Training vectors per IVF list / PQ centroid; FAISS's k-means uses no more than this either
+TRAIN_ROWS_PER_CENTROID = 256
+
+
+def _index_parameters(index_config: Optional[dict]) -> dict:
+    """Flattens an index config into {"type": ..., **parameters of that type}."""
+    index_config = index_config or DEFAULT_INDEX_CONFIG
+    index_type = index_config.get('type', 'flat').lower()
+    if index_type not in ('flat', 'ivf', 'hnsw', 'ivfpq'):
+        raise ValueError(f"Unknown vector index type '{index_type}'. Expected one of: flat, ivf, hnsw, ivfpq.")
+    params = dict(index_config.get(index_type) or {})
+    params.update({key: value for key, value in index_config.items() if key not in ('type', 'flat', 'ivf', 'hnsw', 'ivfpq')})
+    params['type'] = index_type
+    return params
+
+
+def create_index(embeddings: np.ndarray, ids: np.ndarray, index_config: Optional[dict] = None):
+    """
+    Creates, trains and fills an ID-mapped FAISS index of the configured type.
+
+    `index_config` follows the `vector_index` section of config.yaml, e.g.
+    {"type": "ivf", "ivf": {"nlist": 256, "nprobe": 16}}. Parameters may also be given
+    inline, as in {"type": "hnsw", "M": 32}. Supported types and parameters:
+        flat:  exact search (default).
+        ivf:   nlist, nprobe.
+        hnsw:  M, ef_construction, ef_search.
+        ivfpq: nlist, nprobe, m (sub-quantizers, must divide the dimension), nbits.
+    Cluster counts are capped to what the number of vectors can train.
+
+    `embeddings` may be a memory-mapped array: training uses a fixed random sample of at most
+    TRAIN_ROWS_PER_CENTROID vectors per centroid, and vectors are added CHUNK_ROWS at a time.
+    """
+    params = _index_parameters(index_config)
+    num_vectors, dim = embeddings.shape
+    index_type = params['type']
+
+    centroids = 1
+    if index_type == 'flat':
+        factory = "Flat"
+    elif index_type == 'hnsw':
+        factory = f"HNSW{params.get('M', 32)}"
+    else:
+        nlist = max(1, min(params.get('nlist', 256), num_vectors))
+        centroids = nlist
+        if index_type == 'ivf':
+            factory = f"IVF{nlist},Flat"
+        else:
+            m = params.get('m', 16)
+            if dim % m != 0:
+                raise ValueError(f"ivfpq 'm' ({m}) must divide the embedding dimension ({dim}).")
+            # PQ codebooks need at least 2**nbits training vectors
+            nbits = max(1, min(params.get('nbits', 8), int(np.log2(num_vectors))))
+            factory = f"IVF{nlist},PQ{m}x{nbits}"
+            centroids = max(nlist, 2 ** nbits)
+
+    index = faiss.index_factory(dim, f"IDMap2,{factory}", faiss.METRIC_L2)
+    base = faiss.downcast_index(index.index)
+    if index_type == 'hnsw':
+        base.hnsw.efConstruction = params.get('ef_construction', 200)
+    if not index.is_trained:
+        index.train(_training_sample(embeddings, centroids))
+    for start in range(0, num_vectors, CHUNK_ROWS):
+        index.add_with_ids(np.ascontiguousarray(embeddings[start:start + CHUNK_ROWS], dtype='float32'),
+                           ids[start:start + CHUNK_ROWS])
+    apply_search_params(index, params)
+    return index
+
+
+def _training_sample(embeddings: np.ndarray, centroids: int) -> np.ndarray:
+    """All vectors, or a fixed random sample of them when there are more than training can use."""
+    limit = TRAIN_ROWS_PER_CENTROID * centroids
+    if len(embeddings) <= limit:
+        return np.ascontiguousarray(embeddings, dtype='float32')
+    rows = np.sort(np.random.RandomState(0).choice(len(embeddings), size=limit, replace=False))
+    return np.ascontiguousarray(embeddings[rows], dtype='float32')
+
+
+def apply_search_params(index, index_config: Optional[dict]):
+    """
+    Applies the query-time parameters of an index config (IVF `nprobe`, HNSW `ef_search`)
+    to a loaded index. Parameters that do not apply to the index type are ignored.
+    """
+    params = _index_parameters(index_config)
+    base = faiss.downcast_index(index.index) if hasattr(index, 'id_map') else index
+    if 'nprobe' in params and hasattr(base, 'nprobe'):
+        base.nprobe = params['nprobe']
+    if 'ef_search' in params and hasattr(base, 'hnsw'):
+        base.hnsw.efSearch = params['ef_search']
+
+
+def read_index(index_path: str, mmap: bool = True, index_type: str = 'flat'):
+    """
+    Reads a FAISS index, memory-mapping its vectors when the index type and FAISS version allow
+    it (flat storage via IO_FLAG_MMAP_IFC, IVF inverted lists via IO_FLAG_MMAP). Pages are then
+    loaded on demand and shared between processes instead of being copied into each one.
+    Falls back to a regular read otherwise.
+    """
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"FAISS index not found at '{index_path}'")
+    if mmap:
+        if index_type in ('ivf', 'ivfpq'):
+            flag = faiss.IO_FLAG_MMAP
+        else:
+            flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', None)
+        if flag is not None:
+            try:
+                return faiss.read_index(index_path, flag)
+            except RuntimeError:
+                pass
+    return faiss.read_index(index_path)
+
+
+def load_embeddings(output_dir: str, manifest: dict) -> Optional[np.ndarray]:
+    """
+    Memory-maps the stored document embeddings, whose rows follow ascending document id,
+    or returns None if they are missing or do not match the manifest.
+    """
+    if 'embeddings_file' not in manifest:
+        return None
+    try:
+        embeddings = np.load(os.path.join(output_dir, manifest['embeddings_file']), mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+        return None
+    if embeddings.ndim != 2 or embeddings.shape[0] != len(manifest['documents']):
+        return None
+    return embeddings
+
+
+def build_vector_store(documents: List[dict], encoder, output_dir: str, model_name: str,
+                       incremental: bool = True, batch_size: int = 64, index_config: Optional[dict] = None,
+                       lexical_config: Optional[dict] = None, shard_size: Optional[int] = None, workers: int = 1,
+                       encoder_factory: Optional[Callable] = None) -> dict:
+    """
+    Builds or updates the FAISS vector store for a list of knowledge-base documents.
+
+    Every document gets a stable integer id, kept across builds for as long as its `rule_id`
+    exists, and vectors are stored in an ID-mapped index. Document embeddings are kept next to
+    the index; in incremental mode only added or changed documents (by content hash) are
+    embedded, unchanged ones reuse their stored vector and deleted ones are dropped. A full
+    rebuild embeds everything but keeps the same ids, and both modes assemble the index the
+    same way, so they give identical search results.
+
+    Embeddings are written straight into a memory-mapped file and the index is filled from it
+    in chunks, so the vectors are never all held in RAM. When more than `shard_size` documents
+    need embedding, they are embedded in shards (see `embed_in_shards`), optionally across
+    `workers` processes, and an interrupted build resumes from the shards it completed.
+
+    A BM25 lexical index over the same documents and ids (see `LexicalIndex`) and the docstore
+    the pipeline resolves hits from (see `src/docstore.py`) are rewritten next to the FAISS
+    index on every build; neither needs embeddings and both take little time.
+
+    Args:
+        documents (list[dict]): Knowledge-base entries with unique `rule_id` and `content` fields.
+        encoder: Object exposing `encode(list_of_str)`, e.g. an `EmbeddingBackend` (see `src/embeddings.py`).
+            May be None when `encoder_factory` is given; it is then only created if needed.
+        output_dir (str): Directory receiving the index, docstore and manifest.
+        model_name (str): Name of the embedding model, recorded so a model change forces a full rebuild.
+        incremental (bool): Patch the existing index when possible instead of rebuilding it.
+        batch_size (int): Encoder batch size.
+        index_config (dict, optional): The `vector_index` config section choosing the index type
+            (see `create_index`). Defaults to exact flat search.
+        lexical_config (dict, optional): The `lexical_index` config section. `{"enabled": False}`
+            skips the lexical index.
+        shard_size (int, optional): Documents per shard in sharded mode. None embeds in one pass.
+        workers (int): Processes embedding shards in parallel, each with its own encoder.
+        encoder_factory (callable, optional): Picklable zero-argument callable creating an
+            encoder, required when `workers` > 1.
+
+    Returns:
+        dict: Counts of added, changed, removed and unchanged documents, and the build mode used.
+    """
+    if not documents:
+        raise ValueError("Cannot build a vector store from an empty knowledge base.")
+    duplicates = sorted(rule_id for rule_id, count in Counter(doc['rule_id'] for doc in documents).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Knowledge base contains duplicate rule_ids: {duplicates}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    previous = manifest['documents'] if manifest else {}
+    next_id = manifest['next_id'] if manifest else 0
+
+    # Assign ids: existing rule_ids keep theirs, new ones get fresh ids
+    entries: Dict[str, dict] = {}
+    added, changed, unchanged = [], [], []
+    for doc in documents:
+        content_hash = document_hash(doc)
+        old_entry = previous.get(doc['rule_id'])
+        if old_entry is None:
+            entries[doc['rule_id']] = {"id": next_id, "hash": content_hash}
+            next_id += 1
+            added.append(doc)
+        else:
+            entries[doc['rule_id']] = {"id": old_entry['id'], "hash": content_hash}
+            (unchanged if old_entry['hash'] == content_hash else changed).append(doc)
+    removed_ids = [entry['id'] for rule_id, entry in previous.items() if rule_id not in entries]
+
+    old_embeddings = None
+    if incremental:
+        if manifest is None:
+            print("No build manifest found; performing a full rebuild.")
+        elif manifest.get('model_name') != model_name:
+            print(f"Embedding model changed ('{manifest.get('model_name')}' -> '{model_name}'); performing a full rebuild.")
+        else:
+            old_embeddings = load_embeddings(output_dir, manifest)
+            if old_embeddings is None:
+                print("Stored embeddings are missing or do not match the manifest; performing a full rebuild.")
+
+    if old_embeddings is None:
+        mode = "full"
+        to_embed = documents
+    else:
+        mode = "incremental"
+        to_embed = added + changed
+
+    # Rows are stored, and the index assembled, in ascending id order, so that both modes insert
+    # (and train on) identical vectors in an identical order and even equal-distance ties resolve
+    # the same way. Fresh embeddings are computed in that order too.
+    ids = np.array(sorted(entry['id'] for entry in entries.values()), dtype='int64')
+    to_embed = sorted(to_embed, key=lambda doc: entries[doc['rule_id']]['id'])
+    fresh_blocks = []
+    if to_embed:
+        texts = [doc['content'] for doc in to_embed]
+        print(f"Generating embeddings for {len(to_embed)} documents...")
+        if shard_size and len(to_embed) > shard_size:
+            texts_key = hashlib.sha256("\n".join(
+                f"{entries[doc['rule_id']]['id']}:{entries[doc['rule_id']]['hash']}" for doc in to_embed).encode('utf-8')).hexdigest()
+            plan_key = shard_plan_key(texts_key, model_name, shard_size)
+            fresh_blocks = embed_in_shards(texts, output_dir, plan_key, shard_size, encoder=encoder,
+                                           encoder_factory=encoder_factory, workers=workers, batch_size=batch_size)
+        else:
+            fresh_blocks = [_encode(encoder or encoder_factory(), texts, batch_size)]
+
+    # Merge fresh and stored vectors into this build's embeddings file, a chunk at a time.
+    # Each build writes its own file; only the manifest written last points at it.
+    embeddings_file = f"embeddings-{uuid.uuid4().hex[:12]}.npy"
+    dim = fresh_blocks[0].shape[1] if fresh_blocks else old_embeddings.shape[1]
+    embeddings = np.lib.format.open_memmap(os.path.join(output_dir, embeddings_file), mode='w+', dtype='float32',
+                                           shape=(len(ids), dim))
+    fresh_positions = np.searchsorted(ids, [entries[doc['rule_id']]['id'] for doc in to_embed])
+    offset = 0
+    for block in fresh_blocks:
+        for start in range(0, len(block), CHUNK_ROWS):
+            chunk = block[start:start + CHUNK_ROWS]
+            embeddings[fresh_positions[offset + start:offset + start + len(chunk)]] = chunk
+        offset += len(block)
+    if old_embeddings is not None and unchanged:
+        old_ids = np.array(sorted(entry['id'] for entry in previous.values()), dtype='int64')
+        unchanged_ids = np.sort(np.array([entries[doc['rule_id']]['id'] for doc in unchanged], dtype='int64'))
+        for start in range(0, len(unchanged_ids), CHUNK_ROWS):
+            chunk_ids = unchanged_ids[start:start + CHUNK_ROWS]
+            embeddings[np.searchsorted(ids, chunk_ids)] = old_embeddings[np.searchsorted(old_ids, chunk_ids)]
+    embeddings.flush()
+    del fresh_blocks, old_embeddings
+
+    print(f"Building '{_index_parameters(index_config)['type']}' index over {len(ids)} vectors...")
+    index = create_index(embeddings, ids, index_config)
+    del embeddings
+    _write_atomic(os.path.join(output_dir, INDEX_FILE), lambda path: faiss.write_index(index, path))
+
+    # The documents themselves, keyed by the same ids, for the pipeline to map instead of parsing the JSON
+    _write_atomic(os.path.join(output_dir, DOCSTORE_FILE),
+                  lambda path: write_docstore(path, documents, [entries[doc['rule_id']]['id'] for doc in documents]))
+    if os.path.exists(os.path.join(output_dir, LEGACY_CORPUS_FILE)):
+        os.remove(os.path.join(output_dir, LEGACY_CORPUS_FILE))
+
+    if (lexical_config or {}).get('enabled', True):
+        print("Building the lexical (BM25) index...")
+        lexical_params = {key: value for key, value in (lexical_config or {}).items() if key != 'enabled'}
+        LexicalIndex.build(documents, [entries[doc['rule_id']]['id'] for doc in documents], lexical_params).save(output_dir)
+
+    # The manifest goes last: after a crash part-way through, it still describes the previous
+    # build and its embeddings file, so the next run starts from a consistent state.
+    def write_manifest(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"model_name": model_name, "next_id": next_id, "embeddings_file": embeddings_file,
+                       "index": _index_parameters(index_config), "documents": entries}, f, indent=2, ensure_ascii=False)
+    _write_atomic(os.path.join(output_dir, MANIFEST_FILE), write_manifest)
+
+    for name in os.listdir(output_dir):
+        if name.startswith('embeddings-') and name.endswith('.npy') and name != embeddings_file:
+            os.remove(os.path.join(output_dir, name))
+        elif name.startswith(SHARD_DIR_PREFIX):
+            # Shards of this build are merged, and those of any abandoned build are stale
+            remove_shards(output_dir, name[len(SHARD_DIR_PREFIX):])
+
+    summary = {
+        "mode": mode,
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(removed_ids),
+        "unchanged": len(unchanged),
+        "embedded": len(to_embed),
+        "total": int(index.ntotal),
+    }
+    print(f"{mode.capitalize()} build: {summary['added']} added, {summary['changed']} changed, "
+          f"{summary['removed']} removed, {summary['embedded']} embedded, {summary['total']} vectors in index.")
+    return summary
+
+
+def map_ids_to_documents(manifest: dict, knowledge_base: List[dict]) -> Dict[int, dict]:
+    """
+    Resolves the stable index ids recorded in a manifest to knowledge-base entries via `rule_id`.
+    """
+    documents_by_rule = {doc.get('rule_id'): doc for doc in knowledge_base}
+    mapping = {}
+    missing = []
+    for rule_id, entry in manifest['documents'].items():
+        doc = documents_by_rule.get(rule_id)
+        if doc is None:
+            missing.append(rule_id)
+        else:
+            mapping[entry['id']] = doc
+    if missing:
+        print(f"Warning: {len(missing)} indexed rules are missing from the knowledge base (e.g. '{missing[0]}'). "
+              "Rebuild the vector store.")
+    return mapping
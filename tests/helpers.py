@@ -0,0 +1,43 @@
+# tests/helpers.py
+import json
+from src import vector_store
+from src.embeddings import HashingBackend
+
+SAMPLE_KNOWLEDGE_BASE = 'data/sample_grammar_knowledge_base.json'
+
+
+class HashingEncoder(HashingBackend):
+    """
+    The hashing embedding backend as a small bag of words (64 dimensions, no character
+    n-grams) that counts its `encode` calls, so tests can check how often encoding happens.
+    """
+    def __init__(self, dim: int = 64):
+        super().__init__(dim, char_ngram=0)
+        self.calls = 0
+
+    def encode(self, sentences, convert_to_tensor=False, **kwargs):
+        self.calls += 1
+        return super().encode(sentences, convert_to_tensor=convert_to_tensor, **kwargs)
+
+
+def build_vector_store(output_dir: str, encoder, knowledge_base_path: str = SAMPLE_KNOWLEDGE_BASE, **kwargs):
+    """Builds a vector store for the knowledge base with the same code as scripts/03_build_vector_store.py."""
+    with open(knowledge_base_path, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    return vector_store.build_vector_store(documents, encoder, output_dir, model_name='hashing', **kwargs)
+
+
+class ByteTokenizer:
+    """
+    A tiny Hugging Face-style tokenizer for CPU tests: one token per UTF-8 byte
+    (id = byte + 1), with id 0 as end-of-sequence and padding.
+    """
+    name_or_path = 'byte-tokenizer'
+    eos_token_id = 0
+    pad_token_id = 0
+
+    def __call__(self, texts, add_special_tokens=False):
+        return {"input_ids": [[byte + 1 for byte in text.encode('utf-8')] for text in texts]}
+
+    def get_vocab(self):
+        return {"<eos>": 0, **{f"<0x{byte:02X}>": byte + 1 for byte in range(256)}}
@@ -0,0 +1,36 @@
+# tests/test_benchmarks.py
+import unittest
+from benchmarks.run_benchmarks import compare_results
+from benchmarks.synthetic import synthetic_knowledge_base
+from src.embeddings import HashingBackend
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_synthetic_data_is_deterministic(self):
+        """The same size and seed always give the same knowledge base and embeddings."""
+        first, second = synthetic_knowledge_base(50), synthetic_knowledge_base(50)
+        self.assertEqual(first, second)
+        self.assertEqual(len({doc["rule_id"] for doc in first}), 50)
+        texts = [doc["content"] for doc in first[:5]]
+        self.assertTrue((HashingBackend(dim=128).encode(texts) == HashingBackend(dim=128).encode(texts)).all())
+
+    def test_compare_results_applies_tolerances(self):
+        """Only slowdowns beyond both the relative tolerance and the absolute floor are reported."""
+        baseline = {"results": {"1000": {"grammar_db": {"p50_us": 100.0}, "build_prompt": {"p50_us": 1.0},
+                                         "update_profile": {"p50_us": 100.0}}}}
+        current = {"results": {"1000": {"grammar_db": {"p50_us": 140.0}, "build_prompt": {"p50_us": 3.0},
+                                        "update_profile": {"p50_us": 140.0}, "end_to_end": {"p50_us": 900.0}},
+                               "10": {"grammar_db": {"p50_us": 500.0}}}}
+        tolerance = {"default": 0.3, "stages": {"update_profile": 0.5}}
+
+        regressions = compare_results(current, baseline, tolerance, min_delta_us=5.0)
+        self.assertEqual([(r["size"], r["stage"]) for r in regressions], [("1000", "grammar_db")])
+        self.assertAlmostEqual(regressions[0]["change"], 0.4)
+
+        # A per-stage floor catches a small stage tripling
+        regressions = compare_results(current, baseline, tolerance,
+                                      min_delta_us={"default": 5.0, "stages": {"build_prompt": 0.5}})
+        self.assertEqual([r["stage"] for r in regressions], ["grammar_db", "build_prompt"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# tests/test_dataset_dedup.py
+import unittest
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from src.dataset_dedup import MinHasher, dedup_dataset, dedup_output_path, dedup_text, iter_deduplicated, lsh_bands
+from tests.helpers import ByteTokenizer
+
+NOUNS = ["parc", "marché", "cinéma", "musée", "stade", "jardin", "théâtre", "port"]
+
+
+def record(input_text: str, correction: str, explanation: str = "à + le = au") -> dict:
+    return {"instruction": "Corrige.", "input": input_text, "output": {"correction": correction, "explanation": explanation}}
+
+
+def shingles(text: str, size: int = 5) -> set:
+    text = text.ljust(size, '\0')
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a: dict, b: dict) -> float:
+    a, b = shingles(dedup_text(a)), shingles(dedup_text(b))
+    return len(a & b) / len(a | b)
+
+
+class TestDatasetDedup(unittest.TestCase):
+
+    def setUp(self):
+        """Distinct mistakes, each repeated with small edits (case and spacing, a dropped final point)."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.originals = [record(f"Demain, je vais à le {noun} avec mes amis.", f"Demain, je vais au {noun} avec mes amis.")
+                          for noun in NOUNS]
+        self.originals += [record("C'est le livre que j'ai besoin.", "C'est le livre dont j'ai besoin.", "dont"),
+                           record("Ils sont les amis qui je joue avec.", "Ce sont les amis avec qui je joue.", "avec qui")]
+        self.records = list(self.originals)
+        for original in self.originals:
+            self.records.append(record(original["input"].upper(), original["output"]["correction"],
+                                       original["output"]["explanation"]))
+            self.records.append(record(original["input"].rstrip(".").replace(" ", "  "), original["output"]["correction"],
+                                       original["output"]["explanation"]))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_signatures_estimate_jaccard_similarity(self):
+        """The share of equal MinHash values tracks the exact shingle Jaccard similarity."""
+        hasher = MinHasher(num_perm=256)
+        signatures = hasher.signatures([dedup_text(r) for r in self.records] + ["", "abc"])
+        self.assertEqual(signatures.shape, (len(self.records) + 2, 256))
+        for i, j in itertools.combinations(range(len(self.records)), 2):
+            estimate = (signatures[i] == signatures[j]).mean()
+            self.assertAlmostEqual(estimate, jaccard(self.records[i], self.records[j]), delta=0.12)
+        # Chunking does not change a record's signature
+        self.assertTrue((hasher.signatures([dedup_text(self.records[3])])[0] == signatures[3]).all())
+        self.assertEqual(lsh_bands(128, 0.8), (16, 8))
+
+    def test_near_duplicates_are_removed_in_order(self):
+        """Edited copies go at a high threshold; noun swaps go too once the threshold allows it."""
+        report = {}
+        kept = list(iter_deduplicated(iter(self.records), threshold=0.8, chunk_size=7, report=report))
+        self.assertEqual(kept, self.originals)
+        self.assertEqual((report["records"], report["kept"], report["near_duplicates"]),
+                         (len(self.records), len(self.originals), len(self.records) - len(self.originals)))
+        self.assertGreater(report["tokens"], report["kept_tokens"])
+
+        # Sentences differing by one noun are ~0.55 similar
+        kept = list(iter_deduplicated(iter(self.records), threshold=0.4))
+        self.assertEqual(kept, [self.originals[0]] + self.originals[-2:])
+
+    def test_explanation_cap_and_file_formats(self):
+        """The cap keeps the first records of each explanation; JSON and JSONL files round-trip."""
+        input_path = os.path.join(self.tmp_dir, 'dataset.jsonl')
+        with open(input_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in self.records)
+        expected = self.originals[:3] + self.originals[-2:]
+        for name in ('dedup.jsonl', 'dedup.json'):
+            output_path = os.path.join(self.tmp_dir, name)
+            report = dedup_dataset(input_path, output_path, tokenizer=ByteTokenizer(), threshold=0.8, max_per_explanation=3)
+            with open(output_path, 'r', encoding='utf-8') as f:
+                kept = [json.loads(line) for line in f] if name.endswith('.jsonl') else json.load(f)
+            self.assertEqual(kept, expected)
+            self.assertEqual(report["over_explanation_cap"], len(self.originals) - len(expected))
+            self.assertFalse(report["tokens_estimated"])
+        self.assertFalse(os.path.exists(output_path + ".tmp"))
+        self.assertEqual(dedup_output_path("data/final_dataset.jsonl"), "data/final_dataset.dedup.jsonl")
+
+
+if __name__ == '__main__':
+    unittest.main()
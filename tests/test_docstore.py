@@ -0,0 +1,79 @@
+# tests/test_docstore.py
+import unittest
+import copy
+import json
+import os
+import shutil
+import tempfile
+from src.docstore import DOCSTORE_FILE, DocStore, write_docstore
+from src.rag_pipeline import RAGPipeline
+from src.vector_store import LEGACY_CORPUS_FILE, build_vector_store, load_manifest
+from tests.helpers import HashingEncoder, SAMPLE_KNOWLEDGE_BASE
+
+
+class TestDocStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        with open(SAMPLE_KNOWLEDGE_BASE, 'r', encoding='utf-8') as f:
+            self.documents = json.load(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip_by_id(self):
+        """Documents come back by id with their topic and rule_id, whatever order they were written in."""
+        documents = self.documents + [{"rule_id": "élision", "content": "« L'ami » s'écrit avec une élision."}]
+        ids = [40, 3, 17, 8, 25][:len(documents)]
+        path = os.path.join(self.tmp_dir, DOCSTORE_FILE)
+        write_docstore(path, documents, ids)
+
+        store = DocStore(path)
+        self.assertEqual(len(store), len(documents))
+        self.assertEqual(list(store.ids), sorted(ids))
+        for doc_id, document in zip(ids, documents):
+            self.assertEqual(store.get(doc_id), {"content": document['content'], "topic": document.get('topic', 'General'),
+                                                 "rule_id": document['rule_id']})
+        self.assertIsNone(store.get(1000))
+        self.assertNotIn(-1, store)
+        self.assertEqual(store.get_many([ids[1], 1000, ids[0]])[0]['rule_id'], documents[1]['rule_id'])
+        self.assertIsNone(store.get_many([ids[1], 1000])[1])
+        self.assertEqual([document['rule_id'] for document in store],
+                         [documents[ids.index(doc_id)]['rule_id'] for doc_id in sorted(ids)])
+        store.close()
+
+        with open(path, 'r+b') as f:
+            f.write(b'NOTADOCS')
+        with self.assertRaises(ValueError):
+            DocStore(path)
+
+    def test_build_writes_docstore_that_the_pipeline_maps(self):
+        """The build replaces corpus.json with a docstore keyed by the index ids, which retrieval resolves hits from."""
+        output_dir = os.path.join(self.tmp_dir, 'vector_store')
+        os.makedirs(output_dir)
+        with open(os.path.join(output_dir, LEGACY_CORPUS_FILE), 'w') as f:
+            json.dump([], f)
+        encoder = HashingEncoder()
+        edited = copy.deepcopy(self.documents)
+        build_vector_store(edited, encoder, output_dir, 'hashing')
+        edited[0]['content'] += " Likewise, 'à les' always becomes 'aux'."
+        build_vector_store(edited, encoder, output_dir, 'hashing')
+        self.assertFalse(os.path.exists(os.path.join(output_dir, LEGACY_CORPUS_FILE)))
+
+        store = DocStore.open(output_dir)
+        for rule_id, entry in load_manifest(output_dir)['documents'].items():
+            self.assertEqual(store.get(entry['id'])['rule_id'], rule_id)
+        self.assertTrue(store.get(load_manifest(output_dir)['documents'][edited[0]['rule_id']]['id'])['content'].endswith("'aux'."))
+        store.close()
+
+        pipeline = RAGPipeline(output_dir, os.path.join(self.tmp_dir, 'profiles.sqlite3'),
+                               os.path.join(self.tmp_dir, 'missing_knowledge_base.json'), embedding_model=encoder)
+        self.assertIsInstance(pipeline.documents_by_id, DocStore)
+        hit = pipeline.get_context_with_topic("Je vais à le parc.", "user_1")
+        self.assertEqual((hit["topic"], hit["rule_id"]), ("Contractions", "contraction_a_le"))
+        self.assertEqual(len(pipeline.corpus), len(edited))
+        pipeline.profile_store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
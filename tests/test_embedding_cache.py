@@ -0,0 +1,74 @@
+# tests/test_embedding_cache.py
+import unittest
+import shutil
+import tempfile
+import numpy as np
+from src.embedding_cache import EmbeddingCache
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_lru_bound_and_normalized_keys(self):
+        """Whitespace variants share an entry, and the memory tier never exceeds its bound."""
+        cache = EmbeddingCache("model-a", max_entries=2)
+        cache.put_many(["Je vais  à le parc. ", "Bonjour", "Merci"], np.eye(3, dtype='float32'))
+
+        hits = cache.get_many(["Je vais à le parc.", "Bonjour", "Merci"])
+        self.assertIsNone(hits[0])
+        np.testing.assert_array_equal(hits[2], [0, 0, 1])
+        self.assertEqual(cache.stats()["memory_entries"], 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_disk_tier_survives_restart_and_model_change_invalidates(self):
+        """Vectors written by one instance are served by the next, unless the model changed."""
+        cache = EmbeddingCache("model-a", max_entries=10, disk_path=self.cache_dir, disk_capacity=4)
+        cache.put_many(["un", "deux"], np.array([[1, 2], [3, 4]], dtype='float32'))
+        cache.flush()
+
+        reopened = EmbeddingCache("model-a", max_entries=10, disk_path=self.cache_dir, disk_capacity=4)
+        np.testing.assert_array_equal(reopened.get_many(["deux"])[0], [3, 4])
+        self.assertEqual(reopened.disk_hits, 1)
+
+        other_model = EmbeddingCache("model-b", max_entries=10, disk_path=self.cache_dir, disk_capacity=4)
+        self.assertEqual(other_model.get_many(["un", "deux"]), [None, None])
+
+    def test_disk_ring_buffer_evicts_oldest(self):
+        """Once the on-disk tier is full, the oldest rows are overwritten and forgotten."""
+        cache = EmbeddingCache("model-a", max_entries=1, disk_path=self.cache_dir, disk_capacity=2)
+        for i, word in enumerate(["un", "deux", "trois"]):
+            cache.put_many([word], np.full((1, 2), i, dtype='float32'))
+
+        reopened = EmbeddingCache("model-a", max_entries=10, disk_path=self.cache_dir, disk_capacity=2)
+        hits = reopened.get_many(["un", "deux", "trois"])
+        self.assertIsNone(hits[0])
+        np.testing.assert_array_equal(hits[1], [1, 1])
+        np.testing.assert_array_equal(hits[2], [2, 2])
+
+    def test_crash_while_overwriting_a_row_forgets_the_evicted_key(self):
+        """A crash between overwriting a row and logging its new key must not serve the old key that vector."""
+        cache = EmbeddingCache("model-a", max_entries=1, disk_path=self.cache_dir, disk_capacity=2)
+        for i, word in enumerate(["un", "deux"]):
+            cache.put_many([word], np.full((1, 2), i, dtype='float32'))
+
+        append_keys = cache._append_keys
+        def crash_after_tombstones(lines):
+            if lines[0].startswith('\t'):
+                return append_keys(lines)
+            raise RuntimeError("crash")
+        cache._append_keys = crash_after_tombstones
+        with self.assertRaises(RuntimeError):
+            cache.put_many(["trois"], np.full((1, 2), 2, dtype='float32'))
+
+        reopened = EmbeddingCache("model-a", max_entries=10, disk_path=self.cache_dir, disk_capacity=2)
+        hits = reopened.get_many(["un", "deux", "trois"])
+        self.assertIsNone(hits[0])
+        np.testing.assert_array_equal(hits[1], [1, 1])
+        self.assertIsNone(hits[2])
+
+if __name__ == '__main__':
+    unittest.main()
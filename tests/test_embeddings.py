@@ -0,0 +1,47 @@
+# tests/test_embeddings.py
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from src.embeddings import HashingBackend, backend_name, load_embedding_backend
+from src.rag_pipeline import RAGPipeline
+from tests.helpers import SAMPLE_KNOWLEDGE_BASE, build_vector_store
+
+class TestEmbeddingBackends(unittest.TestCase):
+
+    def test_hashing_backend_is_deterministic_and_batched(self):
+        """Vectors do not depend on how sentences are batched, and are L2-normalised."""
+        sentences = ["Je vais à le parc.", "C'est le livre que j'ai besoin.", "Ils sont mes amis."]
+        backend = HashingBackend(dim=32, max_batch_size=2)
+        vectors = backend.encode(sentences)
+        self.assertEqual(vectors.shape, (3, 32))
+        self.assertEqual(vectors.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-6)
+        np.testing.assert_array_equal(vectors, HashingBackend(dim=32).encode(sentences, batch_size=1))
+
+    def test_backend_names_keep_vector_spaces_apart(self):
+        self.assertEqual(backend_name('all-MiniLM-L6-v2'), 'all-MiniLM-L6-v2')
+        self.assertEqual(backend_name('all-MiniLM-L6-v2', {"backend": "quantized"}), 'all-MiniLM-L6-v2@int8')
+        self.assertEqual(load_embedding_backend('all-MiniLM-L6-v2', {"backend": "hashing", "hashing_dim": 16}).name,
+                         backend_name('all-MiniLM-L6-v2', {"backend": "hashing", "hashing_dim": 16}))
+        with self.assertRaises(ValueError):
+            load_embedding_backend('all-MiniLM-L6-v2', {"backend": "onnx"})
+
+    def test_pipeline_loads_configured_backend(self):
+        """The pipeline and the build share one backend, so queries land in the index's vector space."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            embedding_config = {"backend": "hashing", "hashing_dim": 64}
+            backend = load_embedding_backend('unused', embedding_config)
+            build_vector_store(os.path.join(tmp_dir, 'store'), backend)
+            pipeline = RAGPipeline(os.path.join(tmp_dir, 'store'), os.path.join(tmp_dir, 'profiles.json'),
+                                   SAMPLE_KNOWLEDGE_BASE, embedding_config=embedding_config)
+            self.assertIsInstance(pipeline.embedding_model, HashingBackend)
+            self.assertEqual(pipeline._query_grammar_db("Je vais à le parc.")["rule_id"], "contraction_a_le")
+            pipeline.profile_store.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+    unittest.main()
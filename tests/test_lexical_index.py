@@ -0,0 +1,83 @@
+# tests/test_lexical_index.py
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from src.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex, is_decisive, reciprocal_rank_fusion
+from src.metrics import Metrics
+from src.rag_pipeline import RAGPipeline
+from tests.helpers import HashingEncoder, SAMPLE_KNOWLEDGE_BASE, build_vector_store
+
+HYBRID_CONFIG = {"mode": "hybrid", "lexical_skip": {"enabled": True, "min_score": 5.0, "margin": 2.0}}
+
+class TestLexicalIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        with open(SAMPLE_KNOWLEDGE_BASE, 'r', encoding='utf-8') as f:
+            self.documents = json.load(f)
+        self.ids = list(range(100, 100 + len(self.documents)))
+        self.index = LexicalIndex.build(self.documents, self.ids)
+        self.rule_by_id = {i: document['rule_id'] for i, document in zip(self.ids, self.documents)}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _pipeline(self, retrieval_config, encoder, metrics=None):
+        return RAGPipeline(os.path.join(self.tmp_dir, 'store'), os.path.join(self.tmp_dir, 'profiles.sqlite3'),
+                           SAMPLE_KNOWLEDGE_BASE, embedding_model=encoder, metrics=metrics,
+                           retrieval_config=retrieval_config)
+
+    def test_bm25_ranks_matching_rule_first(self):
+        """Constructions named in a rule's content put that rule on top, and saving keeps the ranking."""
+        for query, rule_id in [("Je vais à le parc.", "contraction_a_le"),
+                               ("C'est le livre que j'ai besoin.", "pronoun_dont")]:
+            hits = self.index.search(query, k=3)
+            self.assertEqual(self.rule_by_id[hits[0][0]], rule_id)
+            self.assertEqual([score for _, score in hits], sorted((score for _, score in hits), reverse=True))
+
+        self.index.save(self.tmp_dir)
+        reloaded = LexicalIndex.load(self.tmp_dir)
+        self.assertEqual(reloaded.search("Je vais à le parc."), self.index.search("Je vais à le parc."))
+        self.assertEqual(self.index.search("xyzzy"), [])
+
+    def test_decisiveness_and_rank_fusion(self):
+        self.assertTrue(is_decisive([(1, 9.0), (2, 3.0)], min_score=5.0, margin=2.0))
+        self.assertFalse(is_decisive([(1, 9.0), (2, 6.0)], min_score=5.0, margin=2.0))
+        self.assertFalse(is_decisive([(1, 4.0)], min_score=5.0, margin=2.0))
+        self.assertEqual(reciprocal_rank_fusion([[1, 2, 3], [2, 3, 1]], rrf_k=60), [2, 1, 3])
+
+    def test_hybrid_skips_embedding_for_decisive_hits(self):
+        """A decisive lexical hit is answered without calling the encoder; others are fused with vector search."""
+        encoder = HashingEncoder()
+        build_vector_store(os.path.join(self.tmp_dir, 'store'), encoder)
+        metrics = Metrics()
+        pipeline = self._pipeline(HYBRID_CONFIG, encoder, metrics)
+        encoder.calls = 0
+
+        hit = pipeline._query_grammar_db("Je vais à le parc.")
+        self.assertEqual(hit["rule_id"], "contraction_a_le")
+        self.assertEqual(encoder.calls, 0)
+        self.assertEqual(metrics.to_dict()["counters"]["lexical_skips"], 1)
+
+        pipeline._query_grammar_db("Bonjour.")
+        self.assertEqual(encoder.calls, 1)
+        pipeline.profile_store.close()
+
+    def test_missing_lexical_index_falls_back_to_vector_search(self):
+        encoder = HashingEncoder()
+        build_vector_store(os.path.join(self.tmp_dir, 'store'), encoder)
+        vector = self._pipeline({"mode": "vector"}, encoder)
+        expected = vector._query_grammar_db("Je vais à le parc.")
+        vector.profile_store.close()
+
+        os.remove(os.path.join(self.tmp_dir, 'store', LEXICAL_INDEX_FILE))
+        hybrid = self._pipeline(HYBRID_CONFIG, encoder)
+        self.assertIsNone(hybrid.lexical_index)
+        self.assertEqual(hybrid._query_grammar_db("Je vais à le parc."), expected)
+        self.assertTrue(hybrid.is_ready)
+        hybrid.profile_store.close()
+
+if __name__ == '__main__':
+    unittest.main()
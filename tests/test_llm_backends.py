@@ -0,0 +1,90 @@
+# tests/test_llm_backends.py
+import unittest
+import json
+import threading
+from src.llm_backends import SYSTEM_PREFIX, FakeLLM, load_llm_backend, parse_response, simulate_llm_response
+
+PROMPT = SYSTEM_PREFIX + "<|im_start|>user\nContext: ...\nSentence: Je vais à le parc.<|im_end|>\n<|im_start|>assistant\n"
+
+
+class RecordingLLM(FakeLLM):
+    """Records the prompts of every model call."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = []
+
+    def _generate_texts(self, prompts):
+        self.calls.append(list(prompts))
+        return super()._generate_texts(prompts)
+
+
+class TestLLMBackends(unittest.TestCase):
+
+    def test_batches_are_split_and_duplicates_generated_once(self):
+        """Distinct prompts go to the model max_batch_size at a time; repeated ones share a generation."""
+        llm = RecordingLLM(max_batch_size=2)
+        prompts = [f"prompt {i}" for i in range(3)] + ["prompt 0", PROMPT]
+        responses = llm.generate_batch(prompts)
+
+        self.assertEqual(llm.calls, [["prompt 0", "prompt 1"], ["prompt 2", PROMPT]])
+        self.assertEqual(responses, [simulate_llm_response(prompt) for prompt in prompts])
+        self.assertEqual(llm.stats()["coalesced"], 1)
+        self.assertEqual(llm.generate(PROMPT)["correction"], "Je vais au parc.")
+
+    def test_concurrent_identical_prompts_are_coalesced(self):
+        """Threads asking for a prompt already in flight wait for that generation instead of starting one."""
+        for coalesce, expected_generations in ((True, 1), (False, 6)):
+            llm = RecordingLLM(batch_latency_ms=200, coalesce=coalesce)
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(llm.generate(PROMPT))) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(llm.calls), expected_generations)
+            self.assertEqual(results, [simulate_llm_response(PROMPT)] * 6)
+            self.assertEqual(llm.stats()["in_flight"], 0)
+
+    def test_streams_follow_one_generation(self):
+        """A stream yields the response word by word; a second reader replays it even after the first stops."""
+        llm = RecordingLLM(token_latency_ms=1)
+        first = llm.stream(PROMPT)
+        head = [next(first), next(first)]
+        second = llm.stream(PROMPT)
+        replayed = next(second)
+        first.close()
+        self.assertEqual(json.loads(replayed + "".join(second)), simulate_llm_response(PROMPT))
+        self.assertTrue(json.dumps(simulate_llm_response(PROMPT), ensure_ascii=False).startswith("".join(head)))
+        self.assertEqual(llm.stats()["generations"], 1)
+
+        # Nobody else reading: closing early cancels the generation
+        stream = llm.stream(PROMPT)
+        next(stream)
+        stream.close()
+        self.assertEqual(llm.stats()["in_flight"], 0)
+        self.assertEqual(parse_response("".join(llm.stream(PROMPT)) + "<|im_end|>"), simulate_llm_response(PROMPT))
+
+    def test_waiting_on_a_stalled_generation_times_out(self):
+        """A request attached to a generation that never finishes gives up after wait_timeout."""
+        llm = RecordingLLM(wait_timeout=0.05)
+        generations, owned = llm._attach([PROMPT])
+        with self.assertRaises(TimeoutError):
+            llm.generate(PROMPT)
+        with self.assertRaises(TimeoutError):
+            next(llm.stream(PROMPT))
+        llm._finish(PROMPT, generations[PROMPT])
+
+    def test_parse_response_and_config(self):
+        self.assertEqual(parse_response('{"correction": "Il est là.", "explanation": "Accent."}<|im_end|>'),
+                         {"correction": "Il est là.", "explanation": "Accent."})
+        self.assertEqual(parse_response("Bravo !"), {"correction": "Sentence appears correct.", "explanation": "Bravo !"})
+
+        llm = load_llm_backend({"base_model_name": "base"}, {"fake": {"batch_latency_ms": 5, "jitter": 0.5, "seed": 3}})
+        self.assertIsInstance(llm, FakeLLM)
+        self.assertEqual((llm.batch_latency_ms, llm.max_batch_size), (5, 32))
+        with self.assertRaises(ValueError):
+            load_llm_backend({"base_model_name": "base"}, {"backend": "remote"})
+
+
+if __name__ == '__main__':
+    unittest.main()
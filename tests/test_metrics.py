@@ -0,0 +1,49 @@
+# tests/test_metrics.py
+import unittest
+import random
+from src.metrics import LATENCY_BUCKETS, Histogram, Metrics
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_quantiles_are_close(self):
+        """Bucketed quantile estimates stay within the bucket resolution of the exact values."""
+        rng = random.Random(0)
+        values = sorted(rng.lognormvariate(-7, 1) for _ in range(10000))
+        histogram = Histogram(LATENCY_BUCKETS)
+        for value in values:
+            histogram.observe(value)
+        for q in (0.5, 0.95, 0.99):
+            exact = values[int(q * len(values)) - 1]
+            self.assertAlmostEqual(histogram.quantile(q) / exact, 1.0, delta=0.2)
+        self.assertEqual(histogram.count, len(values))
+
+    def test_disabled_metrics_record_nothing(self):
+        """A disabled instance accepts every call and keeps no data."""
+        metrics = Metrics(enabled=False)
+        with metrics.span("search"):
+            pass
+        metrics.increment("corrections")
+        metrics.observe("batch_size", 8)
+        self.assertEqual(metrics.to_dict(), {"enabled": False, "stages": {}, "histograms": {}, "counters": {}})
+
+    def test_exports(self):
+        """Spans, values and counters show up in both the JSON and the Prometheus exports."""
+        metrics = Metrics()
+        with metrics.span("search"):
+            pass
+        metrics.observe("batch_size", 8)
+        metrics.increment("embedding_cache_hits", 3)
+
+        report = metrics.to_dict()
+        self.assertEqual(report["stages"]["search"]["count"], 1)
+        self.assertEqual(report["histograms"]["batch_size"]["p50"], 8)
+        self.assertEqual(report["counters"]["embedding_cache_hits"], 3)
+
+        text = metrics.to_prometheus()
+        self.assertIn('tutor_stage_latency_seconds{stage="search",quantile="0.95"}', text)
+        self.assertIn('tutor_stage_latency_seconds_count{stage="search"} 1', text)
+        self.assertIn('tutor_batch_size{quantile="0.5"} 8', text)
+        self.assertIn("tutor_embedding_cache_hits_total 3", text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+# tests/test_prefork.py
+import unittest
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import time
+from src.metrics import Metrics
+from src.prefork import PreforkServer
+from src.profile_store import ProfileStore
+
+
+class CountingTutor:
+    """Stands in for Tutor: every correction adds one error to the user's profile."""
+    def __init__(self, profile_store):
+        self.rag_pipeline = self
+        self.embedding_cache = None
+        self.response_cache = None
+        self.rule_engine = None
+        self.metrics = Metrics(enabled=False)
+        self.profile_store = profile_store
+
+    def wait_until_ready(self):
+        return True
+
+    def warm_up(self):
+        pass
+
+    def use_profile_store(self, profile_store):
+        self.profile_store = profile_store
+
+    def correct_batch(self, sentences, user_ids):
+        self.profile_store.increment_many([(user_id, "Contractions") for user_id in user_ids])
+        return [{"correction": sentence, "pid": os.getpid()} for sentence in sentences]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request(port: int, payload: dict) -> dict:
+    """Sends one request on a fresh connection, retrying while the worker reached is shutting down."""
+    for _ in range(50):
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=10) as sock:
+                sock.sendall((json.dumps(payload) + "\n").encode('utf-8'))
+                reply = sock.makefile('r', encoding='utf-8').readline()
+        except ConnectionError:
+            reply = ''
+        if reply and json.loads(reply).get('error') != "shutting down":
+            return json.loads(reply)
+        time.sleep(0.1)
+    raise AssertionError("no worker answered")
+
+
+class TestPreforkServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'profiles.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_workers_share_profiles_are_recycled_and_shut_down_gracefully(self):
+        """Updates from every worker land in one store, workers are replaced after max_requests,
+        and SIGTERM stops the server cleanly after flushing."""
+        server = PreforkServer(lambda: CountingTutor(ProfileStore(self.db_path, flush_interval=0)),
+                               lambda: ProfileStore(self.db_path, flush_interval=0.05),
+                               workers=2, max_requests=3, graceful_timeout=10)
+        port = free_port()
+        process = multiprocessing.get_context('fork').Process(target=server.serve, args=('127.0.0.1', port))
+        process.start()
+        try:
+            for _ in range(100):
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                    break
+                except ConnectionError:
+                    time.sleep(0.05)
+
+            replies = [request(port, {"sentence": f"Phrase {i}", "user_id": "learner"}) for i in range(12)]
+            self.assertEqual(sorted(reply["correction"] for reply in replies), sorted(f"Phrase {i}" for i in range(12)))
+            # Each worker process answers at most 3 corrections before it is replaced
+            self.assertGreaterEqual(len({reply["pid"] for reply in replies}), 4)
+        finally:
+            process.terminate()
+            process.join(20)
+        self.assertEqual(process.exitcode, 0)
+
+        store = ProfileStore(self.db_path, flush_interval=0)
+        self.assertEqual(store.get("learner")["error_counts"], {"Contractions": 12})
+        store.close()
+
+    def test_every_worker_answers_analytics_from_the_shared_store(self):
+        """Corrections answered by different (and replaced) workers all show up in any worker's analytics."""
+        server = PreforkServer(lambda: CountingTutor(ProfileStore(self.db_path, flush_interval=0)),
+                               lambda: ProfileStore(self.db_path, flush_interval=0.05),
+                               workers=2, max_requests=2, graceful_timeout=10,
+                               analytics_config={"enabled": True, "worker_max_age_seconds": 0})
+        port = free_port()
+        process = multiprocessing.get_context('fork').Process(target=server.serve, args=('127.0.0.1', port))
+        process.start()
+        try:
+            replies = [request(port, {"sentence": "Phrase", "user_id": f"learner_{i}"}) for i in range(6)]
+            # Each worker answers at most 2 corrections, so at least 3 processes wrote
+            self.assertGreaterEqual(len({reply["pid"] for reply in replies}), 3)
+            time.sleep(0.3)
+
+            # Queries start background reloads and answer from the copy loaded so far
+            expected = [[{"topic": "Contractions", "errors": 6, "users": 6}]] * 6
+            for _ in range(50):
+                answers = [request(port, {"analytics": "top_topics", "params": {"k": 1}})["analytics"] for _ in range(6)]
+                if answers == expected:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(answers, expected)
+        finally:
+            process.terminate()
+            process.join(20)
+        self.assertEqual(process.exitcode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
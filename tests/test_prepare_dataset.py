@@ -0,0 +1,74 @@
+# tests/test_prepare_dataset.py
+import unittest
+import importlib.util
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import pandas as pd
+
+spec = importlib.util.spec_from_file_location(
+    "prepare_dataset", os.path.join(os.path.dirname(__file__), '..', 'scripts', '01_prepare_dataset.py'))
+prepare_dataset_script = importlib.util.module_from_spec(spec)
+# Registered so worker processes can unpickle the chunk formatter by module name
+sys.modules[spec.name] = prepare_dataset_script
+spec.loader.exec_module(prepare_dataset_script)
+
+class TestPrepareDataset(unittest.TestCase):
+
+    def setUp(self):
+        """Write a raw CSV mixing known notes, unknown notes and empty cells."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.raw_path = os.path.join(self.tmp_dir, 'raw.csv')
+        rng = random.Random(0)
+        notes = list(prepare_dataset_script.EXPLANATION_MAP) + ["an unknown note", ""]
+        rows = [{"incorrect_sentence": f"Phrase {i} « à le » ?", "correct_sentence": "" if i % 17 == 0 else f"Phrase {i} « au ».",
+                 "explanation_notes": rng.choice(notes)} for i in range(250)]
+        pd.DataFrame(rows).to_csv(self.raw_path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def legacy_output(self) -> str:
+        """The original script's output: a row-wise apply dumped as one indented list."""
+        records = pd.read_csv(self.raw_path).apply(prepare_dataset_script.create_instruction, axis=1).tolist()
+        return json.dumps(records, indent=2, ensure_ascii=False)
+
+    def test_streamed_json_is_byte_identical(self):
+        """Chunked (and parallel) preparation writes exactly what the original script wrote."""
+        expected = self.legacy_output()
+        for workers in (1, 2):
+            output_path = os.path.join(self.tmp_dir, f'dataset_{workers}.json')
+            count = prepare_dataset_script.prepare_dataset(self.raw_path, output_path, chunk_size=32, workers=workers)
+            self.assertEqual(count, 250)
+            with open(output_path, 'r', encoding='utf-8') as f:
+                self.assertEqual(f.read(), expected)
+
+    def test_jsonl_holds_the_same_records(self):
+        """JSONL output has one record per line, equal to the original records in order."""
+        output_path = os.path.join(self.tmp_dir, 'dataset.jsonl')
+        prepare_dataset_script.prepare_dataset(self.raw_path, output_path, chunk_size=100)
+        with open(output_path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], json.loads(self.legacy_output()))
+
+    def test_default_run_writes_the_finetuning_dataset_unchanged(self):
+        """Without options the script writes finetune.dataset_path, byte for byte, and nothing else."""
+        with open(os.path.join(self.tmp_dir, 'config.yaml'), 'w') as f:
+            json.dump({"paths": {"raw_data": "raw.csv"}, "finetune": {"dataset_path": "final_dataset.json"}}, f)
+        cwd, argv = os.getcwd(), sys.argv
+        try:
+            os.chdir(self.tmp_dir)
+            sys.argv = ['01_prepare_dataset.py']
+            prepare_dataset_script.main()
+        finally:
+            os.chdir(cwd)
+            sys.argv = argv
+        with open(os.path.join(self.tmp_dir, 'final_dataset.json'), 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), self.legacy_output())
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ['config.yaml', 'final_dataset.json', 'raw.csv'])
+
+if __name__ == '__main__':
+    unittest.main()
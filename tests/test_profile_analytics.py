@@ -0,0 +1,105 @@
+# tests/test_profile_analytics.py
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from src.profile_analytics import ProfileAnalytics, ReloadingAnalytics
+from src.profile_store import ProfileStore
+
+PROFILES = {
+    "ana": {"error_counts": {"Contractions": 8, "Pronouns": 1}, "last_seen": "2025-08-30T10:00:00Z"},
+    "ben": {"error_counts": {"Articles and Gender": 5}, "last_seen": "2025-09-02T09:30:00.123456"},
+    "cleo": {"error_counts": {"Contractions": 2, "Articles and Gender": 4}, "last_seen": "2025-09-03T18:00:00"},
+    "dan": {"error_counts": {"Pronouns": 3}, "last_seen": None},
+}
+
+
+class TestProfileAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.analytics = ProfileAnalytics.from_profiles(PROFILES)
+
+    def test_top_topics_and_time_range(self):
+        """Topics are ranked by total errors, optionally among users last seen in a range."""
+        self.assertEqual(self.analytics.top_topics(2), [
+            {"topic": "Contractions", "errors": 10, "users": 2},
+            {"topic": "Articles and Gender", "errors": 9, "users": 2},
+        ])
+        self.assertEqual(self.analytics.top_topics(since="2025-09-01", until="2025-09-03"), [
+            {"topic": "Articles and Gender", "errors": 5, "users": 1},
+        ])
+
+    def test_topic_error_rates_per_window(self):
+        """Users without a timestamp are left out; rates are the share of active users with the error."""
+        daily = self.analytics.topic_error_rates(window_seconds=86400)
+        self.assertEqual([window["start"] for window in daily],
+                         ["2025-08-30T00:00:00", "2025-09-02T00:00:00", "2025-09-03T00:00:00"])
+        self.assertEqual([window["active_users"] for window in daily], [1, 1, 1])
+        [september] = self.analytics.topic_error_rates(window_seconds=7 * 86400, since="2025-09-01")
+        self.assertEqual(september["active_users"], 2)
+        self.assertEqual(september["errors"], {"Contractions": 2, "Articles and Gender": 9})
+        self.assertEqual(september["rates"]["Articles and Gender"], 1.0)
+        self.assertEqual(september["rates"]["Contractions"], 0.5)
+
+    def test_struggling_users(self):
+        """Users are filtered by count and share of their errors, most errors first."""
+        users = self.analytics.struggling_users("Articles and Gender", min_count=3)
+        self.assertEqual([user["user_id"] for user in users], ["ben", "cleo"])
+        self.assertEqual(users[1]["share"], 4 / 6)
+        self.assertEqual([user["user_id"] for user in self.analytics.struggling_users(
+            "Articles and Gender", min_count=3, min_share=0.9)], ["ben"])
+        self.assertEqual(self.analytics.struggling_users("Unknown topic"), [])
+
+    def test_follows_store_increments(self):
+        """Analytics attached to a store see later increments, including new users and topics, once."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            store = ProfileStore(os.path.join(tmp_dir, 'profiles.sqlite3'), flush_interval=60)
+            store.increment_many([("ana", "Contractions"), ("ben", "Pronouns")], last_seen="2025-09-01T00:00:00")
+            analytics = ProfileAnalytics.from_store(store)
+            # Grow past the initial capacity, in both users and topics
+            store.increment_many([(f"user_{i}", f"Topic {i % 40}") for i in range(3000)], last_seen="2025-09-05T00:00:00")
+            store.increment("ana", "Contractions", count=2, last_seen="2025-09-06T00:00:00")
+
+            self.assertEqual(analytics.num_users, 3002)
+            self.assertEqual(len(analytics.topics), 42)
+            self.assertEqual(analytics.struggling_users("Contractions", min_count=1), [
+                {"user_id": "ana", "count": 3, "share": 1.0, "last_seen": "2025-09-06T00:00:00"}])
+            self.assertEqual(analytics.counts.sum(), store_total(store))
+            store.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_reloading_analytics_picks_up_other_writers_in_the_background(self):
+        """Increments from another connection appear after a background reload started by a query."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dir, 'profiles.sqlite3')
+            store = ProfileStore(db_path, flush_interval=0)
+            other = ProfileStore(db_path, flush_interval=0)
+            store.increment("ana", "Contractions", last_seen="2025-09-01T00:00:00")
+            analytics = ReloadingAnalytics(store, max_age_seconds=0)
+            other.increment_many([("ana", "Contractions"), ("ben", "Pronouns")], last_seen="2025-09-02T00:00:00")
+
+            # The first query answers from the loaded copy and starts a reload
+            self.assertEqual(analytics.query("top_topics", {"k": 1}), [{"topic": "Contractions", "errors": 1, "users": 1}])
+            for _ in range(100):
+                if analytics.reloads:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(analytics.query("top_topics"), [{"topic": "Contractions", "errors": 2, "users": 1},
+                                                             {"topic": "Pronouns", "errors": 1, "users": 1}])
+
+            other.close()
+            store.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+def store_total(store: ProfileStore) -> int:
+    return sum(sum(profile["error_counts"].values()) for _, profile in store.iter_profiles())
+
+
+if __name__ == '__main__':
+    unittest.main()
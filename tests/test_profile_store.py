@@ -0,0 +1,109 @@
+# tests/test_profile_store.py
+import unittest
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from src.profile_store import ProfileStore
+
+class TestProfileStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.tmp_dir, 'user_profiles.json')
+        with open(self.json_path, 'w') as f:
+            json.dump({
+                "user_123": {"error_counts": {"Contractions": 8, "Pronouns": 1}, "last_seen": "2025-08-30T10:00:00Z"}
+            }, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_json_migration_happens_once(self):
+        """The legacy file is imported on first open only, so counts are never doubled."""
+        store = ProfileStore.open(self.json_path, flush_interval=0)
+        store.increment("user_123", "Contractions")
+        store.close()
+
+        reopened = ProfileStore.open(self.json_path, flush_interval=0)
+        profile = reopened.get("user_123")
+        self.assertEqual(profile["error_counts"], {"Contractions": 9, "Pronouns": 1})
+        self.assertEqual(len(reopened), 1)
+        reopened.close()
+
+    def test_buffered_writes_are_visible_and_survive_close(self):
+        """Reads see unflushed increments; close() writes them before returning."""
+        db_path = os.path.join(self.tmp_dir, 'profiles.sqlite3')
+        store = ProfileStore(db_path, flush_interval=60)
+        store.increment_many([("a", "Articles"), ("a", "Articles"), ("b", "Pronouns")], last_seen="2025-09-01T00:00:00")
+        self.assertEqual(store.get("a")["error_counts"], {"Articles": 2})
+        self.assertIsNone(store.get("nobody"))
+        store.close()
+
+        reopened = ProfileStore(db_path, flush_interval=0)
+        self.assertEqual(dict(reopened.iter_profiles()), {
+            "a": {"error_counts": {"Articles": 2}, "last_seen": "2025-09-01T00:00:00"},
+            "b": {"error_counts": {"Pronouns": 1}, "last_seen": "2025-09-01T00:00:00"},
+        })
+        reopened.close()
+
+    def test_concurrent_writers_do_not_lose_updates(self):
+        """Two stores on the same database both contribute their increments."""
+        db_path = os.path.join(self.tmp_dir, 'profiles.sqlite3')
+        first = ProfileStore(db_path, flush_interval=60)
+        second = ProfileStore(db_path, flush_interval=60)
+        first.increment("a", "Articles", count=3)
+        second.increment("a", "Articles", count=4)
+        first.close()
+        second.close()
+
+        reopened = ProfileStore(db_path, flush_interval=0)
+        self.assertEqual(reopened.get("a")["error_counts"]["Articles"], 7)
+        reopened.close()
+
+    def test_flush_keeps_increments_while_another_writer_holds_the_lock(self):
+        """A flush that cannot get the write lock leaves the increments buffered for the next one."""
+        db_path = os.path.join(self.tmp_dir, 'profiles.sqlite3')
+        store = ProfileStore(db_path, flush_interval=60)
+        store._conn.execute("PRAGMA busy_timeout=50")
+        store.increment("a", "Articles", count=2, last_seen="2025-09-01T00:00:00")
+        other = sqlite3.connect(db_path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        with self.assertRaises(sqlite3.OperationalError):
+            store.flush()
+        self.assertFalse(store._conn.in_transaction)
+        self.assertEqual(store.get("a")["error_counts"], {"Articles": 2})
+        other.execute("ROLLBACK")
+        other.close()
+
+        store.flush()
+        store.close()
+        reopened = ProfileStore(db_path, flush_interval=0)
+        self.assertEqual(reopened.get("a")["error_counts"], {"Articles": 2})
+        reopened.close()
+
+    def test_concurrent_migrations_import_once(self):
+        """A migration waiting on another process's import finds it done and skips its own."""
+        db_path = os.path.join(self.tmp_dir, 'profiles.sqlite3')
+        store = ProfileStore(db_path, flush_interval=0)
+        other = sqlite3.connect(db_path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        other.execute("INSERT INTO meta (key, value) VALUES ('migrated_from', 'elsewhere')")
+        results = []
+        migration = threading.Thread(target=lambda: results.append(store.migrate_from_json(self.json_path)))
+        migration.start()
+        # Let the migration read the marker (not yet committed) and block on the write lock
+        time.sleep(0.3)
+        other.execute("COMMIT")
+        other.close()
+        migration.join()
+        self.assertEqual(results, [0])
+        self.assertFalse(store._conn.in_transaction)
+        self.assertIsNone(store.get("user_123"))
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,11 @@
 import unittest
 import json
 import os
+import shutil
+import tempfile
+from src.embedding_cache import EmbeddingCache
 from src.rag_pipeline import RAGPipeline
+from tests.helpers import HashingEncoder, SAMPLE_KNOWLEDGE_BASE, build_vector_store
 
 class TestRAGPipeline(unittest.TestCase):
 
@@ -18,8 +22,12 @@ class TestRAGPipeline(unittest.TestCase):
             json.dump(self.test_profiles, f)
 
     def tearDown(self):
-        """Remove the temporary file after tests are run."""
+        """Remove the temporary file, and the store migrated from it, after tests are run."""
         os.remove(self.test_profiles_path)
+        for suffix in ('.sqlite3', '.sqlite3-wal', '.sqlite3-shm'):
+            store_path = os.path.splitext(self.test_profiles_path)[0] + suffix
+            if os.path.exists(store_path):
+                os.remove(store_path)
 
     def test_query_user_profile_existing_user(self):
         """
@@ -51,5 +59,51 @@ class TestRAGPipeline(unittest.TestCase):
         context = pipeline._query_user_profile("new_user")
         self.assertEqual("Retrieved User Profile: No specific weaknesses logged for this user.", context)
 
+
+class TestRAGPipelineOffline(unittest.TestCase):
+    """Exercises retrieval against a throwaway vector store built with an offline encoder."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.vector_db_path = os.path.join(self.tmp_dir, 'vector_store')
+        self.encoder = HashingEncoder()
+        build_vector_store(self.vector_db_path, self.encoder)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _pipeline(self, **kwargs):
+        return RAGPipeline(
+            vector_db_path=self.vector_db_path,
+            user_profile_db_path=os.path.join(self.tmp_dir, 'missing_profiles.json'),
+            knowledge_base_path=SAMPLE_KNOWLEDGE_BASE,
+            embedding_model=self.encoder,
+            **kwargs
+        )
+
+    def test_embedding_cache_encodes_only_new_sentences(self):
+        """Repeated sentences are served from the cache and give the same retrieval result."""
+        cache = EmbeddingCache("hashing", max_entries=100)
+        pipeline = self._pipeline(embedding_cache=cache)
+        self.encoder.calls = 0
+
+        first = pipeline.get_context_batch(["Je vais à le parc.", "Je vais à le parc."], "u")
+        second = pipeline.get_context_batch(["Je vais  à le parc."], "u")
+        self.assertEqual(self.encoder.calls, 1)
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(first[0]["topic"], "Contractions")
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    def test_lazy_and_background_startup(self):
+        """Lazy pipelines load components on first use; background ones report readiness once warm."""
+        lazy = self._pipeline(startup='lazy')
+        self.assertEqual(lazy.readiness()["components"], {"knowledge_base": False, "index": False, "embedding_model": True})
+        self.assertEqual(lazy.get_context_with_topic("Je vais à le parc.", "u")["topic"], "Contractions")
+        self.assertTrue(lazy.readiness()["ready"])
+
+        background = self._pipeline(startup='background')
+        self.assertTrue(background.wait_until_ready(timeout=10))
+        self.assertEqual(set(background.readiness()["load_seconds"]), {"knowledge_base", "index", "embedding_model"})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
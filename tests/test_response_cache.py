@@ -0,0 +1,103 @@
+# tests/test_response_cache.py
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from src.metrics import Metrics
+from src.rag_pipeline import RAGPipeline
+from src.response_cache import ResponseCache
+from src.tutor import StubLLM, Tutor
+from tests.helpers import HashingEncoder, SAMPLE_KNOWLEDGE_BASE, build_vector_store
+
+class CountingLLM(StubLLM):
+    def __init__(self):
+        super().__init__()
+        self.prompts = 0
+
+    def generate_batch(self, prompts):
+        self.prompts += len(prompts)
+        return super().generate_batch(prompts)
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_hit_requires_same_sentence_and_rule(self):
+        """Only the same sentence (up to spacing) that retrieved the same rule reuses a response."""
+        cache = ResponseCache(similarity_threshold=0.9)
+        response = {"correction": "Je vais au parc."}
+        cache.put(np.array([1.0, 0.0]), "contraction_a_le", "Je vais à le parc.", response)
+
+        self.assertEqual(cache.get(np.array([0.99, 0.05]), "contraction_a_le", " Je vais  à le parc."), response)
+        self.assertIsNone(cache.get(np.array([0.99, 0.05]), "dont_relative_pronoun", "Je vais à le parc."))
+        self.assertIsNone(cache.get(np.array([0.5, 0.5]), "contraction_a_le", "Je vais à le parc."))
+        # A near-identical sentence with another noun must not get this correction
+        self.assertIsNone(cache.get(np.array([1.0, 0.0]), "contraction_a_le", "Je vais à le marché."))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 3)
+
+    def test_lru_and_ttl_eviction(self):
+        """The size bound evicts the least recently used entry; expired entries never hit."""
+        cache = ResponseCache(max_entries=2, similarity_threshold=0.99)
+        for i, rule in enumerate(["a", "b"]):
+            cache.put(np.eye(2)[i], rule, rule, {"correction": rule})
+        cache.get(np.eye(2)[0], "a", "a")
+        cache.put(np.eye(2)[1], "c", "c", {"correction": "c"})
+        self.assertIsNotNone(cache.get(np.eye(2)[0], "a", "a"))
+        self.assertIsNone(cache.get(np.eye(2)[1], "b", "b"))
+        self.assertEqual(cache.stats()["entries"], 2)
+
+        expiring = ResponseCache(ttl_seconds=0)
+        expiring.put(np.eye(2)[0], "a", "a", {"correction": "a"})
+        self.assertIsNone(expiring.get(np.eye(2)[0], "a", "a"))
+        self.assertEqual(expiring.stats()["entries"], 0)
+
+class TestTutorResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        vector_db_path = os.path.join(self.tmp_dir, 'vector_store')
+        profiles_path = os.path.join(self.tmp_dir, 'user_profiles.sqlite3')
+        self.encoder = encoder = HashingEncoder()
+        build_vector_store(vector_db_path, encoder)
+        pipeline = RAGPipeline(vector_db_path, profiles_path, SAMPLE_KNOWLEDGE_BASE, embedding_model=encoder, metrics=Metrics(),
+                               retrieval_config={"mode": "hybrid", "lexical_skip": {"enabled": True}})
+        self.llm = CountingLLM()
+        self.tutor = Tutor("base", "adapter", vector_db_path, profiles_path, rag_pipeline=pipeline, llm=self.llm,
+                           response_cache=ResponseCache(similarity_threshold=0.95, bypass_users=["examinee"]))
+
+    def tearDown(self):
+        self.tutor.profile_store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_repeated_mistakes_skip_the_llm(self):
+        """Repeats are answered from the cache, still update profiles, and bypassed users always reach the LLM."""
+        first = self.tutor.correct("Je vais à le parc.", "user_1")
+        repeats = self.tutor.correct_batch(["Je vais à le parc.", "Je vais  à le parc."], ["user_2", "user_3"])
+        self.assertEqual(repeats, [first, first])
+        self.assertEqual(self.llm.prompts, 1)
+        self.assertEqual(self.tutor.profile_store.get("user_3")["error_counts"], {"Contractions": 1})
+
+        self.tutor.correct("Je vais à le parc.", "examinee")
+        self.assertEqual(self.llm.prompts, 2)
+        self.assertEqual(self.tutor.response_cache.stats()["hits"], 2)
+
+    def test_lexically_skipped_sentences_are_embedded_only_for_the_cache(self):
+        """A decisive lexical hit is embedded once for the cache probe, and not at all for bypassed users."""
+        self.encoder.calls = 0
+        self.tutor.correct("Je vais à le parc.", "examinee")
+        self.assertEqual(self.encoder.calls, 0)
+        counters = self.tutor.metrics.to_dict()["counters"]
+        self.assertEqual(counters["lexical_skips"], 1)
+        self.assertNotIn("response_cache_embeds", counters)
+
+        first = self.tutor.correct("Je vais à le parc.", "user_1")
+        repeats = self.tutor.correct_batch(["Je vais à le parc.", "C'est le livre que j'ai besoin."], ["user_2", "user_3"])
+        self.assertEqual(repeats[0], first)
+        counters = self.tutor.metrics.to_dict()["counters"]
+        self.assertEqual((counters["lexical_skips"], counters["response_cache_embeds"]), (4, 3))
+        # One call for the first correction, one for both sentences of the batch
+        self.assertEqual(self.encoder.calls, 2)
+        self.assertEqual(self.tutor.response_cache.stats()["hits"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# tests/test_rule_engine.py
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from src.rag_pipeline import RAGPipeline
+from src.rule_engine import DEFAULT_PATTERN_RULES, RuleEngine
+from tests.helpers import SAMPLE_KNOWLEDGE_BASE, HashingEncoder, build_vector_store
+
+class TestRuleEngine(unittest.TestCase):
+
+    def setUp(self):
+        with open(SAMPLE_KNOWLEDGE_BASE, 'r', encoding='utf-8') as f:
+            self.knowledge_base = json.load(f)
+        self.engine = RuleEngine(DEFAULT_PATTERN_RULES, self.knowledge_base)
+
+    def test_confident_fixes_use_knowledge_base_explanation(self):
+        cases = [
+            ("Je vais à le parc.", "Je vais au parc.", "contraction_a_le"),
+            ("À le marché, il pleut.", "Au marché, il pleut.", "contraction_a_le"),
+            ("Elle parle à les enfants.", "Elle parle aux enfants.", "contraction_a_les"),
+            ("Le prix de le pain augmente.", "Le prix du pain augmente.", "contraction_de_le"),
+            ("J'ai mangé un pomme.", "J'ai mangé une pomme.", "gender_agreement_articles"),
+        ]
+        for sentence, correction, rule_id in cases:
+            match = self.engine.match(sentence)
+            self.assertTrue(match["confident"], sentence)
+            self.assertEqual((match["correction"], match["rule_id"]), (correction, rule_id))
+        entry = next(entry for entry in self.knowledge_base if entry["rule_id"] == "gender_agreement_articles")
+        self.assertEqual(self.engine.match("Un pomme.")["explanation"], entry["content"])
+        # Rules missing from the knowledge base fall back to their own topic and explanation
+        self.assertEqual(self.engine.match("Le prix de le pain.")["topic"], "Contractions")
+
+    def test_ambiguous_or_clean_sentences_fall_through(self):
+        for sentence in ["Il commence à le faire.", "Ils parlent de les voir.", "Je parle de le ami.",
+                         "Je parle de le film et un pomme.",
+                         "Il hésite à le lui donner.", "Il a oublié de le leur dire.", "Il tient à les y emmener.",
+                         "Il refuse de les leur rendre.", "Il pense à le en retirer."]:
+            self.assertFalse(self.engine.match(sentence)["confident"], sentence)
+        for sentence in ["Je vais au parc.", "Je vais à l'école.", "Bonjour tout le monde.", "Un livre."]:
+            self.assertIsNone(self.engine.match(sentence), sentence)
+        stats = self.engine.stats()
+        self.assertEqual((stats["served"], stats["ambiguous"], stats["unmatched"]), (0, 9, 4))
+
+    def test_patterns_with_groups_are_rejected(self):
+        with self.assertRaises(ValueError):
+            RuleEngine([{"rule_id": "x", "pattern": r"(a)b", "replacement": "c", "topic": "t", "explanation": "e"}])
+
+    def test_from_config_reads_explanations_from_the_docstore(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        vector_db_path = os.path.join(tmp_dir, 'vector_store')
+        encoder = HashingEncoder()
+        build_vector_store(vector_db_path, encoder)
+        # The knowledge base JSON is never opened: the docstore written with the index answers
+        pipeline = RAGPipeline(vector_db_path, os.path.join(tmp_dir, 'profiles.db'),
+                               os.path.join(tmp_dir, 'missing.json'), embedding_model=encoder)
+        engine = RuleEngine.from_config({"enabled": True}, pipeline)
+        self.assertEqual(engine.match("Un pomme.")["explanation"], self.engine.match("Un pomme.")["explanation"])
+        self.assertEqual(engine.match("Le prix de le pain.")["topic"], "Contractions")
+        self.assertIsNone(RuleEngine.from_config({"enabled": False}, pipeline))
+
+if __name__ == '__main__':
+    unittest.main()
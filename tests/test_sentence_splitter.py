@@ -0,0 +1,42 @@
+# tests/test_sentence_splitter.py
+import unittest
+from src.sentence_splitter import sentence_spans, split_sentences
+
+
+class TestSentenceSplitter(unittest.TestCase):
+
+    def test_splits_on_terminators_and_blank_lines(self):
+        text = "Je suis allé au marché. Il pleuvait ! Tu viens ?\n\nEnsuite, on est rentrés"
+        self.assertEqual(split_sentences(text),
+                         ["Je suis allé au marché.", "Il pleuvait !", "Tu viens ?", "Ensuite, on est rentrés"])
+
+    def test_keeps_abbreviations_initials_and_numbers_together(self):
+        text = ("M. Dupont et Mme Martin lisent J. K. Rowling, p. ex. le tome 2. "
+                "Il coûte 3.5 euros à 10.30 ce matin. Voilà.")
+        self.assertEqual(split_sentences(text),
+                         ["M. Dupont et Mme Martin lisent J. K. Rowling, p. ex. le tome 2.",
+                          "Il coûte 3.5 euros à 10.30 ce matin.", "Voilà."])
+
+    def test_quotes_ellipses_and_dialogue(self):
+        text = "« Tu viens ? » demanda-t-il. « Oui ! » Je ne sais pas… Peut-être.\n— Alors viens."
+        self.assertEqual(split_sentences(text),
+                         ["« Tu viens ? » demanda-t-il.", "« Oui ! »", "Je ne sais pas…", "Peut-être.", "— Alors viens."])
+
+    def test_uncapitalised_sentences_and_final_abbreviations(self):
+        self.assertEqual(split_sentences("je suis fatigué. je vais dormir. tu viens? non."),
+                         ["je suis fatigué.", "je vais dormir.", "tu viens?", "non."])
+        self.assertEqual(split_sentences("Elle a couru 5 min. Ensuite elle a mangé des pommes, etc. Voilà."),
+                         ["Elle a couru 5 min.", "Ensuite elle a mangé des pommes, etc.", "Voilà."])
+        self.assertEqual(split_sentences("Attends 5 min. environ, c.-à-d. pas longtemps. Il est… enfin, fatigué."),
+                         ["Attends 5 min. environ, c.-à-d. pas longtemps.", "Il est… enfin, fatigué."])
+
+    def test_spans_point_into_the_original_text(self):
+        text = "  Bonjour.\n  Il fait\nbeau.  "
+        spans = sentence_spans(text)
+        self.assertEqual([text[start:end] for start, end in spans], ["Bonjour.", "Il fait\nbeau."])
+        self.assertEqual(split_sentences(text)[1], "Il fait beau.")
+        self.assertEqual(split_sentences("   \n\n  "), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
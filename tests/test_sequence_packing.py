@@ -0,0 +1,115 @@
+# tests/test_sequence_packing.py
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from src.sequence_packing import (IGNORE_INDEX, PackedDataset, build_packed_dataset, collate_packed, format_example,
+                                  pack_lengths, torch_collator)
+from tests.helpers import ByteTokenizer
+
+class TestSequencePacking(unittest.TestCase):
+
+    def setUp(self):
+        """Write a JSONL dataset of short examples of varying length."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.dataset_path = os.path.join(self.tmp_dir, 'dataset.jsonl')
+        self.examples = [{"instruction": "Corrige.", "input": "Je vais à le parc." * (1 + i % 3),
+                          "output": {"correction": "Je vais au parc.", "explanation": "à + le = au" * (1 + i % 5)}}
+                         for i in range(40)]
+        with open(self.dataset_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(example, ensure_ascii=False) + "\n" for example in self.examples)
+        self.cache_dir = os.path.join(self.tmp_dir, 'packed')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pack_lengths_fills_sequences(self):
+        """Every example is placed exactly once and no sequence overflows."""
+        lengths = [700, 600, 400, 300, 300, 200, 100, 50]
+        bins = pack_lengths(lengths, 1024)
+        self.assertEqual(sorted(i for b in bins for i in b), list(range(len(lengths))))
+        self.assertTrue(all(sum(lengths[i] for i in b) <= 1024 for b in bins))
+        self.assertEqual(len(bins), 3)
+
+    def test_packed_examples_round_trip(self):
+        """Packed sequences hold each example's tokens, with position ids restarting and prompts masked."""
+        tokenizer = ByteTokenizer()
+        manifest = build_packed_dataset(self.dataset_path, tokenizer, self.cache_dir, max_seq_length=512, shard_size=3)
+        dataset = PackedDataset(manifest["path"])
+        stats = manifest["stats"]
+        self.assertEqual(stats["num_examples"], 40)
+        self.assertLess(stats["num_sequences"], 40)
+        self.assertLess(stats["padding_ratio_packed_max_length"], stats["padding_ratio_unpacked_max_length"])
+        self.assertGreater(len(manifest["shards"]), 1)
+
+        # Split every packed sequence back into examples and compare with direct tokenization
+        recovered = []
+        for i in range(len(dataset)):
+            item = dataset[i]
+            starts = list(np.flatnonzero(item["position_ids"] == 0)) + [len(item["input_ids"])]
+            for start, end in zip(starts[:-1], starts[1:]):
+                recovered.append((tuple(item["input_ids"][start:end]), tuple(item["labels"][start:end])))
+        expected = []
+        for example in self.examples:
+            prompt, completion = format_example(example)
+            prompt_ids, completion_ids = tokenizer([prompt, completion])["input_ids"]
+            expected.append((tuple(prompt_ids + completion_ids), tuple([IGNORE_INDEX] * len(prompt_ids) + completion_ids)))
+        self.assertEqual(sorted(recovered), sorted(expected))
+        self.assertTrue(np.all(np.diff(dataset.lengths) <= 0))
+
+        # A second build with the same tokenizer and template reuses the cache, with per-batch
+        # padding recomputed for a different batch size
+        rebuilt = build_packed_dataset(self.dataset_path, tokenizer, self.cache_dir, max_seq_length=512, batch_size=1)
+        self.assertEqual(rebuilt["key"], manifest["key"])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertEqual(rebuilt["stats"]["batch_size"], 1)
+        self.assertEqual(rebuilt["stats"]["padding_ratio_unpacked_per_batch"], 0.0)
+        self.assertEqual(rebuilt["stats"]["padding_ratio_packed_per_batch"], 0.0)
+
+    def test_collate_and_block_mask(self):
+        """Batches are padded to their longest sequence and examples cannot attend to each other."""
+        features = [
+            {"input_ids": np.array([5, 6, 7, 8]), "labels": np.array([-100, 6, -100, 8]), "position_ids": np.array([0, 1, 0, 1])},
+            {"input_ids": np.array([9, 10]), "labels": np.array([-100, 10]), "position_ids": np.array([0, 1])},
+        ]
+        batch = collate_packed(features, pad_token_id=0)
+        self.assertEqual(batch["input_ids"].shape, (2, 4))
+        self.assertEqual(batch["attention_mask"].shape, (2, 1, 4, 4))
+
+        mask = batch["attention_mask"][:, 0]
+        self.assertEqual(mask[0].astype(int).tolist(), [[1, 0, 0, 0], [1, 1, 0, 0], [0, 0, 1, 0], [0, 0, 1, 1]])
+        # Padding only sees itself
+        self.assertEqual(mask[1].astype(int).tolist(), [[1, 0, 0, 0], [1, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+        # Padding-free attention reads the boundaries from position_ids alone
+        self.assertNotIn("attention_mask", collate_packed(features, pad_token_id=0, block_diagonal=False))
+
+    def test_packed_examples_do_not_see_each_other_in_the_model(self):
+        """A packed example gets the same logits as when it is run on its own."""
+        try:
+            import torch
+            from transformers import LlamaConfig, LlamaForCausalLM
+        except ImportError:
+            self.skipTest("torch and transformers are not installed")
+        torch.manual_seed(0)
+        config = LlamaConfig(vocab_size=32, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                             num_attention_heads=4, num_key_value_heads=4)
+        first, second = [3, 4, 5, 6, 7], [8, 9, 10]
+        feature = {"input_ids": np.array(first + second), "labels": np.array(first + second),
+                   "position_ids": np.array(list(range(len(first))) + list(range(len(second))))}
+        short = {"input_ids": np.array(second), "labels": np.array(second), "position_ids": np.arange(len(second))}
+        for attn_implementation in ("eager", "sdpa"):
+            model = LlamaForCausalLM._from_config(config, attn_implementation=attn_implementation).eval()
+            collate = torch_collator(pad_token_id=0)
+            batch = collate([feature, short])
+            with torch.no_grad():
+                packed = model(input_ids=batch["input_ids"], position_ids=batch["position_ids"],
+                               attention_mask=batch["attention_mask"]).logits
+                alone = model(input_ids=torch.tensor([second])).logits
+            torch.testing.assert_close(packed[0, len(first):], alone[0], rtol=1e-4, atol=1e-4)
+            torch.testing.assert_close(packed[1, :len(second)], alone[0], rtol=1e-4, atol=1e-4)
+            self.assertFalse(torch.isnan(packed).any())
+
+if __name__ == '__main__':
+    unittest.main()
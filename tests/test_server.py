@@ -0,0 +1,135 @@
+# tests/test_server.py
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from src.llm_backends import FakeLLM, parse_response
+from src.rag_pipeline import RAGPipeline
+from src.server import MicroBatcher, ServerBusyError, TutorService
+from src.tutor import Tutor
+from tests.helpers import HashingEncoder, SAMPLE_KNOWLEDGE_BASE, build_vector_store
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_concurrent_requests_are_batched_and_answered_in_order(self):
+        """Requests arriving together share a batch, and each caller gets its own result."""
+        seen_batches = []
+
+        def process(items):
+            seen_batches.append(list(items))
+            return [item * 10 for item in items]
+
+        async def scenario():
+            batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=50)
+            await batcher.start()
+            results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+            await batcher.stop()
+            return results, batcher.stats()
+
+        results, stats = asyncio.run(scenario())
+        self.assertEqual(results, [i * 10 for i in range(10)])
+        self.assertEqual([len(batch) for batch in seen_batches], [4, 4, 2])
+        self.assertEqual(stats["batches"], 3)
+
+    def test_full_queue_rejects_requests(self):
+        """Once max_queue_size requests are waiting, new ones fail fast with ServerBusyError."""
+        release = threading.Event()
+
+        def process(items):
+            release.wait(5)
+            return items
+
+        async def scenario():
+            batcher = MicroBatcher(process, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+            await batcher.start()
+            in_flight = asyncio.ensure_future(batcher.submit("first"))
+            await asyncio.sleep(0.05)  # the runner is now blocked on "first"
+            queued = [asyncio.ensure_future(batcher.submit(i)) for i in range(2)]
+            await asyncio.sleep(0)
+            with self.assertRaises(ServerBusyError):
+                await batcher.submit("overflow")
+            release.set()
+            results = await asyncio.gather(in_flight, *queued)
+            await batcher.stop()
+            return results, batcher.rejected
+
+        results, rejected = asyncio.run(scenario())
+        self.assertEqual(results, ["first", 0, 1])
+        self.assertEqual(rejected, 1)
+
+    def test_batch_errors_reach_every_caller(self):
+        def process(items):
+            raise ValueError("backend down")
+
+        async def scenario():
+            batcher = MicroBatcher(process, max_batch_size=8, max_wait_ms=20)
+            await batcher.start()
+            results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+            await batcher.stop()
+            return results
+
+        self.assertTrue(all(isinstance(r, ValueError) for r in asyncio.run(scenario())))
+
+class TestTutorService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        vector_db_path = os.path.join(self.tmp_dir, 'vector_store')
+        profiles_path = os.path.join(self.tmp_dir, 'user_profiles.sqlite3')
+        encoder = HashingEncoder()
+        build_vector_store(vector_db_path, encoder)
+        pipeline = RAGPipeline(vector_db_path, profiles_path, SAMPLE_KNOWLEDGE_BASE, embedding_model=encoder)
+        self.tutor = Tutor("base", "adapter", vector_db_path, profiles_path, rag_pipeline=pipeline,
+                           llm=FakeLLM(token_latency_ms=5, wait_timeout=10))
+
+    def tearDown(self):
+        self.tutor.profile_store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_plain_request_joins_a_stream_of_the_same_sentence(self):
+        """A plain request coalesced with an open stream completes while the stream is read slowly."""
+        sentence = "Je vais à le parc."
+
+        async def scenario():
+            service = TutorService(self.tutor, max_wait_ms=0)
+            await service.start()
+            stream = service.correct_stream(sentence, "streaming")
+            chunks = [await stream.__anext__()]
+            await asyncio.sleep(0.02)
+            plain = await asyncio.wait_for(service.correct(sentence, "plain"), 5)
+            chunks += [chunk async for chunk in stream]
+            await service.stop()
+            return plain, "".join(chunks)
+
+        plain, streamed = asyncio.run(scenario())
+        self.assertEqual(plain["correction"], "Je vais au parc.")
+        self.assertEqual(parse_response(streamed), {k: plain[k] for k in ("correction", "explanation")})
+        self.assertEqual(self.tutor.llm.stats()["generations"], 1)
+    def test_slow_analytics_queries_do_not_block_corrections(self):
+        """An analytics query runs on its own thread while the loop keeps answering corrections."""
+        class SlowAnalytics:
+            def query(self, name, params=None):
+                time.sleep(0.5)
+                return [name]
+
+        async def scenario():
+            service = TutorService(self.tutor, max_wait_ms=0, analytics=SlowAnalytics())
+            await service.start()
+            start = time.perf_counter()
+            query = asyncio.ensure_future(service.query_analytics({"analytics": "top_topics"}))
+            await asyncio.sleep(0.05)
+            await service.correct("Bonjour.", "learner")
+            corrected = time.perf_counter() - start
+            result = await query
+            await service.stop()
+            return corrected, result
+
+        corrected, result = asyncio.run(scenario())
+        self.assertLess(corrected, 0.4)
+        self.assertEqual(result, {"analytics": ["top_topics"]})
+
+if __name__ == '__main__':
+    unittest.main()
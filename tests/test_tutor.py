@@ -0,0 +1,132 @@
+# tests/test_tutor.py
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from src.llm_backends import SYSTEM_PREFIX, FakeLLM, parse_response
+from src.metrics import Metrics
+from src.rag_pipeline import RAGPipeline
+from src.rule_engine import DEFAULT_PATTERN_RULES, RuleEngine
+from src.tutor import Tutor
+from tests.helpers import HashingEncoder, SAMPLE_KNOWLEDGE_BASE, build_vector_store
+
+class TestTutor(unittest.TestCase):
+
+    def setUp(self):
+        """Build a throwaway vector store and profile file with an offline encoder."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.vector_db_path = os.path.join(self.tmp_dir, 'vector_store')
+        self.profiles_path = os.path.join(self.tmp_dir, 'user_profiles.json')
+        with open(self.profiles_path, 'w') as f:
+            json.dump({"user_1": {"error_counts": {"Pronouns": 1}}}, f)
+
+        self.encoder = HashingEncoder()
+        build_vector_store(self.vector_db_path, self.encoder)
+        pipeline = RAGPipeline(
+            vector_db_path=self.vector_db_path,
+            user_profile_db_path=self.profiles_path,
+            knowledge_base_path=SAMPLE_KNOWLEDGE_BASE,
+            embedding_model=self.encoder,
+            encode_batch_size=2,
+            metrics=Metrics()
+        )
+        self.tutor = Tutor("base", "adapter", self.vector_db_path, self.profiles_path, rag_pipeline=pipeline)
+
+    def tearDown(self):
+        self.tutor.profile_store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_correct_batch_matches_sequential_correct(self):
+        """Batched results come back in input order and equal per-sentence results."""
+        sentences = ["Je vais à le parc.", "Bonjour tout le monde.", "C'est le livre que j'ai besoin."]
+        batched = self.tutor.correct_batch(sentences, ["user_1", "user_2", "user_1"])
+        sequential = [self.tutor.correct(s, "user_3") for s in sentences]
+        self.assertEqual(batched, sequential)
+        self.assertEqual(batched[0]["correction"], "Je vais au parc.")
+
+    def test_correct_batch_updates_profiles_once(self):
+        """Every detected error is counted, and encoding happens in chunks, not per sentence."""
+        self.encoder.calls = 0
+        sentences = ["Je vais à le parc."] * 3 + ["C'est le livre que j'ai besoin."]
+        self.tutor.correct_batch(sentences, "user_1")
+        self.assertEqual(self.encoder.calls, 2)
+
+        counts = self.tutor.profile_store.get("user_1")["error_counts"]
+        self.assertEqual(counts["Contractions"], 3)
+        self.assertEqual(counts["Relative Pronouns"], 1)
+        self.assertEqual(counts["Pronouns"], 1)
+
+    def test_correct_records_stage_metrics(self):
+        """Each stage of a correction gets a latency sample, and batches record their size."""
+        self.tutor.correct("Je vais à le parc.", "user_1")
+        self.tutor.correct_batch(["C'est le livre que j'ai besoin.", "Je vais à le parc."], "user_2")
+
+        report = self.tutor.metrics.to_dict()
+        for stage in ("correct", "retrieve", "embed", "search", "profile_read", "prompt", "llm", "profile_write"):
+            self.assertIn(stage, report["stages"])
+        self.assertEqual(report["stages"]["correct"]["count"], 1)
+        self.assertEqual(report["stages"]["llm"]["count"], 2)
+        self.assertEqual(report["histograms"]["batch_size"]["count"], 1)
+        self.assertEqual(report["counters"], {"corrections": 3, "llm_prompts": 3, "profile_updates": 3})
+
+    def test_rule_engine_fast_path_skips_retrieval_and_llm(self):
+        """Confident mechanical fixes are answered by the rule engine and still counted in the profile."""
+        with open(SAMPLE_KNOWLEDGE_BASE, 'r', encoding='utf-8') as f:
+            self.tutor.rule_engine = RuleEngine(DEFAULT_PATTERN_RULES, json.load(f))
+        self.encoder.calls = 0
+        responses = self.tutor.correct_batch(
+            ["Je vais à le parc.", "Il commence à le faire.", "J'ai mangé un pomme."], "user_1")
+
+        self.assertEqual(responses[0]["correction"], "Je vais au parc.")
+        self.assertIn("'à le parc' becomes 'au parc'", responses[0]["explanation"])
+        self.assertEqual(responses[2]["correction"], "J'ai mangé une pomme.")
+        self.assertEqual(self.encoder.calls, 1)
+        counters = self.tutor.metrics.to_dict()["counters"]
+        self.assertEqual((counters["fast_path_hits"], counters["fast_path_ambiguous"], counters["llm_prompts"]), (2, 1, 1))
+        # The ambiguous sentence is flagged by the simulated LLM too, which answers from the retrieved 'à le' rule
+        counts = self.tutor.profile_store.get("user_1")["error_counts"]
+        self.assertEqual((counts["Contractions"], counts["Articles and Gender"]), (2, 1))
+
+        self.assertEqual(self.tutor.correct("Je vais à le parc.", "user_2"), responses[0])
+        self.assertEqual(self.encoder.calls, 1)
+
+    def test_correct_paragraph_streams_each_sentence_and_writes_profiles_once(self):
+        """A paragraph is split, retrieved in one pass, streamed per sentence and counted in one profile write."""
+        self.encoder.calls = 0
+        text = ("Je vais à le parc avec M. Dupont. C'est le livre que j'ai besoin.\n\n"
+                "Mme Martin est partie. Je vais à le parc avec M. Dupont.")
+        stream = self.tutor.correct_paragraph_stream(text, "user_2")
+        first = next(stream)
+        # Nothing is written to the profile before the paragraph is finished
+        self.assertIsNone(self.tutor.profile_store.get("user_2"))
+        results = [first] + list(stream)
+
+        self.assertEqual(sorted(result["index"] for result in results), [0, 1, 2, 3])
+        self.assertEqual(self.encoder.calls, 2)
+        self.assertEqual(self.tutor.metrics.to_dict()["counters"]["profile_updates"], 3)
+        self.assertEqual(self.tutor.profile_store.get("user_2")["error_counts"],
+                         {"Contractions": 2, "Relative Pronouns": 1})
+
+        summary = self.tutor.correct_paragraph(text, "user_3")
+        self.assertEqual([result["sentence"] for result in summary["sentences"]],
+                         ["Je vais à le parc avec M. Dupont.", "C'est le livre que j'ai besoin.",
+                          "Mme Martin est partie.", "Je vais à le parc avec M. Dupont."])
+        self.assertTrue(summary["corrected_text"].startswith("Je vais au parc. C'est le livre dont j'ai besoin."))
+        self.assertIn("Mme Martin est partie.", summary["corrected_text"])
+        contractions = [rule for rule in summary["rules"] if rule["topic"] == "Contractions"]
+        self.assertEqual(len(contractions), 1)
+        self.assertEqual(contractions[0]["sentences"], [0, 3])
+
+    def test_correct_stream_yields_the_response_in_chunks(self):
+        """Streamed chunks join into the same response as `correct`, and the profile is updated once at the end."""
+        self.tutor.llm = FakeLLM()
+        chunks = list(self.tutor.correct_stream("C'est le livre que j'ai besoin.", "user_2"))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(parse_response("".join(chunks)), self.tutor.correct("C'est le livre que j'ai besoin.", "user_3"))
+        self.assertEqual(self.tutor.profile_store.get("user_2")["error_counts"], {"Relative Pronouns": 1})
+        self.assertIn("llm_first_token", self.tutor.metrics.to_dict()["stages"])
+        self.assertTrue(self.tutor._build_prompt("Phrase.", "Contexte").startswith(SYSTEM_PREFIX))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# tests/test_vector_store.py
+import unittest
+import copy
+import json
+import os
+import shutil
+import tempfile
+import functools
+import faiss
+import numpy as np
+from src.sharded_embedding import SHARD_DIR_PREFIX
+from src.vector_store import INDEX_FILE, build_vector_store, create_index, load_embeddings, load_manifest
+from tests.helpers import HashingEncoder, SAMPLE_KNOWLEDGE_BASE
+
+class FailingEncoder(HashingEncoder):
+    """Simulates a build interrupted part-way: fails once `fail_after` batches have been encoded."""
+    def __init__(self, fail_after: int):
+        super().__init__()
+        self.fail_after = fail_after
+
+    def encode(self, sentences, **kwargs):
+        if self.calls >= self.fail_after:
+            raise KeyboardInterrupt
+        return super().encode(sentences, **kwargs)
+
+QUERIES = ["Je vais à le parc.", "C'est le livre que j'ai besoin.", "J'ai mangé un pomme.", "Ils sont mes amis."]
+
+class TestVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.encoder = HashingEncoder()
+        with open(SAMPLE_KNOWLEDGE_BASE, 'r', encoding='utf-8') as f:
+            self.documents = json.load(f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _search(self, output_dir):
+        index = faiss.read_index(os.path.join(output_dir, INDEX_FILE))
+        distances, ids = index.search(self.encoder.encode(QUERIES), 3)
+        manifest = load_manifest(output_dir)
+        rule_by_id = {entry['id']: rule_id for rule_id, entry in manifest['documents'].items()}
+        return [[rule_by_id[i] for i in row] for row in ids], distances
+
+    def _edited_documents(self):
+        edited = copy.deepcopy(self.documents)
+        edited[0]['content'] += " Likewise, 'à les' always becomes 'aux'."
+        del edited[2]
+        edited.append({"rule_id": "contraction_de_le", "topic": "Contractions",
+                       "content": "The preposition 'de' contracts with 'le' to form 'du', as in 'le livre du professeur'."})
+        return edited
+
+    def test_incremental_update_embeds_only_changes(self):
+        """Only added or changed documents are embedded, and deleted ones leave the index."""
+        incremental_dir = os.path.join(self.tmp_dir, 'incremental')
+        build_vector_store(self.documents, self.encoder, incremental_dir, 'hashing')
+        summary = build_vector_store(self._edited_documents(), self.encoder, incremental_dir, 'hashing')
+
+        self.assertEqual(summary["mode"], "incremental")
+        self.assertEqual((summary["added"], summary["changed"], summary["removed"]), (1, 1, 1))
+        self.assertEqual(summary["embedded"], 2)
+        self.assertEqual(summary["total"], 4)
+        self.assertNotIn("ce_sont_vs_ils_sont", load_manifest(incremental_dir)["documents"])
+
+    def test_incremental_and_full_builds_give_identical_results(self):
+        """Patching an existing index matches rebuilding it, ids included."""
+        incremental_dir = os.path.join(self.tmp_dir, 'incremental')
+        build_vector_store(self.documents, self.encoder, incremental_dir, 'hashing')
+        build_vector_store(self._edited_documents(), self.encoder, incremental_dir, 'hashing')
+
+        full_dir = os.path.join(self.tmp_dir, 'full')
+        shutil.copytree(incremental_dir, full_dir)
+        summary = build_vector_store(self._edited_documents(), self.encoder, full_dir, 'hashing', incremental=False)
+        self.assertEqual(summary["embedded"], 4)
+
+        incremental_hits, incremental_distances = self._search(incremental_dir)
+        full_hits, full_distances = self._search(full_dir)
+        self.assertEqual(incremental_hits, full_hits)
+        self.assertEqual(incremental_distances.tolist(), full_distances.tolist())
+        self.assertEqual(load_manifest(incremental_dir)["documents"], load_manifest(full_dir)["documents"])
+
+    def test_model_change_forces_full_rebuild(self):
+        build_vector_store(self.documents, self.encoder, self.tmp_dir, 'hashing')
+        summary = build_vector_store(self.documents, HashingEncoder(dim=32), self.tmp_dir, 'hashing-32')
+        self.assertEqual(summary["mode"], "full")
+
+    def _synthetic_documents(self, count):
+        return [{"rule_id": f"rule_{i}", "topic": "Synthetic", "content": f"Règle {i}: {QUERIES[i % len(QUERIES)]} {i * 7}"}
+                for i in range(count)]
+
+    def test_sharded_build_resumes_and_matches_single_pass(self):
+        """An interrupted sharded build resumes from completed shards and ends up identical to a one-pass build."""
+        documents = self._synthetic_documents(50)
+        single_dir = os.path.join(self.tmp_dir, 'single')
+        build_vector_store(documents, self.encoder, single_dir, 'hashing')
+
+        sharded_dir = os.path.join(self.tmp_dir, 'sharded')
+        with self.assertRaises(KeyboardInterrupt):
+            build_vector_store(documents, FailingEncoder(fail_after=3), sharded_dir, 'hashing', shard_size=10, batch_size=5)
+        self.assertIsNone(load_manifest(sharded_dir))
+
+        encoder = HashingEncoder()
+        summary = build_vector_store(documents, encoder, sharded_dir, 'hashing', shard_size=10, batch_size=5)
+        self.assertEqual(summary["total"], 50)
+        # The first shard (two batches of five) survived the interruption
+        self.assertEqual(encoder.calls, 8)
+        self.assertFalse([name for name in os.listdir(sharded_dir) if name.startswith(SHARD_DIR_PREFIX)])
+        np.testing.assert_array_equal(load_embeddings(sharded_dir, load_manifest(sharded_dir)),
+                                      load_embeddings(single_dir, load_manifest(single_dir)))
+
+    def test_parallel_sharded_build_uses_worker_processes(self):
+        documents = self._synthetic_documents(30)
+        single_dir = os.path.join(self.tmp_dir, 'single')
+        build_vector_store(documents, self.encoder, single_dir, 'hashing')
+        parallel_dir = os.path.join(self.tmp_dir, 'parallel')
+        build_vector_store(documents, None, parallel_dir, 'hashing', shard_size=8, workers=2,
+                           encoder_factory=functools.partial(HashingEncoder, dim=64))
+        np.testing.assert_array_equal(load_embeddings(parallel_dir, load_manifest(parallel_dir)),
+                                      load_embeddings(single_dir, load_manifest(single_dir)))
+
+    def test_configured_index_types_find_exact_neighbours(self):
+        """Each index type keeps the stable ids and, with generous parameters, matches exact search."""
+        vectors = np.random.RandomState(0).randn(512, 32).astype('float32')
+        ids = np.arange(1000, 1512, dtype='int64')
+        _, exact = create_index(vectors, ids).search(vectors[:20], 1)
+        for index_config in [{"type": "ivf", "ivf": {"nlist": 8, "nprobe": 8}},
+                             {"type": "hnsw", "hnsw": {"M": 16, "ef_search": 128}},
+                             {"type": "ivfpq", "nlist": 4, "nprobe": 4, "m": 8, "nbits": 4}]:
+            index = create_index(vectors, ids, index_config)
+            _, found = index.search(vectors[:20], 1)
+            self.assertEqual(index.ntotal, 512)
+            self.assertGreaterEqual(np.mean(found == exact), 0.9, index_config)
+
+        with self.assertRaises(ValueError):
+            create_index(vectors, ids, {"type": "lsh"})
+
+if __name__ == '__main__':
+    unittest.main()